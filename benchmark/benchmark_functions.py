@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+
+
+#%% Synthetic tlsrecord
+
+def _program(numLinks: int, numStages: int):
+    '''
+    A signal program of 'numStages' stages over 'numLinks' links (contiguous groups of links per stage).
+    Every stage has 3 phases: green ('g' on the links of the stage), yellow, all red.
+    Returns (stageIndices, states) with the state string of every phase.
+    '''
+    stageIndices = np.minimum(np.arange(numLinks) * numStages // numLinks, numStages - 1)
+    states = []
+    for stage in range(numStages):
+        links = np.flatnonzero(stageIndices == stage)
+        green = np.full(numLinks, 'r')
+        green[links] = 'g'
+        yellow = np.full(numLinks, 'r')
+        yellow[links] = 'y'
+        states += [''.join(green), ''.join(yellow), 'r'*numLinks]
+    return stageIndices.tolist(), states
+
+def _phaseDurations(numEvents: int, numStages: int, control: str, rng) -> np.ndarray:
+    '''
+    Durations of 'numEvents' consecutive phases (green, yellow, all red per stage, see _program)
+        fixed    - the green of stage s lasts 30 + 10*s seconds in every cycle
+        actuated - gap-out actuation: a minimum green of 10 s extended by every vehicle arriving within
+                   the 3 s passage time (Poisson arrivals, a different demand per stage), up to 60 s
+    Yellow lasts 3 s and all red 2 s.
+    '''
+    phase = np.arange(numEvents) % (3*numStages)
+    stage, kind = phase // 3, phase % 3
+    durations = np.where(kind == 1, 3.0, 2.0)
+    isGreen = kind == 0
+    if control == 'fixed':
+        durations[isGreen] = 30.0 + 10.0*stage[isGreen]
+    elif control == 'actuated':
+        minGreen, maxGreen, passage = 10.0, 60.0, 3.0
+        meanHeadway = 2.0 + 1.5*stage[isGreen]
+        extendProbability = 1 - np.exp(-passage/meanHeadway)
+        extensions = rng.geometric(1 - extendProbability) - 1
+        #each extension adds the headway of the arrival, i.e. less than the passage time
+        green = minGreen + extensions*passage*rng.uniform(0.3, 1.0, extensions.shape[0])
+        durations[isGreen] = np.clip(np.round(green), minGreen, maxGreen)
+    else:
+        raise ValueError('the input value for \'control\' is invalid')
+    return durations
+
+def synthetic_tlsrecord(path, events: int = 10000, links: int = 16, tls: int = 1, stages: int = 2,
+                        control: str = 'fixed', seed: int = 0) -> dict:
+    '''
+    Writes a SUMO-like tlsrecord file with 'tls' traffic lights ('J0', 'J1', ...) of 'events' tlsStates each,
+    'links' links grouped into 'stages' stages, under fixed-time or gap-actuated control (see _phaseDurations).
+    The traffic lights start with random offsets and their tlsStates are written in time order, as SUMO does.
+    Returns the inputs the analysis functions need for the file
+        {'path', 'tls_ids', 'stageIndices', 'stageNames', 'coor_index', 'links'}
+    where 'coor_index' = (0, 1) marks the green of the first stage and 'links' chains the traffic lights
+    J0 -> J1 -> ... with a 30 s travel time (see offset_functions.network_offsets).
+    '''
+    rng = np.random.default_rng(seed)
+    stageIndices, states = _program(links, stages)
+    tls_ids = ['J{}'.format(i) for i in range(tls)]
+    times, ids, phases = [], [], []
+    for i in range(tls):
+        durations = _phaseDurations(events, stages, control, rng)
+        times.append(np.round(rng.uniform(0, 60), 0) + np.append(0, np.cumsum(durations[:-1])))
+        ids.append(np.full(events, i))
+        phases.append(np.arange(events) % (3*stages))
+    times, ids, phases = np.concatenate(times), np.concatenate(ids), np.concatenate(phases)
+    order = np.argsort(times, kind='stable')
+
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n\n<tlsStates>\n')
+        for start in range(0, order.shape[0], 100000):
+            f.write(''.join('    <tlsState time="{:.2f}" id="{}" programID="0" phase="{}" state="{}"/>\n'
+                            .format(times[k], tls_ids[ids[k]], phases[k], states[phases[k]])
+                            for k in order[start:start + 100000]))
+        f.write('</tlsStates>\n')
+    return {'path': path,
+            'tls_ids': tls_ids,
+            'stageIndices': stageIndices,
+            'stageNames': ['Stage {}'.format(stage) for stage in range(stages)],
+            'coor_index': (0, 1),
+            'links': [(tls_ids[i], tls_ids[i+1], 30) for i in range(tls - 1)]}
+
+
+#%% Measurement
+
+def _measure(func, repeats: int = 3, setup = None) -> tuple:
+    '''
+    Times func(*setup()) 'repeats' times (setup is not timed), then runs it once more under tracemalloc
+    for the peak memory allocated by the call. Returns (measurement dict, result of the last call).
+    '''
+    setup = setup or (lambda: ())
+    seconds = []
+    for _ in range(repeats):
+        args = setup()
+        start = time.perf_counter()
+        result = func(*args)
+        seconds.append(time.perf_counter() - start)
+    args = setup()
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds_min': min(seconds), 'seconds_median': float(np.median(seconds)),
+            'repeats': repeats, 'peak_bytes': peak}, result
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmark(events: int = 10000, links: int = 16, tls: int = 1, stages: int = 2, control: str = 'fixed',
+                  repeats: int = 3, windows: int = 200, processes: int = None, seed: int = 0, workdir: str = None) -> dict:
+    '''
+    Generates a synthetic tlsrecord (see synthetic_tlsrecord) and times every stage of the pipeline on it
+        read_tlsrecord, load_tlsrecord (cold and warm cache), tlsStages, tlsNumpy, cycleStarts, TLSRangeIndex,
+        plot_signalPlan, plot_cyclicity, plot_greenTimeDistribution, plot_greenTimeSplit, draw (Agg),
+        slider_update (update_panels on 'windows' random slider ranges, with the latency of a single call),
+        offset_table (what offset_cal.main computes, 3 orders, on the first two traffic lights),
+        network_offsets (all the links, in a process pool of 'processes'; only with tls > 1)
+    The plot stages draw on the first traffic light. Returns a JSON-serialisable dict of the parameters,
+    the environment and {stage: {seconds_min, seconds_median, repeats, peak_bytes, ...}}.
+    '''
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from record_functions import read_tlsrecord
+    from cache_functions import load_tlsrecord
+    import core_functions
+    import plot_functions
+    from cycle_functions import cycleStarts
+    from query_functions import TLSRangeIndex
+    from report_functions import FixedRange
+    from offset_sumo.offset_functions import green_intervals, offset_table, network_offsets
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        synthetic = synthetic_tlsrecord(os.path.join(tmp, 'tlsrecord.xml'), events, links, tls, stages, control, seed)
+        path, stageIndices, stageNames = synthetic['path'], synthetic['stageIndices'], synthetic['stageNames']
+        results = {}
+
+        results['read_tlsrecord'], records = _measure(lambda: read_tlsrecord(path), repeats)
+        #every cold call (the timed ones and the one under tracemalloc) gets a new, empty cache directory
+        results['load_tlsrecord_cold'], _ = _measure(lambda cache_dir: load_tlsrecord(path, cache_dir=cache_dir),
+                                                     repeats, lambda: (tempfile.mkdtemp(dir=tmp),))
+        cache_dir = os.path.join(tmp, 'cache')
+        load_tlsrecord(path, cache_dir=cache_dir)
+        results['load_tlsrecord_warm'], _ = _measure(lambda: load_tlsrecord(path, cache_dir=cache_dir), repeats)
+        record = records[synthetic['tls_ids'][0]]
+        results['read_tlsrecord']['record_bytes_per_event'] = record.nbytes() / len(record)
+
+        results['tlsStages'], stageDefinition = _measure(
+            lambda: core_functions.tlsStages(record, stageIndices, stageNames), repeats)
+        results['tlsNumpy'], tlsnp = _measure(lambda: core_functions.tlsNumpy(record, stageDefinition), repeats)
+        results['cycleStarts'], _ = _measure(lambda: cycleStarts(tlsnp, stageDefinition, 1), repeats)
+        results['TLSRangeIndex'], index = _measure(lambda: TLSRangeIndex(tlsnp), repeats)
+
+        window = FixedRange((tlsnp[0,0], tlsnp[0,0] + 3600))
+        def axes():
+            fig = Figure(figsize=(12, 8))
+            FigureCanvasAgg(fig)
+            return plot_functions.cluster_axes(fig)
+        colours = ['C{}'.format(stage) for stage in range(stages)]
+        results['plot_signalPlan'], _ = _measure(
+            lambda ax: plot_functions.plot_signalPlan(ax, window, tlsnp, stageDefinition), repeats, lambda: axes()[3:])
+        results['plot_cyclicity'], _ = _measure(
+            lambda ax: plot_functions.plot_cyclicity(ax, window, tlsnp, stageDefinition, 1, colours), repeats, lambda: axes()[2:3])
+        results['plot_greenTimeDistribution'], _ = _measure(
+            lambda ax: plot_functions.plot_greenTimeDistribution(ax, window, tlsnp, stageDefinition, 10, colours),
+            repeats, lambda: axes()[1:2])
+        results['plot_greenTimeSplit'], _ = _measure(
+            lambda ax: plot_functions.plot_greenTimeSplit(ax, window, tlsnp, stageDefinition, list(colours)),
+            repeats, lambda: axes()[:1])
+
+        def drawn():
+            panels = axes()
+            plot_functions.plot_panels(panels, window, tlsnp, stageDefinition, 10, 1, list(colours))
+            return (panels,)
+        results['draw'], _ = _measure(lambda panels: panels[0].figure.canvas.draw(), repeats, drawn)
+
+        rng = np.random.default_rng(seed)
+        starts = rng.uniform(tlsnp[0,0], tlsnp[-1,0], windows)
+        ranges = np.column_stack([starts, starts + rng.uniform(180, 7200, windows)])
+        latencies = []
+        def slide(panels):
+            for t0, t1 in ranges:
+                start = time.perf_counter()
+                plot_functions.update_panels(t0, t1, index, *panels)
+                latencies.append(time.perf_counter() - start)
+                assert panels[3].get_xlim() == (t0, t1), 'the plan panel does not show the slider range'
+        results['slider_update'], _ = _measure(slide, repeats, lambda: (drawn()[0],))
+        results['slider_update'].update({'windows': windows,
+                                         'call_median_seconds': float(np.median(latencies)),
+                                         'call_p95_seconds': float(np.percentile(latencies, 95))})
+
+        reference = green_intervals(record, synthetic['coor_index'])
+        target = green_intervals(records[synthetic['tls_ids'][min(1, tls - 1)]], synthetic['coor_index'])
+        results['offset_table'], _ = _measure(lambda: offset_table(reference, target, 3, 30), repeats)
+        if tls > 1:
+            results['network_offsets'], _ = _measure(
+                lambda: network_offsets(records, synthetic['links'], synthetic['coor_index'], 3, processes), repeats)
+
+    import matplotlib, pandas
+    return {'parameters': {'events': events, 'links': links, 'tls': tls, 'stages': stages, 'control': control,
+                           'repeats': repeats, 'windows': windows, 'processes': processes, 'seed': seed},
+            'environment': {'commit': _git_commit(), 'python': platform.python_version(),
+                            'numpy': np.__version__, 'pandas': pandas.__version__,
+                            'matplotlib': matplotlib.__version__, 'machine': platform.machine(),
+                            'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'results': results}
+
+
+#%% Results
+
+def save_results(results: dict, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+def load_results(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def compare_results(baseline: dict, current: dict, threshold: float = 1.10) -> list:
+    '''
+    Compares the stages of two run_benchmark results (e.g. of two commits, with the same parameters).
+    Returns (stage, baseline seconds, current seconds, ratio, regressed) for the stages in both, where
+    'regressed' marks a median time more than 'threshold' times the baseline.
+    '''
+    rows = []
+    for stage, measured in current['results'].items():
+        if stage not in baseline['results']:
+            continue
+        before, after = baseline['results'][stage]['seconds_median'], measured['seconds_median']
+        ratio = after / before if before > 0 else float('inf')
+        rows.append((stage, before, after, ratio, ratio > threshold))
+    return rows
+
+def print_results(results: dict, stream = sys.stdout):
+    parameters = results['parameters']
+    print('{events} events x {tls} TLS, {links} links, {stages} stages, {control} control'.format(**parameters), file=stream)
+    print('{:<28}{:>12}{:>12}{:>14}'.format('stage', 'median (s)', 'min (s)', 'peak (MB)'), file=stream)
+    for stage, measured in results['results'].items():
+        print('{:<28}{:>12.4f}{:>12.4f}{:>14.2f}'.format(stage, measured['seconds_median'], measured['seconds_min'],
+                                                          measured['peak_bytes'] / 2**20), file=stream)
+
+def print_comparison(rows: list, stream = sys.stdout):
+    print('{:<28}{:>12}{:>12}{:>8}'.format('stage', 'before (s)', 'after (s)', 'ratio'), file=stream)
+    for stage, before, after, ratio, regressed in rows:
+        print('{:<28}{:>12.4f}{:>12.4f}{:>8.2f}{}'.format(stage, before, after, ratio, '  REGRESSION' if regressed else ''),
+              file=stream)
@@ -0,0 +1,34 @@
+#Usage example (from the repository root)
+#   python -m benchmark.benchmark_main --events 100000 --tls 4 --control actuated --output bench.json
+#   python -m benchmark.benchmark_main --events 100000 --tls 4 --control actuated --compare bench.json
+import argparse
+import matplotlib
+matplotlib.use('Agg')
+from benchmark.benchmark_functions import (run_benchmark, save_results, load_results, compare_results,
+                                           print_results, print_comparison)
+
+if __name__ == '__main__': #network_offsets starts a process pool, and spawned workers re-import this module
+    parser = argparse.ArgumentParser(description='Times the tlsrecord pipeline on a synthetic record')
+    parser.add_argument('--events', type=int, default=10000, help='tlsState events per traffic light')
+    parser.add_argument('--links', type=int, default=16, help='links (state string length) per traffic light')
+    parser.add_argument('--tls', type=int, default=1, help='number of traffic lights (TLS ids) in the record')
+    parser.add_argument('--stages', type=int, default=2, help='number of stages of the signal program')
+    parser.add_argument('--control', choices=['fixed', 'actuated'], default='fixed')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--processes', type=int, default=None, help='process pool size of network_offsets')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.10, help='slow-down ratio reported as a regression')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.events, args.links, args.tls, args.stages, args.control,
+                            args.repeats, processes = args.processes, seed = args.seed)
+    print_results(results)
+    if args.output:
+        save_results(results, args.output)
+    if args.compare:
+        rows = compare_results(load_results(args.compare), results, args.threshold)
+        print_comparison(rows)
+        if any(regressed for *_, regressed in rows):
+            raise SystemExit(1)
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+from record_functions import TLSRecord, read_tlsrecord
+from core_functions import tlsStages, tlsNumpy
+from profile_functions import phase
+
+CACHE_DIR = './.tlscache'
+_COLUMNS = ('time', 'phase', 'program', 'stateCode')
+_FORMAT_VERSION = 2 #bump when the stored record columns change (2: compact code types)
+_DERIVED_VERSION = 2 #bump when tlsStages/tlsNumpy change their output, so older derived entries are not reused
+_TMP_PREFIX = '.tmp-' #entries being written by _write_entry
+_TMP_GRACE = 3600 #seconds after which evict_stale takes an entry still without meta.json for a crashed write
+
+
+def _source_signature(path, check):
+    '''
+    check = 'mtime' -> modification time and size of the file (cheap)
+    check = 'hash'  -> blake2b digest of the file content (survives touch/copy, but reads the whole file)
+    '''
+    stat = os.stat(path)
+    signature = {'path': os.path.abspath(path), 'size': stat.st_size}
+    if check == 'mtime':
+        signature['mtime_ns'] = stat.st_mtime_ns
+    elif check == 'hash':
+        digest = hashlib.blake2b()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        signature['hash'] = digest.hexdigest()
+    else:
+        raise ValueError('the input value for \'check\' is invalid')
+    return signature
+
+
+def _key(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def _entry_dir(path, cache_dir):
+    return os.path.join(cache_dir, _key(os.path.abspath(path)))
+
+
+def _read_meta(entry):
+    try:
+        with open(os.path.join(entry, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_entry(entry, signature, records):
+    #the entry is written next to its final place and renamed, so a crash never leaves a half-written entry
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=_TMP_PREFIX, dir=os.path.dirname(entry))
+    meta = {'source': signature, 'format': _FORMAT_VERSION, 'tls': {}}
+    for n, (tlsID, record) in enumerate(records.items()):
+        for column in _COLUMNS:
+            np.save(os.path.join(tmp, '{}_{}.npy'.format(n, column)), getattr(record, column))
+        meta['tls'][tlsID] = {'n': n, 'programIDs': record.programIDs, 'states': record.states}
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    try:
+        os.replace(tmp, entry)
+    except OSError:
+        #another process (e.g. a pool worker on the same file) has just written the entry
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _open_entry(entry, meta, tls_ids):
+    records = {}
+    for tlsID, info in meta['tls'].items():
+        if tls_ids is not None and tlsID not in tls_ids:
+            continue
+        columns = [np.load(os.path.join(entry, '{}_{}.npy'.format(info['n'], column)), mmap_mode='r')
+                   for column in _COLUMNS]
+        records[tlsID] = TLSRecord(tlsID, columns[0], columns[1], columns[2], info['programIDs'],
+                                   columns[3], info['states'])
+    return records
+
+
+def load_tlsrecord(path, tls_ids = None, cache_dir: str = CACHE_DIR, check: str = 'mtime') -> dict:
+    '''
+    Cached version of record_functions.read_tlsrecord.
+    The parsed columns of every TLS id in the file are stored as .npy files under 'cache_dir' and
+    are memory-mapped on the following calls, as long as the file still matches its signature
+    (see 'check' in _source_signature). An entry whose file has changed is evicted and rebuilt.
+    '''
+    with phase('cache'): #a rebuild also records the 'parse' of read_tlsrecord inside it
+        entry = _entry_dir(path, cache_dir)
+        signature = _source_signature(path, check)
+        meta = _read_meta(entry)
+        if meta is None or meta['source'] != signature or meta.get('format') != _FORMAT_VERSION:
+            shutil.rmtree(entry, ignore_errors=True)
+            _write_entry(entry, signature, read_tlsrecord(path))
+            meta = _read_meta(entry)
+        return _open_entry(entry, meta, None if tls_ids is None else set(tls_ids))
+
+
+def load_tlsnp(path, tlsID, stageIndices: list, stageNames: list, stage_type: str = 'mode',
+               cache_dir: str = CACHE_DIR, check: str = 'mtime'):
+    '''
+    Returns (record, stages, tlsnp) of one TLS id, i.e. the inputs of clusterPlot_TLS with
+    'stages' and 'tlsnp' precomputed by tlsStages and tlsNumpy.
+    The derived results are cached inside the entry of the file and keyed by the stage definition
+    (stageIndices, stageNames, stage_type), so they are evicted together with the parsed record.
+    '''
+    record = load_tlsrecord(path, [tlsID], cache_dir, check)[tlsID]
+    entry = _entry_dir(path, cache_dir)
+    key = _key(_DERIVED_VERSION, tlsID, [int(i) for i in stageIndices], list(stageNames), stage_type)
+    tlsnp_file = os.path.join(entry, 'tlsnp_{}.npy'.format(key))
+    stages_file = os.path.join(entry, 'stages_{}.json'.format(key))
+    if os.path.exists(tlsnp_file) and os.path.exists(stages_file):
+        with phase('cache'):
+            with open(stages_file) as f:
+                stages = json.load(f)
+            stages = pd.DataFrame(stages['values'], columns=stages['columns'],
+                                  index=pd.Index(np.asarray(stages['index'], dtype=record.phase.dtype), name='subStageID'),
+                                  dtype=object)
+            return record, stages, np.load(tlsnp_file, mmap_mode='r')
+
+    stages = tlsStages(record, stageIndices, stageNames, stage_type)
+    tlsnp = tlsNumpy(record, stages)
+    with phase('cache'):
+        #temporary names per process, as pool workers may derive the same entry at once
+        tmp = '.{}.tmp'.format(os.getpid())
+        with open(stages_file + tmp, 'w') as f:
+            json.dump({'index': [int(i) for i in stages.index], 'columns': stages.columns.to_list(),
+                       'values': stages.to_numpy().tolist()}, f)
+        with open(tlsnp_file + tmp, 'wb') as f:
+            np.save(f, tlsnp)
+        os.replace(stages_file + tmp, stages_file)
+        os.replace(tlsnp_file + tmp, tlsnp_file)
+    return record, stages, tlsnp
+
+
+def evict_stale(cache_dir: str = CACHE_DIR, grace: float = _TMP_GRACE) -> list:
+    '''
+    Removes the cache entries whose tlsrecord file was deleted or modified, and half-written leftovers.
+    A directory without meta.json (e.g. '.tmp-...' of _write_entry) may be an entry another process is
+    writing, so it is only removed once it is older than 'grace' seconds.
+    Returns the paths of the removed entries.
+    '''
+    removed = []
+    if not os.path.isdir(cache_dir):
+        return removed
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        meta = _read_meta(entry)
+        if meta is None:
+            try:
+                stale = time.time() - os.path.getmtime(entry) > grace
+            except OSError: # renamed or removed by its writer in the meantime
+                continue
+        else:
+            try:
+                check = 'hash' if 'hash' in meta['source'] else 'mtime'
+                stale = meta['source'] != _source_signature(meta['source']['path'], check)
+            except OSError:
+                stale = True
+        if stale:
+            shutil.rmtree(entry, ignore_errors=True)
+            removed.append(entry)
+    return removed
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+from cycle_functions import cycleTable
+from query_functions import TLSRangeIndex
+from core_functions import _asRecord, tlsStages, tlsNumpy
+
+
+class ComparisonIndex:
+    '''
+    Range queries over the tlsnp of two or more records of the same junction (e.g. competing control programs),
+    aligned on one time axis: 'offsets' (s) is added to the times of every record. The first record is the baseline
+    of the ..._deltas queries, which return the differences of the other records to it (record 1.. x ...).
+        histogram(t0, t1, bins, density) - (record x stage x bin) green time histograms, as TLSRangeIndex
+        sums(t0, t1), splits(t0, t1)     - (record x (stage + 1)) green and yellow & red durations, and their fractions
+        cycleMeans(t0, t1)               - (record x column) means of the complete quasi-cycles starting in the range,
+                                           the columns 'cycleColumns' of cycle_functions.cycleTable
+        cycleLengths(t0, t1)             - the length of the cycle of every record in effect at the cycle starts of all
+                                           records in the range (one shared time axis for the per-cycle deltas)
+    Every query is a few searchsorted per record: the cycle means come from cumulative sums over the cycles.
+    The records may have different subStages, but their 'stages' must have the same stage columns.
+    '''
+    def __init__(self, tlsnps: list, stagesList: list, labels: list = None, cyclicity: int = 1, offsets = None):
+        assert len(tlsnps) >= 2, 'at least two records are compared'
+        self.stageNames = list(stagesList[0].columns)
+        assert all(list(stages.columns) == self.stageNames for stages in stagesList), 'the stages of the records differ'
+        self.labels = list(labels) if labels is not None else ['record {}'.format(k) for k in range(len(tlsnps))]
+        self.cyclicity = cyclicity
+        self.offsets = np.zeros(len(tlsnps)) if offsets is None else np.asarray(offsets, dtype=np.float64)
+        self.tlsnps = []
+        for tlsnp, offset in zip(tlsnps, self.offsets):
+            tlsnp = np.array(tlsnp, dtype=np.float64)
+            tlsnp[:,0] += offset
+            self.tlsnps.append(tlsnp)
+        self.indexes = [TLSRangeIndex(tlsnp) for tlsnp in self.tlsnps]
+        self.cycleColumns = ['length'] + ['{} green'.format(name) for name in self.stageNames] + ['yellow & red']
+        self.cycleTables = [cycleTable(tlsnp, stages, cyclicity) for tlsnp, stages in zip(self.tlsnps, stagesList)]
+        self._cycleStarts, self._cycleCumsums = [], []
+        for table in self.cycleTables:
+            complete = table[table['complete']]
+            self._cycleStarts.append(complete['start'].to_numpy())
+            values = complete[self.cycleColumns].to_numpy(dtype=np.float64)
+            self._cycleCumsums.append(np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)]))
+
+    def __len__(self):
+        return len(self.tlsnps)
+
+    @property
+    def timeRange(self) -> tuple:
+        return min(tlsnp[0,0] for tlsnp in self.tlsnps), max(tlsnp[-1,0] for tlsnp in self.tlsnps)
+
+    def histogram(self, t0, t1, bins, density: bool = False) -> np.ndarray:
+        return np.stack([index.histogram(t0, t1, bins, density) for index in self.indexes])
+
+    def sums(self, t0, t1) -> np.ndarray:
+        return np.stack([index.sums(t0, t1) for index in self.indexes])
+
+    def splits(self, t0, t1) -> np.ndarray:
+        sums = self.sums(t0, t1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return sums / sums.sum(axis=1, keepdims=True)
+
+    def cycleMeans(self, t0, t1) -> np.ndarray:
+        means = []
+        for starts, cumsum in zip(self._cycleStarts, self._cycleCumsums):
+            lo, hi = np.searchsorted(starts, t0, side='left'), np.searchsorted(starts, t1, side='right')
+            with np.errstate(divide='ignore', invalid='ignore'):
+                means.append((cumsum[hi] - cumsum[lo]) / (hi - lo))
+        return np.stack(means)
+
+    def cycleLengths(self, t0, t1):
+        '''
+        Returns (times, lengths): the cycle starts of all records in [t0, t1] (sorted) and the (record x time)
+        length of the cycle of every record in effect at those times (NaN outside of its complete cycles)
+        '''
+        times = np.unique(np.concatenate([starts[(starts >= t0) & (starts <= t1)] for starts in self._cycleStarts]))
+        lengths = np.full((len(self), times.shape[0]), np.nan)
+        for k, (starts, cumsum) in enumerate(zip(self._cycleStarts, self._cycleCumsums)):
+            cycle = np.searchsorted(starts, times, side='right') - 1
+            length = np.diff(cumsum[:,0])
+            inCycle = (cycle >= 0) & (times < starts[np.maximum(cycle, 0)] + length[np.maximum(cycle, 0)]) \
+                if starts.shape[0] else np.zeros(times.shape[0], dtype=bool)
+            lengths[k, inCycle] = length[cycle[inCycle]]
+        return times, lengths
+
+    def histogram_deltas(self, t0, t1, bins, density: bool = False) -> np.ndarray:
+        histograms = self.histogram(t0, t1, bins, density)
+        return histograms[1:] - histograms[:1]
+
+    def split_deltas(self, t0, t1) -> np.ndarray:
+        splits = self.splits(t0, t1)
+        return splits[1:] - splits[:1]
+
+    def cycle_deltas(self, t0, t1) -> np.ndarray:
+        means = self.cycleMeans(t0, t1)
+        return means[1:] - means[:1]
+
+    def cycle_length_deltas(self, t0, t1):
+        times, lengths = self.cycleLengths(t0, t1)
+        return times, lengths[1:] - lengths[:1]
+
+    def summary(self, t0, t1) -> pd.DataFrame:
+        #split and mean per-cycle statistics of every record in the range, and their deltas to the baseline
+        splits = pd.DataFrame(self.splits(t0, t1), index = self.labels,
+                              columns = ['{} split'.format(name) for name in self.stageNames] + ['yellow & red split'])
+        cycles = pd.DataFrame(self.cycleMeans(t0, t1), index = self.labels,
+                              columns = ['mean cycle {}'.format(column) for column in self.cycleColumns])
+        table = pd.concat([splits, cycles], axis=1)
+        deltas = (table - table.iloc[0]).add_suffix(' delta')
+        return pd.concat([table, deltas], axis=1)
+
+
+def compare_records(records: list, stageIndices: list, stageNames: list, **kwargs) -> ComparisonIndex:
+    '''
+    ComparisonIndex of records (record_functions.TLSRecord or single-TLS DataFrames) of the same junction.
+    The optional keyword arguments are
+        labels     - the name of every record (default its TLS id and programIDs)
+        align      - 'time' (the simulation time, default), 'start' (every record starts at 0) or a list of offsets (s)
+        stage_type - see tlsStages; stageIndices and stageNames are shared by the records
+        cyclicity_type
+    '''
+    align = kwargs.get('align', 'time')
+    records = [_asRecord(record) for record in records]
+    labels = kwargs.get('labels', ['{} ({})'.format(record.tlsID, ', '.join(map(str, record.programIDs)))
+                                   for record in records])
+    stagesList = [tlsStages(record, stageIndices, stageNames, kwargs.get('stage_type', 'mode')) for record in records]
+    tlsnps = [tlsNumpy(record, stages) for record, stages in zip(records, stagesList)]
+    if isinstance(align, str):
+        if align == 'time':
+            offsets = None
+        elif align == 'start':
+            offsets = [-tlsnp[0,0] for tlsnp in tlsnps]
+        else:
+            raise ValueError('the input value for \'align\' is invalid')
+    else:
+        offsets = align
+    return ComparisonIndex(tlsnps, stagesList, labels, kwargs.get('cyclicity_type', 1), offsets)
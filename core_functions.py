@@ -0,0 +1,92 @@
+'''
+The compute core of the cluster plot: the stage definition (tlsStages) and the event array (tlsNumpy) of a
+tlsrecord. Only numpy and pandas are imported, so pool workers and machines without a GUI stack can use it
+without importing matplotlib (plot_functions re-exports these functions).
+'''
+
+import numpy as np
+import pandas as pd
+from record_functions import TLSRecord
+from profile_functions import phase
+
+
+def _asRecord(tlsdf) -> TLSRecord:
+    #the compact event store (record_functions.TLSRecord) read by the functions below
+    return tlsdf if isinstance(tlsdf, TLSRecord) else TLSRecord.from_frame(tlsdf)
+
+def tlsStages(tlsdf: pd.DataFrame,
+                stageIndices: list,
+                stageNames: list,
+                definition: str = 'mode') -> pd.DataFrame:
+    '''
+    There are two ways for definition of subStage definition
+    1) definition from the statistical mode of movement indicators
+        say we have stageIndices = [0,0,0,1,1,1,0,1]
+        and the state of a subStage i is 'y g g r r r g r' 
+        then the states at subStage i are stage0:g (3g over 1y), stage1:r (4r)
+        (a tie goes to the indicator that comes first, as in statistics.mode)
+        
+    2) definition from the first movement indicator
+        say we have sigGruppenIndex = [>0<,0,0,>1<,1,1,0,1]
+        and the state of subStage i is '>y< g g >r< r r g r' 
+        then the states at subStage i is stage0:y , stage1:r
+
+    Only the unique (subStageID, state code) pairs are looked at, and the indicators are read from the
+    uint8 state table of the record, so the cost does not grow with the record length.
+    '''
+    with phase('tlsStages'):
+        if definition not in ('mode', 'first'):
+            raise ValueError('the input value for \'definition\' is invalid')
+        record = _asRecord(tlsdf)
+        numStates = len(record.states)
+        subStageCodes, subStageIndex = pd.factorize(np.asarray(record.phase))
+        pairs = np.unique(subStageCodes.astype(np.int64)*numStates + np.asarray(record.stateCode))
+        assert len(pairs) == len(subStageIndex), 'movement definition conflict'
+        indicators = record.stateTable[pairs % numStates] # (subStage x link), rows in the order of subStageIndex
+
+        stageIndices = np.asarray(stageIndices)
+        movements = stageIndices[:, None] == np.arange(len(stageNames))[None, :] # (link x stage)
+        if definition == 'mode':
+            symbols = np.unique(indicators)
+            isSymbol = indicators[:, :, None] == symbols[None, None, :] # (subStage x link x symbol)
+            counts = np.einsum('lsa,lm->sma', isSymbol.transpose(1, 0, 2).astype(np.int64), movements.astype(np.int64))
+            linkPos = np.arange(len(stageIndices))[None, :, None, None]
+            firstPos = np.where(isSymbol[:, :, None, :] & movements[None, :, :, None],
+                                linkPos, len(stageIndices)).min(axis=1) # (subStage x stage x symbol)
+            definitions = symbols[np.argmax(counts*(len(stageIndices) + 1) - firstPos, axis=2)]
+        else:
+            definitions = indicators[:, np.argmax(movements, axis=0)]
+        definitions = np.ascontiguousarray(definitions, dtype=np.uint8).view('S1').astype(str).astype(object)
+        return pd.DataFrame(definitions,
+                            columns = stageNames,
+                            index = pd.Index(subStageIndex, name = 'subStageID'))
+
+def tlsNumpy(tlsdf: pd.DataFrame,
+             stages: pd.DataFrame) -> np.ndarray:
+    '''
+    Returns a (event x (2 + stage + 1)) array with the columns
+        time, subStageID, green duration of each stage, amber & red duration
+    The duration of an event is put in the column of every stage that is green ('g') in its subStage,
+    so a stage green at several subStages collects all of them. Events of subStages green for
+    no stage go to the last column. Durations not applicable to a column (and of the last event) are NaN.
+    '''
+    with phase('tlsNumpy'):
+        if isinstance(tlsdf, TLSRecord):
+            time, subStageIDs = np.asarray(tlsdf.time, dtype=np.float64), np.asarray(tlsdf.phase)
+        else:
+            #only two columns are needed, the state strings are not encoded for this
+            time = tlsdf['time'].to_numpy(dtype=np.float64)
+            subStageIDs = tlsdf['subStageID' if 'subStageID' in tlsdf else 'phase'].to_numpy()
+        rows = stages.index.get_indexer(subStageIDs)
+        assert (rows >= 0).all(), 'subStageID not found in the stage definition'
+        isGreen = stages.to_numpy() == 'g'
+        columns = np.column_stack([isGreen, ~isGreen.any(axis=1)]) # (subStage x (stage + 1))
+
+        duration = np.empty_like(time)
+        duration[:-1] = np.diff(time)
+        duration[-1:] = np.nan
+        tlsnp = np.full((time.shape[0], 2 + columns.shape[1]), np.nan)
+        tlsnp[:,0] = time
+        tlsnp[:,1] = subStageIDs
+        np.copyto(tlsnp[:,2:], duration[:,None], where = columns[rows])
+        return tlsnp
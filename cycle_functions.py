@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+
+def _reverseCumMin(a):
+    return np.minimum.accumulate(a[::-1])[::-1]
+
+def cycleStarts(tlsnp: np.ndarray,
+                stages: pd.DataFrame,
+                cyclicity: int = 1) -> np.ndarray:
+    '''
+    Returns the event indices at which a quasi-cycle starts (the first one is always 0).
+    There are 2 definitions of a quasi-cycle
+    1) a cycle lasts until one of the subStages recurs (the recurring event starts the next cycle).
+    2) a cycle lasts until all subStages in 'stages' have appeared (the completing event starts the next cycle).
+    The last event of tlsnp has no duration and never starts a cycle.
+
+    For a cycle starting at event s, the next start is found in O(1) from arrays prepared in one pass:
+    1) the smallest next-occurrence index among the events from s on (a reversed cumulative minimum)
+    2) the largest among the subStages of their first occurrence from s on
+    '''
+    numEvents = tlsnp.shape[0] - 1
+    if numEvents <= 0:
+        return np.zeros(0, dtype=np.int64)
+    codes = stages.index.get_indexer(tlsnp[:numEvents,1])
+    positions = np.arange(numEvents)
+    if cyclicity == 1:
+        order = np.lexsort((positions, codes))
+        nextOccurrence = np.full(numEvents, numEvents)
+        sameAsNext = codes[order[1:]] == codes[order[:-1]]
+        nextOccurrence[order[:-1][sameAsNext]] = order[1:][sameAsNext]
+        nextStart = _reverseCumMin(nextOccurrence)
+    elif cyclicity == 2:
+        nextStart = positions + 1
+        for code in range(len(stages.index)):
+            nextStart = np.maximum(nextStart, _reverseCumMin(np.where(codes == code, positions, numEvents)))
+    else:
+        raise ValueError('the input value for \'cyclicity\' is invalid')
+
+    starts = []
+    s = 0
+    while s < numEvents:
+        starts.append(s)
+        s = nextStart[s]
+    return np.array(starts, dtype=np.int64)
+
+def cycleLabels(tlsnp: np.ndarray,
+                stages: pd.DataFrame,
+                cyclicity: int = 1) -> np.ndarray:
+    '''
+    Returns the quasi-cycle number (0, 1, 2, ...) of every event of tlsnp, see cycleStarts
+    '''
+    isStart = np.zeros(tlsnp.shape[0], dtype=np.int64)
+    isStart[cycleStarts(tlsnp, stages, cyclicity)] = 1
+    return np.maximum(np.cumsum(isStart) - 1, 0)
+
+def cycleGreenBars(tlsnp: np.ndarray,
+                   stages: pd.DataFrame,
+                   cyclicity: int = 1):
+    '''
+    Returns the stacked green bars of the cyclicity plot as arrays (x, bottom, height, stage)
+        x      - start time of the quasi-cycle of the green event
+        bottom - green time accumulated in the same quasi-cycle before the event
+        height - green duration of the event
+        stage  - column index of the stage (0 for the first stage in 'stages')
+    A stage green at several subStages, or several stages green at once, each get their own bar.
+    '''
+    labels = cycleLabels(tlsnp, stages, cyclicity)
+    cycleTimes = tlsnp[cycleStarts(tlsnp, stages, cyclicity), 0]
+    greens = tlsnp[:-1, 2:2+len(stages.columns)]
+    rows, stage = np.nonzero(~np.isnan(greens))
+    height = greens[rows, stage]
+    before = np.cumsum(height) - height
+    cycle = labels[rows]
+    firstInCycle = np.append(True, cycle[1:] != cycle[:-1])
+    bottom = before - np.maximum.accumulate(np.where(firstInCycle, before, 0))
+    return cycleTimes[cycle], bottom, height, stage
+
+def cycleTable(tlsnp: np.ndarray,
+               stages: pd.DataFrame,
+               cyclicity: int = 1) -> pd.DataFrame:
+    '''
+    Returns one row per quasi-cycle (see cycleStarts) with the columns
+        start, end, length  - times (s) of the cycle; a cycle ends where the next starts, the last at the last event
+        events              - number of events in the cycle
+        <stage> green       - green time (s) of every stage in the cycle (as the bars of the cyclicity plot)
+        yellow & red        - time (s) of the cycle without any green stage (the lost time of the green split)
+        <stage> split       - green time of the stage over the cycle length
+        complete            - False for the last cycle, which the end of the record may have cut short
+    All cycles are summed at once with np.add.reduceat, without any plotting.
+    '''
+    stageNames = list(stages.columns)
+    starts = cycleStarts(tlsnp, stages, cyclicity)
+    columns = ['start', 'end', 'length', 'events'] + ['{} green'.format(name) for name in stageNames] \
+              + ['yellow & red'] + ['{} split'.format(name) for name in stageNames] + ['complete']
+    if starts.shape[0] == 0:
+        return pd.DataFrame(columns = columns).rename_axis('cycle')
+    numEvents = tlsnp.shape[0] - 1
+    durations = np.add.reduceat(np.nan_to_num(tlsnp[:numEvents, 2:]), starts, axis=0)
+    start = tlsnp[starts, 0]
+    end = np.append(start[1:], tlsnp[numEvents, 0])
+    length = end - start
+    with np.errstate(divide='ignore', invalid='ignore'):
+        split = durations[:, :len(stageNames)] / length[:, None]
+    table = pd.DataFrame(np.column_stack([start, end, length, np.diff(np.append(starts, numEvents)), durations, split]),
+                         columns = columns[:-1])
+    table['events'] = table['events'].astype(np.int64)
+    table['complete'] = np.arange(starts.shape[0]) < starts.shape[0] - 1
+    return table.rename_axis('cycle')
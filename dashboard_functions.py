@@ -0,0 +1,215 @@
+from collections import OrderedDict
+import numpy as np
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+import matplotlib.gridspec as gridspec
+from matplotlib.collections import PolyCollection
+from matplotlib.widgets import RangeSlider, Slider
+import profile_functions
+from profile_functions import phase
+from core_functions import tlsStages, tlsNumpy
+from plot_functions import SLIDER_INIT, _BlitScheduler, _setFonts
+from record_functions import read_tlsrecord
+from query_functions import TLSRangeIndex
+from lod_functions import PlanLOD, planLOD, _barVerts
+
+
+def _perTLS(value, tlsID):
+    #the value of a TLS in a {tlsID: value} mapping, or the value itself when it is shared by all TLSs
+    return value[tlsID] if isinstance(value, dict) else value
+
+
+class TLSPanelCache:
+    '''
+    (stages, tlsnp, index) of the TLSs of a multi-TLS record, computed the first time a TLS is asked for.
+    Only the 'size' most recently used TLSs are kept, so the memory is that of the visible panels
+    (plus the compact records) however many TLSs the network has.
+    'stageIndices' and 'stageNames' are {tlsID: list}, or lists shared by all TLSs.
+    '''
+    def __init__(self, records: dict, stageIndices, stageNames, stage_type: str = 'mode', size: int = 9):
+        self.records = records
+        self.stageIndices = stageIndices
+        self.stageNames = stageNames
+        self.stage_type = stage_type
+        self.size = size
+        self.computed = 0 # number of (re)computations, for checking the laziness
+        self._panels = OrderedDict()
+
+    def __getitem__(self, tlsID):
+        if tlsID in self._panels:
+            self._panels.move_to_end(tlsID)
+            return self._panels[tlsID]
+        record = self.records[tlsID]
+        stageIndices = _perTLS(self.stageIndices, tlsID)
+        assert len(stageIndices) == record.stateTable.shape[1], \
+            'The grouping of movements into stages of {} is not valid'.format(tlsID)
+        with phase('dashboard_panel'):
+            stages = tlsStages(record, stageIndices, _perTLS(self.stageNames, tlsID), self.stage_type)
+            tlsnp = tlsNumpy(record, stages)
+            panel = (stages, tlsnp, TLSRangeIndex(tlsnp))
+        self.computed += 1
+        self._panels[tlsID] = panel
+        while len(self._panels) > self.size:
+            self._panels.popitem(last=False)
+        return panel
+
+    def __contains__(self, tlsID):
+        return tlsID in self._panels
+
+
+class _Dashboard:
+    #the small multiples of dashboardPlot_TLS: 'rows' x 'cols' cells of (split, plan) axes showing the TLSs from 'first' on
+    def __init__(self, fig, tlsIDs, cache, rows, cols, bar_colours):
+        self.fig = fig
+        self.tlsIDs = tlsIDs
+        self.cache = cache
+        self.rows = rows
+        self.cols = cols
+        self.bar_colours = bar_colours
+        self.first = 0
+        self.cells = []
+        gs = gridspec.GridSpec(rows, cols, figure = fig, left = 0.08, right = 0.92, top = 0.95, bottom = 0.14,
+                               hspace = 0.6, wspace = 0.35)
+        for k in range(rows*cols):
+            inner = gridspec.GridSpecFromSubplotSpec(2, 1, subplot_spec = gs[k], height_ratios = [1, 3], hspace = 0.1)
+            self.cells.append((fig.add_subplot(inner[0]), fig.add_subplot(inner[1])))
+        self.splits = [None]*len(self.cells)
+        self.shown = [None]*len(self.cells)
+
+    @property
+    def axes(self) -> list:
+        return [ax for cell in self.cells for ax in cell]
+
+    @property
+    def visible(self) -> list:
+        return self.tlsIDs[self.first:self.first + len(self.cells)]
+
+    def _drawCell(self, k, tlsID, t0, t1):
+        axSplit, axPlan = self.cells[k]
+        axSplit.clear()
+        axPlan.clear()
+        self.shown[k] = tlsID
+        if tlsID is None:
+            axSplit.set_visible(False)
+            axPlan.set_visible(False)
+            return
+        axSplit.set_visible(True)
+        axPlan.set_visible(True)
+        stages, tlsnp, _ = self.cache[tlsID]
+        stageNames = stages.columns
+        colours = list(_perTLS(self.bar_colours, tlsID) or ['C{}'.format(i) for i in range(len(stageNames))])
+        self.splits[k] = PolyCollection(np.zeros((0, 4, 2)), linewidths = 0,
+                                        facecolors = mpl.colors.to_rgba_array(colours[:len(stageNames)] + ['grey']))
+        axSplit.add_collection(self.splits[k])
+        axSplit.set_xlim(0, 1)
+        axSplit.set_ylim(0, 1)
+        axSplit.set_axis_off()
+        axSplit.set_title(tlsID, fontsize = 9, fontweight = 'bold')
+        PlanLOD(axPlan, tlsnp, stages)
+        axPlan.set_yticks(np.arange(len(stageNames)))
+        axPlan.set_yticklabels(stageNames, fontsize = 7)
+        axPlan.tick_params(axis = 'x', labelsize = 7)
+        axPlan.xaxis.grid(True, which = 'minor', linewidth = 0.5)
+        axPlan.set_ylim(-0.5, len(stageNames)-0.5)
+        self._updateCell(k, t0, t1)
+
+    def _updateCell(self, k, t0, t1):
+        tlsID = self.shown[k]
+        if tlsID is None:
+            return
+        axSplit, axPlan = self.cells[k]
+        all_signal = self.cache[tlsID][2].sums(t0, t1)
+        if all_signal.sum() > 0:
+            edges = np.append(0, np.cumsum(all_signal)) / all_signal.sum()
+            self.splits[k].set_verts(_barVerts(edges[:-1], edges[1:], 0, 1))
+        else: # no event in the range, not the split of the previous one
+            self.splits[k].set_verts([])
+        axPlan.set_xlim(t0, t1)
+        planLOD(axPlan).update(t0, t1)
+
+    def show(self, first, t0, t1):
+        '''
+        Shows the TLSs from the 'first' on; only the cells whose TLS changed are redrawn
+        '''
+        self.first = first
+        visible = self.visible
+        for k in range(len(self.cells)):
+            tlsID = visible[k] if k < len(visible) else None
+            if tlsID != self.shown[k] or tlsID is None:
+                self._drawCell(k, tlsID, t0, t1)
+
+    def update(self, t0, t1):
+        for k in range(len(self.cells)):
+            self._updateCell(k, t0, t1)
+
+
+def dashboardPlot_TLS(records, stageIndices, stageNames, **kwargs):
+    '''
+    Small multiples of many TLSs of one tlsrecord: a green split bar and the signal plan of every TLS,
+    'rows' x 'cols' of them at a time (default 3 x 3), all ranged by one shared time slider.
+        records      - {tlsID: TLSRecord} from record_functions.read_tlsrecord, or the path of the tlsrecord
+        stageIndices - {tlsID: stageIndices}, or one list for all TLSs (as in clusterPlot_TLS)
+        stageNames   - {tlsID: stageNames}, or one list for all TLSs
+    With mappings, only the TLSs in 'stageIndices' are shown (in the order of the record).
+    The scroll wheel (or the slider on the right) moves through the TLSs a row at a time. The stages, tlsnp and
+    range index of a TLS are only computed when it becomes visible, and only the last 'cache_size' TLSs shown
+    (default the visible ones) are kept, see TLSPanelCache.
+    The other optional keyword arguments are 'bar_colours' ({tlsID: colours} or one list), 'stage_type' and 'tls_ids'.
+    Returns (time_slider, scroll_slider, dashboard); keep them referenced while the plot is shown.
+    '''
+    if kwargs.get('profile', None):
+        profile_functions.enable(kwargs['profile'])
+    rows = kwargs.get('rows', 3)
+    cols = kwargs.get('cols', 3)
+    stage_type = kwargs.get('stage_type', 'mode')
+    bar_colours = kwargs.get('bar_colours', None)
+    cache_size = max(kwargs.get('cache_size', rows*cols), rows*cols)
+    tls_ids = kwargs.get('tls_ids', list(stageIndices) if isinstance(stageIndices, dict) else None)
+
+    if not isinstance(records, dict):
+        with phase('record'):
+            records = read_tlsrecord(records, tls_ids)
+    tlsIDs = [tlsID for tlsID in records if tls_ids is None or tlsID in tls_ids]
+    if not tlsIDs:
+        if tls_ids is None:
+            raise ValueError('the record has no tlsState events')
+        if len(tls_ids) == 0:
+            raise ValueError('no TLS to show, tls_ids is empty')
+        raise ValueError('the TLSs {} are not in the record'.format(list(tls_ids)))
+    #the time range of the slider, from the record columns (without computing any panel)
+    tmin = min(records[tlsID].time[0] for tlsID in tlsIDs)
+    tmax = max(records[tlsID].time[-1] for tlsID in tlsIDs)
+    cache = TLSPanelCache(records, stageIndices, stageNames, stage_type, cache_size)
+
+    _setFonts()
+    fig = plt.figure(figsize=(12, 8))
+    dashboard = _Dashboard(fig, tlsIDs, cache, rows, cols, bar_colours)
+    axtime = fig.add_axes([0.3, 0.02, 0.4, 0.05])
+    time_slider = RangeSlider(ax = axtime, label = 'Plot range', valmin = tmin, valmax = tmax,
+                              valinit = (max(tmin, SLIDER_INIT[0]), min(tmax, max(tmin, SLIDER_INIT[0]) + SLIDER_INIT[1] - SLIDER_INIT[0])),
+                              valfmt = '%d s')
+    numRows = max(int(np.ceil(len(tlsIDs) / cols)) - rows, 0)
+    axscroll = fig.add_axes([0.95, 0.14, 0.015, 0.81])
+    scroll_slider = Slider(ax = axscroll, label = '', valmin = 0, valmax = max(numRows, 1), valinit = 0,
+                           valstep = 1, orientation = 'vertical', valfmt = '%d')
+    scroll_slider.valtext.set_visible(False)
+    axscroll.set_ylim(max(numRows, 1), 0) # the first row at the top
+
+    def time_update(val):
+        dashboard.update(*time_slider.val)
+    time_slider.drawon = False
+    time_slider.on_changed(_BlitScheduler(fig, [axtime] + dashboard.axes, time_update))
+
+    def scroll_update(val):
+        dashboard.show(int(val)*cols, *time_slider.val)
+        fig.canvas.draw_idle()
+    scroll_slider.on_changed(profile_functions.callback('dashboard_scroll', scroll_update))
+
+    def on_scroll(event):
+        row = min(max(scroll_slider.val - event.step, 0), numRows)
+        if row != scroll_slider.val:
+            scroll_slider.set_val(row)
+    fig.canvas.mpl_connect('scroll_event', on_scroll)
+
+    dashboard.show(0, *time_slider.val)
+    return time_slider, scroll_slider, dashboard
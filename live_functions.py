@@ -0,0 +1,283 @@
+import time
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+import plot_functions
+from core_functions import tlsStages, tlsNumpy
+from plot_functions import (cluster_axes, plot_panels, update_panels, universal_widgets,
+                            SLIDER_INIT, _barVerts)
+from lod_functions import planLOD
+from record_functions import GrowableArray, TLSRecordTail
+from cycle_functions import cycleStarts, cycleGreenBars
+from query_functions import TLSRangeIndex
+from rolling_functions import RollingTLS
+
+
+class LiveTLS:
+    '''
+    'tlsnp' (see plot_functions.tlsNumpy) of a TLSRecordTail, extended while the file is being written.
+    update() polls the file and computes the new events only: the previous last event (whose duration was
+    not known yet) is completed and the rest appended to a GrowableArray, so following a run costs amortized
+    O(1) per event. The TLSRangeIndex 'index' of the slider is extended at the same time.
+    The stage definition is extended only when a new subStageID appears; the known subStages keep their
+    definition (every subStage has one state), so the rows already computed stay valid.
+    With a 'window', only the last 'window' seconds or quasi-cycles ('unit', see rolling_functions.RollingTLS)
+    are kept: the completed rows are pushed to a RollingTLS, which is then the 'index', and the processed
+    events are discarded from the tail, so the memory stays bounded however long the run is.
+    '''
+    def __init__(self, tail: TLSRecordTail, stageIndices: list, stageNames: list, stage_type: str = 'mode',
+                 window: float = None, unit: str = 'seconds', bins = np.linspace(0, 120, 11), cyclicity: int = 1):
+        self.tail = tail
+        self.stageIndices = stageIndices
+        self.stageNames = stageNames
+        self.stage_type = stage_type
+        self.window = window
+        self.unit = unit
+        self.bins = bins
+        self.cyclicity = cyclicity
+        self.stages = None
+        self.index = None
+        self._tlsnp = GrowableArray((2 + len(stageNames) + 1,))
+        self._last = np.zeros((0, 2 + len(stageNames) + 1))
+        self._start = 0 # the event of the tail from which the next update is computed
+
+    def __len__(self):
+        if self.window is None:
+            return len(self._tlsnp)
+        return (len(self.index) if self.index is not None else 0) + self._last.shape[0]
+
+    @property
+    def tlsnp(self) -> np.ndarray:
+        if self.window is None:
+            return self._tlsnp.data
+        if self.index is None:
+            return self._last
+        return np.concatenate([self.index.events.rows(), self._last])
+
+    def update(self) -> int:
+        '''
+        Returns the number of new events
+        '''
+        polled = self.tail.poll()
+        if polled == 0:
+            return 0
+        assert len(self.stageIndices) == len(next(iter(self.tail.states))), 'The grouping of movements into stages is not valid'
+        new = self.tail.record[self._start:]
+        if self.stages is None or not np.isin(new.phase, self.stages.index).all():
+            stages = tlsStages(new, self.stageIndices, self.stageNames, self.stage_type)
+            self.stages = stages if self.stages is None else pd.concat([self.stages, stages[~stages.index.isin(self.stages.index)]])
+        rows = tlsNumpy(new, self.stages)
+
+        if self.window is None:
+            if len(self._tlsnp) > 0:
+                self._tlsnp.data[-1] = rows[0]
+                rows = rows[1:]
+            self._tlsnp.extend(rows)
+            self._start = len(self.tail) - 1
+            if self.index is None:
+                self.index = TLSRangeIndex(self.tlsnp)
+            else:
+                self.index.extend(self.tlsnp)
+        else:
+            if self.index is None:
+                self.index = RollingTLS(self.stages, self.window, self.unit, self.bins, self.cyclicity)
+            self.index.stages = self.stages
+            self.index.push(rows[:-1])
+            self._last = rows[-1:]
+            self.tail.discard(len(self.tail) - 1)
+            self._start = 0
+        return polled
+
+
+class _CollectionStack:
+    '''
+    Bars added to an axes in batches. The batches are merged like the digits of a binary counter,
+    so there are O(log N) PolyCollections and every bar is copied O(log N) times over a run.
+    '''
+    def __init__(self, ax):
+        self.ax = ax
+        self.levels = [] # (vertices, rgba, PolyCollection), largest first
+
+    def append(self, verts, rgba):
+        if verts.shape[0] == 0:
+            return
+        while self.levels and self.levels[-1][0].shape[0] <= verts.shape[0]:
+            lowerVerts, lowerRgba, collection = self.levels.pop()
+            collection.remove()
+            verts, rgba = np.concatenate([lowerVerts, verts]), np.concatenate([lowerRgba, rgba])
+        collection = PolyCollection(verts, facecolors = rgba, linewidths = 0)
+        self.ax.add_collection(collection)
+        self.levels.append((verts, rgba, collection))
+
+
+class _LivePanels:
+    #the panels of clusterPlot_TLS extended on every refresh with the events added to a LiveTLS
+    def __init__(self, live, axes, widgets, cycleBars, cyclicity_type, bar_colours, timer):
+        self.live = live
+        self.axSplit, self.axDist, self.axCyclic, self.axPlan = axes
+        self.time_slider = widgets[0]
+        self.cyclicity_type = cyclicity_type
+        self.rgba = mpl.colors.to_rgba_array(bar_colours[:len(live.stageNames)])
+        self.timer = timer
+        self.cyclicTop = 0
+        self._initBars(cycleBars)
+        self.extend()
+
+    def _initBars(self, cycleBars):
+        #the plan of plot_signalPlan summarises the later events as well (drawn by update_panels)
+        self.plan = planLOD(self.axPlan)
+        #the bars of the open (last) quasi-cycle change until it completes: redrawn from its start on every refresh
+        cycleBars.remove()
+        self.cycles = _CollectionStack(self.axCyclic)
+        self.cycleStart = 0
+        self.openCycle = PolyCollection(np.zeros((0, 4, 2)), linewidths = 0)
+        self.axCyclic.add_collection(self.openCycle)
+
+    def _cycleBars(self, tlsnp):
+        x, bottom, height, stage = cycleGreenBars(tlsnp, self.live.stages, self.cyclicity_type)
+        if height.shape[0] > 0:
+            self.cyclicTop = max(self.cyclicTop, (bottom+height).max())
+        return _barVerts(x-2.5, x+2.5, bottom, bottom+height), self.rgba[stage]
+
+    def extend(self):
+        tlsnp, stages = self.live.tlsnp, self.live.stages
+        self.plan.extend(tlsnp, stages)
+        self.axPlan.set_yticks(np.arange(len(stages.columns)))
+
+        starts = cycleStarts(tlsnp[self.cycleStart:], stages, self.cyclicity_type)
+        if len(starts) > 1:
+            #the quasi-cycles before the last start are complete and do not change any more
+            self.cycles.append(*self._cycleBars(tlsnp[self.cycleStart:self.cycleStart + starts[-1] + 1]))
+            self.cycleStart += starts[-1]
+        verts, rgba = self._cycleBars(tlsnp[self.cycleStart:])
+        self.openCycle.set_verts(verts)
+        self.openCycle.set_facecolor(rgba)
+        self.axCyclic.set_ylim(0, 1.05*self.cyclicTop)
+
+    def refresh(self):
+        if self.live.update() == 0:
+            if self.live.tail.finished:
+                self.timer.stop()
+            return
+        self.extend()
+        tlsnp = self.live.tlsnp
+        if not plot_functions.density:
+            heights = self.live.index.histogram(-np.inf, np.inf, plot_functions.dist_bins)
+            plot_functions.dist_ylim = (0, 1.05*max(heights.max(), 1))
+            self.axDist.set_ylim(plot_functions.dist_ylim)
+
+        #the slider range grows with the record; a selection reaching the end moves along with it
+        #(a selection cut short by the start of the record keeps the initial width of the slider).
+        #With a rolling window, the range also starts at the first event of the window.
+        slider = self.time_slider
+        t0, t1 = slider.val
+        width = max(t1 - t0, SLIDER_INIT[1] - SLIDER_INIT[0]) if t0 <= slider.valmin else t1 - t0
+        following = t1 >= slider.valmax
+        if self.live.window is not None:
+            slider.valmin = tlsnp[0,0]
+        slider.valmax = tlsnp[-1,0]
+        slider.ax.set_xlim(slider.valmin, slider.valmax)
+        if following:
+            t0, t1 = slider.valmax - width, slider.valmax
+        elif t0 < slider.valmin:
+            t0, t1 = slider.valmin, slider.valmin + width
+        slider.eventson = False
+        slider.set_val((max(slider.valmin, t0), min(slider.valmax, t1)))
+        slider.eventson = True
+        update_panels(slider.val[0], slider.val[1], self.live.index, self.axSplit, self.axDist, self.axCyclic, self.axPlan)
+        self.axSplit.figure.canvas.draw_idle()
+
+
+class _RollingPanels(_LivePanels):
+    #the panels of a rolling window: the plan and the cyclicity bars are redrawn from the window on every refresh
+    def _initBars(self, cycleBars):
+        self.plan = planLOD(self.axPlan)
+        self.cycleBars = cycleBars
+
+    def extend(self):
+        tlsnp, stages = self.live.tlsnp, self.live.stages
+        self.plan.reset(tlsnp, stages)
+        self.axPlan.set_yticks(np.arange(len(stages.columns)))
+        self.cyclicTop = 0
+        verts, rgba = self._cycleBars(tlsnp)
+        self.cycleBars.set_verts(verts)
+        self.cycleBars.set_facecolor(rgba)
+        self.axCyclic.set_ylim(0, 1.05*max(self.cyclicTop, 1))
+
+
+def followPlot_TLS(tail: TLSRecordTail, stageIndices: list, stageNames: list, **kwargs):
+    '''
+    The cluster plot of clusterPlot_TLS for a tlsrecord that is still being written, e.g.
+        followPlot_TLS(TLSRecordTail('./run/tlsrecord.xml', 'J'), stageIndices, stageNames, interval = 1000)
+    Every 'interval' ms (default 1000) the events appended to the file are parsed and added to the panels
+    without recomputing the history; the refresh stops once the closing tag of the file has been read.
+    The other optional keyword arguments are those of clusterPlot_TLS. The green time distribution keeps
+    the bins of 'dist_range' (default (0, 120) s), since the greens to come are not known yet.
+    With 'window' (seconds, or quasi-cycles when 'window_unit' = 'cycles'), the panels and the memory are
+    limited to the last part of the run as a rolling window (see LiveTLS and rolling_functions.RollingTLS).
+    This waits until the first two events of the TLS are in the file (a ValueError if the file ends with fewer).
+    Returns (time_slider, button, radio1, radio2, timer); keep them referenced while the plot is shown.
+    '''
+    bar_colours = list(kwargs.get('bar_colours', [mini_dict['color'] for mini_dict in mpl.rcParams["axes.prop_cycle"][:len(stageNames)]]))
+    num_bins = kwargs.get('num_bins', 10)
+    cyclicity_type = kwargs.get('cyclicity_type', 1)
+    stage_type = kwargs.get('stage_type', 'mode')
+    dist_range = kwargs.get('dist_range', (0, 120))
+    interval = kwargs.get('interval', 1000)
+    window = kwargs.get('window', None)
+    window_unit = kwargs.get('window_unit', 'seconds')
+
+    live = LiveTLS(tail, stageIndices, stageNames, stage_type, window, window_unit,
+                   np.linspace(dist_range[0], dist_range[1], num_bins + 1), cyclicity_type)
+    #the stage grouping is checked by the first update with events, before any waiting for more
+    while True:
+        live.update()
+        if len(live) >= 2:
+            break
+        if tail.finished:
+            raise ValueError('{} has {} event(s) of the TLS {}, at least 2 are needed'.format(tail.path, len(live), tail.tlsID))
+        time.sleep(interval/1000)
+
+    fig = plt.figure(figsize=(12, 8))
+    axes = cluster_axes(fig)
+    widgets = universal_widgets(live.tlsnp, *axes, index = live.index)
+    if window is not None:
+        #a rolling window starts at the head of the record
+        time_slider, tlsnp = widgets[0], live.tlsnp
+        time_slider.valmin = tlsnp[0,0]
+        time_slider.ax.set_xlim(tlsnp[0,0], tlsnp[-1,0])
+        time_slider.eventson = False
+        time_slider.set_val((max(tlsnp[0,0], tlsnp[-1,0] - (SLIDER_INIT[1] - SLIDER_INIT[0])), tlsnp[-1,0]))
+        time_slider.eventson = True
+    cycleBars = plot_panels(axes, widgets[0], live.tlsnp, live.stages, num_bins, cyclicity_type, list(bar_colours), dist_range)
+
+    timer = fig.canvas.new_timer(interval = interval)
+    panels = (_LivePanels if window is None else _RollingPanels)(live, axes, widgets, cycleBars, cyclicity_type, bar_colours, timer)
+    timer.add_callback(panels.refresh)
+    timer.start()
+    return widgets + (timer,)
+
+
+def replay_tlsrecord(source, target, speed: float = 60.0):
+    '''
+    Stand-in for a running SUMO: rewrites the tlsrecord 'source' to 'target' element by element,
+    'speed' simulation seconds per wall-clock second, so that followPlot_TLS can be tried on a finished run.
+    '''
+    with open(target, 'w') as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n<tlsStates>\n')
+        out.flush()
+        previous = None
+        for _, elem in ET.iterparse(source):
+            if elem.tag != 'tlsState':
+                continue
+            now = float(elem.get('time'))
+            if previous is not None and now > previous:
+                time.sleep((now - previous)/speed)
+            previous = now
+            out.write('    <tlsState {}/>\n'.format(' '.join('{}="{}"'.format(key, value) for key, value in elem.attrib.items())))
+            out.flush()
+            elem.clear()
+        out.write('</tlsStates>\n')
@@ -0,0 +1,162 @@
+import weakref
+import numpy as np
+import pandas as pd
+import matplotlib as mpl
+from matplotlib.collections import PolyCollection
+from matplotlib.ticker import FixedLocator
+from record_functions import GrowableArray
+
+_INDICATORS = 'rygG'
+_planLODs = weakref.WeakKeyDictionary()
+
+
+def _barVerts(x0, x1, y0, y1) -> np.ndarray:
+    #vertices of axis-aligned rectangles [x0, x1] x [y0, y1] (arrays or scalars)
+    x0, x1, y0, y1 = np.broadcast_arrays(x0, x1, y0, y1)
+    return np.stack([np.column_stack([x0, y0]), np.column_stack([x0, y1]),
+                     np.column_stack([x1, y1]), np.column_stack([x1, y0])], axis=1)
+
+def indicatorCodes(stages: pd.DataFrame) -> np.ndarray:
+    '''
+    (subStage x stage) codes of the stage indicators: 0 r, 1 y, 2 g, 3 G (any other indicator counts as r)
+    '''
+    return np.array([[max(_INDICATORS.find(indicator), 0) for indicator in row] for row in stages.to_numpy()],
+                    dtype=np.int8).reshape(len(stages.index), len(stages.columns))
+
+def planLOD(ax):
+    #the PlanLOD drawing on 'ax', if any
+    return _planLODs.get(ax)
+
+
+class PlanLOD:
+    '''
+    Multi-resolution summary of the signal plan drawn on 'ax', as one PolyCollection whose bars are
+    chosen by update(t0, t1) for the visible time range:
+        level 0  - the events (consecutive events of the same indicator merged), as long as no more than
+                   'target' events are visible; the minor ticks are at the events
+        level k  - bins of 'base' * 'factor'**(k-1) seconds, the finest level with no more than 'target'/2 bins
+                   visible. Every stage of a bin shows its green fraction as the height of a green bar, under
+                   a bar of the dominant indicator of the bin (red when green dominates); the minor ticks are
+                   at the bin edges
+    so the number of bars and ticks stays about the same at any zoom.
+    The bins come from the cumulative duration of every indicator at the events (computed once), so a bin
+    costs O(log N) whatever it covers. extend() adds the events appended to tlsnp (e.g. while following a
+    record live) and only recomputes the bins from the last one on.
+    '''
+    def __init__(self, ax, tlsnp: np.ndarray, stages: pd.DataFrame,
+                 colours = ('red', 'yellow', 'green', 'forestgreen'),
+                 base: float = 30.0, factor: int = 4, target: int = 300):
+        self.ax = ax
+        self.rgba = mpl.colors.to_rgba_array(list(colours))
+        self.base = base
+        self.factor = factor
+        self.target = target
+        self.level = None
+        self.collection = PolyCollection(np.zeros((0, 4, 2)), linewidths = 0)
+        ax.add_collection(self.collection)
+        _planLODs[ax] = self
+        self.reset(tlsnp, stages)
+
+    def reset(self, tlsnp: np.ndarray, stages: pd.DataFrame):
+        #forgets the summary and builds it again from 'tlsnp'
+        numStages = len(stages.columns)
+        self.numStages = numStages
+        self.times = GrowableArray()
+        self.codes = GrowableArray((numStages,), dtype=np.int8)
+        self.cumulative = GrowableArray((numStages, 4)) # duration of every indicator before each event
+        self.levels = [] # (bin width, dominant indicator per bin and stage, green fraction per bin and stage)
+        self.extend(tlsnp, stages)
+
+    def extend(self, tlsnp: np.ndarray, stages: pd.DataFrame):
+        '''
+        Adds the events of tlsnp (the whole, grown array) after the ones already summarised
+        '''
+        n = len(self.times)
+        if tlsnp.shape[0] <= n:
+            return
+        oldEnd = self.times.data[-1] if n else None
+        new = tlsnp[max(n - 1, 0):]
+        codes = indicatorCodes(stages)[stages.index.get_indexer(new[:,1])]
+        increments = np.diff(new[:,0])[:,None,None] * np.eye(4)[codes[:-1]]
+        first = self.cumulative.data[-1] if n else np.zeros((self.numStages, 4))
+        if n == 0:
+            self.cumulative.extend(first[None])
+        self.cumulative.extend(first + np.cumsum(increments, axis=0))
+        self.times.extend(new[int(n > 0):,0])
+        self.codes.extend(codes[int(n > 0):])
+
+        origin, end = self.times.data[0], self.times.data[-1]
+        for k, (width, _, green) in enumerate(self.levels):
+            self._computeBins(k, min(int((oldEnd - origin) // width), len(green)))
+        while not self.levels or self.levels[-1][0] < end - origin:
+            #down to a level of one bin
+            self.levels.append((self.base * self.factor**len(self.levels),
+                                GrowableArray((self.numStages,), dtype=np.int8), GrowableArray((self.numStages,))))
+            self._computeBins(len(self.levels) - 1, 0)
+
+    def _cumulativeAt(self, t) -> np.ndarray:
+        times, codes = self.times.data, self.codes.data
+        t = np.clip(t, times[0], times[-1])
+        i = np.clip(np.searchsorted(times, t, side='right') - 1, 0, times.shape[0] - 1)
+        return self.cumulative.data[i] + (t - times[i])[:,None,None] * np.eye(4)[codes[i]]
+
+    def _computeBins(self, k, firstBin):
+        width, dominant, green = self.levels[k]
+        origin, end = self.times.data[0], self.times.data[-1]
+        numBins = max(int(np.ceil((end - origin) / width)), 1)
+        dominant.truncate(firstBin)
+        green.truncate(firstBin)
+        edges = origin + width*np.arange(firstBin, numBins + 1)
+        durations = np.diff(self._cumulativeAt(edges), axis=0) # (bin x stage x indicator)
+        covered = np.diff(np.clip(edges, origin, end))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.nan_to_num((durations[...,2] + durations[...,3]) / covered[:,None])
+        dominant.extend(np.argmax(durations, axis=2))
+        green.extend(np.clip(fraction, 0, 1))
+
+    def _events(self, lo, hi):
+        #level 0: the events lo .. hi-1 (hi is the end of the last one)
+        times, codes = self.times.data, self.codes.data[lo:hi]
+        verts, colours = [], []
+        for j in range(self.numStages):
+            runStarts = np.flatnonzero(np.append(True, codes[1:,j] != codes[:-1,j]))
+            runEnds = np.append(runStarts[1:], hi - lo)
+            verts.append(_barVerts(times[lo + runStarts], times[lo + runEnds], j-0.25, j+0.25))
+            colours.append(self.rgba[codes[runStarts,j]])
+        return verts, colours, times[lo:hi+1]
+
+    def _bins(self, k, t0, t1):
+        width, dominant, green = self.levels[k]
+        origin, end = self.times.data[0], self.times.data[-1]
+        lo = max(int((t0 - origin) // width), 0)
+        hi = min(int(np.ceil((t1 - origin) / width)), len(green))
+        x0 = origin + width*np.arange(lo, hi)
+        x1 = np.minimum(x0 + width, end)
+        verts, colours = [], []
+        for j in range(self.numStages):
+            top = j - 0.25 + 0.5*green.data[lo:hi,j]
+            binDominant = dominant.data[lo:hi,j]
+            verts += [_barVerts(x0, x1, j-0.25, top), _barVerts(x0, x1, top, j+0.25)]
+            colours += [self.rgba[np.where(binDominant >= 2, binDominant, 2)],
+                        self.rgba[np.where(binDominant < 2, binDominant, 0)]]
+        return verts, colours, np.append(x0, x1[-1:])
+
+    def update(self, t0, t1):
+        '''
+        Draws the level of detail of the time range (t0, t1)
+        '''
+        times = self.times.data
+        if times.shape[0] < 2:
+            return
+        lo = min(max(np.searchsorted(times, t0, side='right') - 1, 0), times.shape[0] - 2) # at least the last event
+        hi = min(np.searchsorted(times, t1, side='left'), times.shape[0] - 1)
+        level = 0
+        if hi - lo > self.target:
+            level = 1 + next((k for k, (width, _, _) in enumerate(self.levels)
+                              if (t1 - t0) / width <= self.target / 2), len(self.levels) - 1)
+        verts, colours, ticks = self._events(lo, max(hi, lo + 1)) if level == 0 else self._bins(level - 1, t0, t1)
+        self.level = level
+        self.collection.set_verts(np.concatenate(verts))
+        self.collection.set_facecolor(np.concatenate(colours))
+        #a locator, not set_xticks: the ticks reach past (t0, t1) and set_xticks would widen the x limits
+        self.ax.xaxis.set_minor_locator(FixedLocator(ticks))
@@ -1,11 +1,146 @@
-#Usage example
-import pandas as pd
-import matplotlib.pyplot as plt
-from plot_functions import clusterPlot_TLS
-tlsdf = pd.read_xml('./data/tlsrecord7_dt0.xml')
-stageIndices = [0,0,0,1,1,1,0,0,0,1,1,1,1,0,1,0]
-stageNames = ['North-South','West-East']
+'''
+Command-line entry point. Without arguments it opens the interactive plot of the example record:
+    python main.py
+and the subcommands run the analyses without the plotting backends they do not use
+(only 'plot' and 'render' import matplotlib):
+    python main.py stages  ./data/tlsrecord7_dt0.xml J --indices 0 0 0 1 1 1 0 0 0 1 1 1 1 0 1 0 --names North-South West-East
+    python main.py cycles  ./data/tlsrecord7_dt0.xml J --indices ... --names ... --output cycles.csv
+    python main.py offsets ./offset_sumo/J1tlsrecord.xml ./offset_sumo/J3tlsrecord.xml --link J1 J3 30 --link J3 J1 30 --coor 2 3
+    python main.py render  ./data/tlsrecord7_dt0.xml J --indices ... --names ... --window 0 180 --window 0 3600
+    python main.py plot    ./data/tlsrecord7_dt0.xml J --indices ... --names ... --colours c m
+'''
+import sys
+import argparse
 
-time_slider, button, radio1, radio2 = clusterPlot_TLS(tlsdf, stageIndices, stageNames, bar_colours = ['c','m'])
+#the example of the interactive plot
+RECORD = './data/tlsrecord7_dt0.xml'
+TLS_ID = 'J'
+STAGE_INDICES = [0,0,0,1,1,1,0,0,0,1,1,1,1,0,1,0]
+STAGE_NAMES = ['North-South','West-East']
+BAR_COLOURS = ['c','m']
 
-plt.show()
\ No newline at end of file
+
+def _output(table, path):
+    if path is None:
+        print(table.to_string())
+    else:
+        from table_functions import write_table
+        write_table(table, path)
+
+def stages(args):
+    from cache_functions import load_tlsnp
+    _, stages, _ = load_tlsnp(args.record, args.tls, args.indices, args.names, args.stage_type, args.cache_dir)
+    _output(stages, args.output)
+
+def cycles(args):
+    from table_functions import cycle_tables
+    jobs = [{'path': path, 'tlsID': args.tls, 'stageIndices': args.indices, 'stageNames': args.names,
+             'cyclicity_type': args.cyclicity, 'stage_type': args.stage_type, 'cache_dir': args.cache_dir}
+            for path in args.record]
+    _output(cycle_tables(jobs, processes = args.processes), args.output)
+
+def offsets(args):
+    import os
+    from record_functions import read_tlsrecord
+    from offset_sumo.offset_functions import network_offsets
+    records = {}
+    for path in args.record:
+        records.update(read_tlsrecord(path))
+    links = [(reference, target, float(travel_time)) for reference, target, travel_time in args.link]
+    tables, matrices = network_offsets(records, links, tuple(args.coor), args.orders, args.processes)
+    if args.output is None:
+        for (reference, target), table in tables.items():
+            print('{} -> {}'.format(reference, target))
+            print(table.to_string(), end = '\n\n')
+        return
+    os.makedirs(args.output, exist_ok = True)
+    for (reference, target), table in tables.items():
+        table.to_csv(os.path.join(args.output, '{}_{}.csv'.format(reference, target)))
+    for column, matrix in matrices.items():
+        matrix.to_csv(os.path.join(args.output, 'matrix_{}.csv'.format(column)))
+
+def render(args):
+    from report_functions import render_reports
+    jobs = [{'path': path, 'tlsID': args.tls, 'stageIndices': args.indices, 'stageNames': args.names,
+             'windows': [tuple(window) for window in args.window], 'out_dir': args.output, 'formats': args.formats,
+             'bar_colours': args.colours or ['C{}'.format(i) for i in range(len(args.names))],
+             'num_bins': args.num_bins, 'cyclicity_type': args.cyclicity, 'stage_type': args.stage_type,
+             'cache_dir': args.cache_dir}
+            for path in args.record]
+    for paths in render_reports(jobs, args.processes):
+        print('\n'.join(paths))
+
+def plot(args):
+    import matplotlib.pyplot as plt
+    from plot_functions import clusterPlot_TLS
+    from cache_functions import load_tlsnp
+    if args.profile:
+        #before the loading, so that its 'parse' and 'cache' phases (and tlsStages, tlsNumpy on a miss) are recorded
+        import profile_functions
+        profile_functions.enable(args.profile)
+    #parsed once, then memory-mapped from the cache directory until the xml file changes
+    tlsdf, stages, tlsnp = load_tlsnp(args.record, args.tls, args.indices, args.names, args.stage_type, args.cache_dir)
+    widgets = clusterPlot_TLS(tlsdf, args.indices, args.names, bar_colours = args.colours or BAR_COLOURS[:len(args.names)],
+                              num_bins = args.num_bins, cyclicity_type = args.cyclicity, stage_type = args.stage_type,
+                              stages = stages, tlsnp = tlsnp)
+    plt.show()
+
+
+def parser():
+    from cache_functions import CACHE_DIR
+    main_parser = argparse.ArgumentParser(description = 'Signal plan analysis of SUMO tlsrecord files')
+    subparsers = main_parser.add_subparsers(dest = 'command', required = True)
+
+    def tls_command(name, help, many = False):
+        sub = subparsers.add_parser(name, help = help)
+        sub.add_argument('record', nargs = '+' if many else None, help = 'tlsrecord file' + ('s' if many else ''))
+        sub.add_argument('tls', help = 'TLS id')
+        sub.add_argument('--indices', type = int, nargs = '+', default = STAGE_INDICES,
+                         help = 'stage index of every movement (link) of the TLS')
+        sub.add_argument('--names', nargs = '+', default = STAGE_NAMES, help = 'stage names')
+        sub.add_argument('--stage-type', default = 'mode', choices = ('mode', 'first'))
+        sub.add_argument('--cyclicity', type = int, default = 1, choices = (1, 2), help = 'cyclicity type')
+        sub.add_argument('--cache-dir', default = CACHE_DIR, help = 'directory of the parsed-record cache')
+        return sub
+
+    sub = tls_command('stages', 'stage (green, yellow & red) table of a TLS')
+    sub.add_argument('--output', help = 'CSV or Parquet file (default stdout)')
+    sub.set_defaults(run = stages)
+
+    sub = tls_command('cycles', 'per-cycle statistics of a TLS in one or more records', many = True)
+    sub.add_argument('--output', help = 'CSV or Parquet file (default stdout)')
+    sub.add_argument('--processes', type = int, help = 'pool size (default all cores)')
+    sub.set_defaults(run = cycles)
+
+    sub = subparsers.add_parser('offsets', help = 'offsets and usable progression times of signal pairs')
+    sub.add_argument('record', nargs = '+', help = 'tlsrecord files of the signals')
+    sub.add_argument('--link', nargs = 3, action = 'append', required = True, metavar = ('FROM', 'TO', 'TRAVEL_TIME'),
+                     help = 'a directional pair; the FROM signal is the reference (repeatable)')
+    sub.add_argument('--coor', type = int, nargs = 2, required = True, metavar = ('START', 'END'),
+                     help = 'phase indices of the coordinated green of all signals')
+    sub.add_argument('--orders', type = int, default = 1)
+    sub.add_argument('--output', help = 'directory of the pair tables and the matrices (default stdout)')
+    sub.add_argument('--processes', type = int, help = 'pool size (default all cores)')
+    sub.set_defaults(run = offsets)
+
+    sub = tls_command('render', 'cluster plot panels of time windows saved to files', many = True)
+    sub.add_argument('--window', type = float, nargs = 2, action = 'append', required = True, metavar = ('T0', 'T1'),
+                     help = 'time window (s), repeatable')
+    sub.add_argument('--output', default = '.', help = 'output directory')
+    sub.add_argument('--formats', nargs = '+', default = ['png'])
+    sub.add_argument('--colours', nargs = '+', help = 'bar colour of every stage')
+    sub.add_argument('--num-bins', type = int, default = 10)
+    sub.add_argument('--processes', type = int, help = 'pool size (default all cores)')
+    sub.set_defaults(run = render)
+
+    sub = tls_command('plot', 'interactive plot of a TLS')
+    sub.add_argument('--colours', nargs = '+', help = 'bar colour of every stage')
+    sub.add_argument('--num-bins', type = int, default = 10)
+    sub.add_argument('--profile', help = 'summary, cprofile or trace[:file], see profile_functions (or TLS_PROFILE)')
+    sub.set_defaults(run = plot)
+    return main_parser
+
+
+if __name__ == '__main__': #the process pools need the guard on platforms that spawn workers
+    args = parser().parse_args(sys.argv[1:] or ['plot', RECORD, TLS_ID, '--colours'] + BAR_COLOURS)
+    args.run(args)
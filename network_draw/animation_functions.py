@@ -0,0 +1,123 @@
+import os
+import json
+import glob
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+_EXCEL_PATTERNS = ('*.xlsx', '*.xls')
+
+
+def save_weight_stack(path, stack, index, columns, frame_labels = None):
+    '''
+    Writes a stack of weight matrices (frame x from-node x to-node, NaN where there is no edge) in the binary
+    format read by load_weight_stack: 'path' (.npy, memory-mappable) and 'path'.json with the node labels
+    of the rows ('index') and columns and the optional label of every frame.
+    '''
+    stack = np.asarray(stack, dtype=np.float64)
+    assert stack.ndim == 3 and stack.shape[1:] == (len(index), len(columns)), 'the stack must be frame x index x columns'
+    np.save(path, stack)
+    with open(path + '.json', 'w') as f:
+        json.dump({'index': [str(label) for label in index], 'columns': [str(label) for label in columns],
+                   'frame_labels': None if frame_labels is None else [str(label) for label in frame_labels]}, f)
+    return path
+
+def load_weight_stack(path, mmap_mode = 'r'):
+    '''
+    Returns (stack, index, columns, frame_labels) written by save_weight_stack.
+    The stack is memory-mapped by default, so opening it does not read the frames.
+    '''
+    with open(path + '.json') as f:
+        labels = json.load(f)
+    return np.load(path, mmap_mode=mmap_mode), labels['index'], labels['columns'], labels['frame_labels']
+
+def excel_weight_stack(source, path, sheet_name = 0, adj = None):
+    '''
+    Converts weight matrices in Excel files (as weight.xlsx) to the binary format of save_weight_stack, once:
+    'source' is a directory (its .xlsx/.xls files in name order) or a list of files. Every file is one frame,
+    labelled with its file name. 'adj' optionally masks the edges where it is 0 (as the 'adj' sheet of data0508.xlsx).
+    '''
+    if isinstance(source, str):
+        files = sorted(file for pattern in _EXCEL_PATTERNS for file in glob.glob(os.path.join(source, pattern)))
+    else:
+        files = list(source)
+    if not files:
+        raise FileNotFoundError('no Excel weight files in {}'.format(source))
+    frames = [pd.read_excel(file, sheet_name=sheet_name, index_col=0) for file in files]
+    stack = np.stack([frame.to_numpy(dtype=np.float64) for frame in frames])
+    if adj is not None:
+        stack[:, np.asarray(adj) == 0] = np.nan
+    return save_weight_stack(path, stack, frames[0].index, frames[0].columns,
+                             [os.path.splitext(os.path.basename(file))[0] for file in files])
+
+
+#the state of a worker process, set once by _init_worker
+_worker = {}
+
+def _init_worker(path, width, height, input_params, meta_params, label_positions, arts):
+    #cairo is only imported by the workers that render, the stack functions above run without it
+    from network_draw.network_functions import base_layer
+    stack, index, columns, frame_labels = load_weight_stack(path)
+    _worker.update(stack = stack, index = index, columns = columns, frame_labels = frame_labels,
+                   base = base_layer(width, height, input_params, meta_params, *label_positions),
+                   width = width, height = height, input_params = input_params, meta_params = meta_params, arts = arts)
+
+def _render_frame(task):
+    import cairo
+    from network_draw.network_functions import draw_frame
+    k, out_path = task
+    df_weights = pd.DataFrame(_worker['stack'][k], index = _worker['index'], columns = _worker['columns'])
+    title = _worker['frame_labels'][k] if _worker['frame_labels'] is not None else str(k)
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, _worker['width'], _worker['height'])
+    draw_frame(cairo.Context(surface), _worker['base'], df_weights, _worker['input_params'],
+               _worker['meta_params'], _worker['arts'], title)
+    surface.write_to_png(out_path)
+    return out_path
+
+def render_animation(source, out_dir, input_params, meta_params, width = 600, height = 600, **kwargs) -> list:
+    '''
+    Renders every frame of a stack of weight matrices as out_dir/frame_<k>.png over a process pool
+    and returns the paths. 'source' is
+        the path of a stack written by save_weight_stack or excel_weight_stack, or
+        a 3-D array (frame x from-node x to-node) with the keyword arguments 'index' and 'columns' (node labels),
+        which is first written to out_dir/weights.npy
+    Every worker maps the stack and records the static base layer (base_layer) once, then draws only the
+    weights of its frames. The optional keyword arguments are
+        processes       - pool size (default os.cpu_count(); 1 renders in this process)
+        arts            - arteries drawn on every frame (see draw_arteries)
+        frame_labels    - the title of every frame of an array source (default the frame number)
+        label_positions - (intersection, outer node) label positions of base_layer (default ('in_corner', 'in_rim'))
+        gif, fps        - also assembles the frames into the animated GIF 'gif' at 'fps' frames per second (default 4)
+    '''
+    processes = kwargs.get('processes', None)
+    arts = kwargs.get('arts', None)
+    label_positions = tuple(kwargs.get('label_positions', ('in_corner', 'in_rim')))
+    gif = kwargs.get('gif', None)
+    fps = kwargs.get('fps', 4)
+
+    os.makedirs(out_dir, exist_ok=True)
+    if isinstance(source, str):
+        path = source
+    else:
+        path = save_weight_stack(os.path.join(out_dir, 'weights.npy'), source, kwargs['index'], kwargs['columns'],
+                                 kwargs.get('frame_labels', None))
+    numFrames = load_weight_stack(path)[0].shape[0]
+    tasks = [(k, os.path.join(out_dir, 'frame_{:05d}.png'.format(k))) for k in range(numFrames)]
+    initargs = (path, width, height, input_params, meta_params, label_positions, arts)
+    if processes == 1:
+        _init_worker(*initargs)
+        paths = [_render_frame(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(processes, initializer = _init_worker, initargs = initargs) as executor:
+            workers = processes or os.cpu_count() or 1
+            paths = list(executor.map(_render_frame, tasks, chunksize = max(1, numFrames // (4*workers))))
+    if gif is not None:
+        assemble_gif(paths, gif, fps)
+    return paths
+
+def assemble_gif(frame_paths, out_path, fps = 4):
+    #animated GIF of the PNG frames, looping
+    from PIL import Image
+    frames = [Image.open(path).convert('RGB') for path in frame_paths]
+    frames[0].save(out_path, save_all = True, append_images = frames[1:], duration = int(1000/fps), loop = 0)
+    return out_path
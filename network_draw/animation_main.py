@@ -0,0 +1,44 @@
+#Usage example (from the repository root)
+#   python -m network_draw.animation_main ./network_draw/weights/ --out-dir ./network_draw/frames --gif weights.gif
+#   python -m network_draw.animation_main ./network_draw/weights.npy --out-dir ./network_draw/frames
+#A directory of Excel weight matrices (one per interval) is converted once to ./network_draw/weights.npy,
+#later runs can be given that file instead.
+import argparse
+import os
+import pandas as pd
+import matplotlib.pyplot as plt
+from network_draw.grid_functions import meta_parameters
+from network_draw.animation_functions import excel_weight_stack, render_animation
+
+WIDTH, HEIGHT = 600, 600
+
+#Input parameters
+input_params =  {'NUM_HORIZ': 4,             #Num. roads
+                'NUM_VERTI': 4,             #Num. roads
+                'MARGIN_TO_CENTRE': 0.2,    #Dimensioning
+                'MARGIN_TO_PLOTEDGE': 0.05, #Dimensioning
+                'HALF_ROADWIDTH':0.025,     #Dimensioning
+                'BG_COLOUR' : (240/255, 240/255, 240/255, 1.00),#Background colour
+                'LINE_COLOUR' : (40/255, 40/255, 40/255, 1.00),#Line colour
+                'INT_COLOUR' : (109/255, 82/255, 66/255, 0.45),#Intersection shading
+                'OUT_COLOUR' : (87/255, 137/255, 87/255, 0.45),#Outer node shading
+                'ART_COLOURMAP': plt.cm.gnuplot} #Arterial plot pyplot colormap
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Renders a stack of network weight matrices as frames')
+    parser.add_argument('source', help='directory of Excel weight matrices, or a .npy stack from an earlier run')
+    parser.add_argument('--out-dir', default='./network_draw/frames')
+    parser.add_argument('--stack', default='./network_draw/weights.npy', help='where an Excel directory is converted to')
+    parser.add_argument('--adj', default='./network_draw/data0508.xlsx', help='Excel file of the adjacency matrix (sheet "adj")')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--gif', help='also write the frames as this animated GIF')
+    parser.add_argument('--fps', type=float, default=4)
+    args = parser.parse_args()
+
+    source = args.source
+    if os.path.isdir(source):
+        adj = pd.read_excel(args.adj, sheet_name="adj", index_col=0).to_numpy() if args.adj else None
+        source = excel_weight_stack(source, args.stack, adj = adj)
+    paths = render_animation(source, args.out_dir, input_params, meta_parameters(input_params), WIDTH, HEIGHT,
+                             processes = args.processes, gif = args.gif, fps = args.fps)
+    print('{} frames written to {}'.format(len(paths), args.out_dir))
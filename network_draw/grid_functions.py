@@ -0,0 +1,78 @@
+'''
+Geometry of the grid network drawn by network_functions (road positions, node labels, edge midpoints) and the
+sparse edge lists of the weights. Only numpy and pandas are imported, so this runs without cairo.
+'''
+
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+
+
+def meta_parameters(input_params):
+    #positions of the roads (HORIZ_POS, VERTI_POS) and of the roads plus the outer nodes (..._FULL) on the unit canvas
+    horiz_pos = list(np.linspace(input_params['MARGIN_TO_CENTRE'],
+                                 1-input_params['MARGIN_TO_CENTRE'],
+                                 input_params['NUM_HORIZ']))
+    verti_pos = list(np.linspace(1-input_params['MARGIN_TO_CENTRE'],
+                                 input_params['MARGIN_TO_CENTRE'],
+                                 input_params['NUM_VERTI']))
+    horiz_pos_full = [input_params['MARGIN_TO_PLOTEDGE']] + horiz_pos + [1-input_params['MARGIN_TO_PLOTEDGE']]
+    verti_pos_full = [1-input_params['MARGIN_TO_PLOTEDGE']] + verti_pos + [input_params['MARGIN_TO_PLOTEDGE']]
+    return {'HORIZ_POS': horiz_pos,
+            'VERTI_POS': verti_pos,
+            'HORIZ_POS_FULL': horiz_pos_full,
+            'VERTI_POS_FULL': verti_pos_full}
+
+def node_position(label):
+    #grid position (i, j) of the node label 'i_j' (any number of digits) or of an (i, j) pair
+    if isinstance(label, str):
+        i, j = label.split('_')
+        return int(i), int(j)
+    return int(label[0]), int(label[1])
+
+def edge_pos(A,B, meta_params):
+    horiz_pos_full = meta_params['HORIZ_POS_FULL']
+    verti_pos_full = meta_params['VERTI_POS_FULL']
+    
+    Ai, Aj = node_position(A)
+    Bi, Bj = node_position(B)
+    edge_v = (verti_pos_full[Aj] + verti_pos_full[Bj])/2
+    edge_h = (horiz_pos_full[Ai] + horiz_pos_full[Bi])/2
+    return edge_h, edge_v
+
+
+#sparse (COO) weights: 'src' and 'dst' are (E x 2) integer arrays of the node positions (i, j), 'weight' the E weights
+EdgeList = namedtuple('EdgeList', ['src', 'dst', 'weight'])
+
+def edge_list(df_weights, adj = None):
+    '''
+    EdgeList of a dense weight DataFrame (node labels 'i_j' as index and columns, NaN where there is no edge),
+    optionally masked where the adjacency matrix 'adj' is 0. The labels are parsed once per row and column.
+    '''
+    weights = df_weights.to_numpy(dtype=np.float64)
+    present = ~np.isnan(weights)
+    if adj is not None:
+        present &= np.asarray(adj) != 0
+    m, n = np.nonzero(present)
+    rows = np.array([node_position(label) for label in df_weights.index], dtype=np.int64).reshape(-1, 2)
+    cols = np.array([node_position(label) for label in df_weights.columns], dtype=np.int64).reshape(-1, 2)
+    return EdgeList(rows[m], cols[n], weights[m, n])
+
+def read_edge_list(path, columns = ('from', 'to', 'weight')):
+    '''
+    EdgeList of a table (CSV, or Excel for .xlsx/.xls) with one row per edge: the node labels 'i_j' of its
+    'from' and 'to' ends and its 'weight' (the names given by 'columns'). Its memory is proportional to the edges.
+    '''
+    read = pd.read_excel if path.endswith(('.xlsx', '.xls')) else pd.read_csv
+    table = read(path, usecols = list(columns), dtype = {columns[0]: str, columns[1]: str})
+    src = table[columns[0]].str.split('_', expand = True).to_numpy(dtype=np.int64)
+    dst = table[columns[1]].str.split('_', expand = True).to_numpy(dtype=np.int64)
+    return EdgeList(src, dst, table[columns[2]].to_numpy(dtype=np.float64))
+
+def edge_positions(edges, meta_params):
+    #(edge_h, edge_v) arrays of the midpoints of an EdgeList, as edge_pos
+    horiz_pos_full = np.asarray(meta_params['HORIZ_POS_FULL'])
+    verti_pos_full = np.asarray(meta_params['VERTI_POS_FULL'])
+    edge_h = (horiz_pos_full[edges.src[:,0]] + horiz_pos_full[edges.dst[:,0]])/2
+    edge_v = (verti_pos_full[edges.src[:,1]] + verti_pos_full[edges.dst[:,1]])/2
+    return edge_h, edge_v
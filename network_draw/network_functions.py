@@ -1,7 +1,9 @@
 import numpy as np
 import math
-import cairo
-from itertools import product
+#the geometry and the edge lists need no cairo, they are re-exported here;
+#cairo itself is imported by the functions that use it, so this module imports without it
+from network_draw.grid_functions import (node_position, edge_pos, EdgeList, edge_list, read_edge_list,
+                                         edge_positions, meta_parameters)
 
 def draw_network(ctx, input_params, meta_params):
     half_roadwidth = input_params['HALF_ROADWIDTH']
@@ -40,6 +42,7 @@ def draw_network(ctx, input_params, meta_params):
     ctx.stroke()
 
 def shade_intersection(ctx, input_params, meta_params):
+    import cairo
     half_roadwidth = input_params['HALF_ROADWIDTH']
     margin_to_plotedge = input_params['MARGIN_TO_PLOTEDGE']
     colour = input_params['INT_COLOUR']
@@ -57,6 +60,7 @@ def shade_intersection(ctx, input_params, meta_params):
 
 
 def label_intersection(ctx, input_params, meta_params, position = 'out_corner'):
+    import cairo
     half_roadwidth = input_params['HALF_ROADWIDTH']
     colour_light = input_params['BG_COLOUR']
     colour_dark = input_params['LINE_COLOUR']
@@ -86,6 +90,7 @@ def label_intersection(ctx, input_params, meta_params, position = 'out_corner'):
             ctx.show_text("%d,%d"%(i,j))
 
 def shade_outer_nodes(ctx, input_params, meta_params):
+    import cairo
     half_roadwidth = input_params['HALF_ROADWIDTH']
     margin_to_plotedge = input_params['MARGIN_TO_PLOTEDGE']
     colour = input_params['OUT_COLOUR']
@@ -109,6 +114,7 @@ def shade_outer_nodes(ctx, input_params, meta_params):
     ctx.fill()
     
 def label_outer_nodes(ctx, input_params, meta_params, position = 'out_corner'):
+    import cairo
     num_horiz = input_params['NUM_HORIZ']
     num_verti = input_params['NUM_VERTI']
     half_roadwidth = input_params['HALF_ROADWIDTH']
@@ -167,21 +173,11 @@ def label_outer_nodes(ctx, input_params, meta_params, position = 'out_corner'):
             ctx.move_to(1-margin_to_plotedge*1.8, v-1.3*half_roadwidth)
         ctx.show_text("%d,%d"%(num_horiz+1,j))
 
-def edge_pos(A,B, meta_params):
-    horiz_pos_full = meta_params['HORIZ_POS_FULL']
-    verti_pos_full = meta_params['VERTI_POS_FULL']
-    
-    Ai, Aj = int(A[0]), int(A[-1])
-    Bi, Bj = int(B[0]), int(B[-1])
-    edge_v = (verti_pos_full[Aj] + verti_pos_full[Bj])/2
-    edge_h = (horiz_pos_full[Ai] + horiz_pos_full[Bi])/2
-    return edge_h, edge_v
-
-
-
 def draw_edge_label(ctx, df_weights, input_params, meta_params):
-    num_horiz = input_params['NUM_HORIZ']
-    num_verti = input_params['NUM_VERTI']
+    '''
+    'df_weights' is a dense weight DataFrame (see edge_list) or an EdgeList
+    '''
+    import cairo
     half_roadwidth = input_params['HALF_ROADWIDTH']
     colour = input_params['LINE_COLOUR']
 
@@ -190,14 +186,17 @@ def draw_edge_label(ctx, df_weights, input_params, meta_params):
         cairo.FONT_WEIGHT_BOLD)
     ctx.set_font_size(half_roadwidth/1.2)
 
-    
-    adj = np.where(~np.isnan(df_weights.to_numpy()))
-    for m,n in zip(adj[0],adj[1]):
-        edge_h, edge_v = edge_pos(df_weights.index[m], df_weights.columns[n], meta_params)
-        (x, y, width, height, dx, dy) = ctx.text_extents("+%.2f" %df_weights.iloc[m,n]\
-                                        if df_weights.iloc[m,n]>0 else "%.2f" %df_weights.iloc[m,n])
-        ctx.move_to(edge_h-dx/2, edge_v+height/2)
-        ctx.show_text("+%.2f" %df_weights.iloc[m,n] if df_weights.iloc[m,n]>0 else "%.2f" %df_weights.iloc[m,n])
+    #the positions are computed for all edges at once, and every distinct label is measured once
+    edges = df_weights if isinstance(df_weights, EdgeList) else edge_list(df_weights)
+    edge_h, edge_v = edge_positions(edges, meta_params)
+    extents = {}
+    for h, v, weight in zip(edge_h.tolist(), edge_v.tolist(), edges.weight.tolist()):
+        label = "+%.2f" %weight if weight>0 else "%.2f" %weight
+        if label not in extents:
+            extents[label] = ctx.text_extents(label)
+        (x, y, width, height, dx, dy) = extents[label]
+        ctx.move_to(h-dx/2, v+height/2)
+        ctx.show_text(label)
         
 def draw_arteries(ctx, arts, input_params, meta_params):
     half_roadwidth = input_params['HALF_ROADWIDTH']
@@ -210,12 +209,64 @@ def draw_arteries(ctx, arts, input_params, meta_params):
     colors = art_colormap(np.linspace(0.2,0.8,len(arts)))
     ctx.set_line_width(half_roadwidth*0.7)
     for a, art in enumerate(arts):
+        nodes = [node_position(label) for label in art]
         for k in range(len(art)-1):
-            ctx.move_to(horiz_pos_full[int(art[k][0])], verti_pos_full[int(art[k][-1])])
-            ctx.line_to(horiz_pos_full[int(art[k+1][0])], verti_pos_full[int(art[k+1][-1])])
+            ctx.move_to(horiz_pos_full[nodes[k][0]], verti_pos_full[nodes[k][1]])
+            ctx.line_to(horiz_pos_full[nodes[k+1][0]], verti_pos_full[nodes[k+1][1]])
         r,g,b,alpha = colors[a]
         ctx.set_source_rgba(r, g, b, alpha)
         ctx.stroke()
 
 
+def draw_base(ctx, input_params, meta_params, intersection_label = 'in_corner', outer_label = 'in_rim'):
+    import cairo
+    #the parts of the drawing that do not depend on the weights: background, roads, nodes and their labels
+    colour = input_params['BG_COLOUR']
+    ctx.rectangle(0, 0, 1, 1)
+    ctx.set_source(cairo.SolidPattern(colour[0], colour[1], colour[2], colour[3]))
+    ctx.fill()
+    draw_network(ctx, input_params, meta_params)
+    shade_intersection(ctx, input_params, meta_params)
+    label_intersection(ctx, input_params, meta_params, position = intersection_label)
+    shade_outer_nodes(ctx, input_params, meta_params)
+    label_outer_nodes(ctx, input_params, meta_params, position = outer_label)
+
+def base_layer(width, height, input_params, meta_params, intersection_label = 'in_corner', outer_label = 'in_rim'):
+    '''
+    Records the static base layer (draw_base) once as a cairo.RecordingSurface of 'width' x 'height'.
+    Replaying it with render_weights costs a paint, and the output stays vector (SVG, PDF) as if drawn directly.
+    '''
+    import cairo
+    base = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, cairo.Rectangle(0, 0, width, height))
+    ctx = cairo.Context(base)
+    ctx.scale(width, height)  # Normalizing the canvas
+    draw_base(ctx, input_params, meta_params, intersection_label, outer_label)
+    return base
+
+def draw_frame(ctx, base, df_weights, input_params, meta_params, arts = None, title = None):
+    #paints the base layer on the unscaled context 'ctx' and draws the weights (and arteries, title) over it
+    extents = base.get_extents()
+    ctx.set_source_surface(base, 0, 0)
+    ctx.paint()
+    ctx.save()
+    ctx.scale(extents.width, extents.height)  # Normalizing the canvas
+    draw_edge_label(ctx, df_weights, input_params, meta_params)
+    if arts is not None:
+        draw_arteries(ctx, arts, input_params, meta_params)
+    if title is not None:
+        colour = input_params['LINE_COLOUR']
+        ctx.set_source_rgba(colour[0], colour[1], colour[2], colour[3])
+        ctx.set_font_size(input_params['HALF_ROADWIDTH'])
+        ctx.move_to(input_params['MARGIN_TO_PLOTEDGE']/4, input_params['MARGIN_TO_PLOTEDGE']/2)
+        ctx.show_text(title)
+    ctx.restore()
 
+def render_weights(path, base, df_weights, input_params, meta_params, arts = None):
+    '''
+    Writes the SVG file 'path': the base layer from base_layer, with the edge weights 'df_weights'
+    (and the arteries 'arts', see draw_arteries) drawn over it. Only the overlay is drawn per call.
+    '''
+    import cairo
+    extents = base.get_extents()
+    with cairo.SVGSurface(path, extents.width, extents.height) as surface:
+        draw_frame(cairo.Context(surface), base, df_weights, input_params, meta_params, arts)
@@ -17,57 +17,22 @@ input_params =  {'NUM_HORIZ': 4,             #Num. roads
                 'ART_COLOURMAP': plt.cm.gnuplot} #Arterial plot pyplot colormap
 
 #Meta parameters
-horiz_pos = list(np.linspace(input_params['MARGIN_TO_CENTRE'],
-                             1-input_params['MARGIN_TO_CENTRE'],
-                             input_params['NUM_HORIZ']))
-
-verti_pos = list(np.linspace(1-input_params['MARGIN_TO_CENTRE'],
-                             input_params['MARGIN_TO_CENTRE'],
-                             input_params['NUM_VERTI']))
-
-horiz_pos_full = [input_params['MARGIN_TO_PLOTEDGE']] \
-+ horiz_pos\
-+ [1-input_params['MARGIN_TO_PLOTEDGE']]
-verti_pos_full = [1-input_params['MARGIN_TO_PLOTEDGE']] \
-+ verti_pos\
-+ [input_params['MARGIN_TO_PLOTEDGE']]
-
-meta_params = {'HORIZ_POS': horiz_pos,
-              'VERTI_POS': verti_pos,
-              'HORIZ_POS_FULL': horiz_pos_full,
-              'VERTI_POS_FULL': verti_pos_full}
-
-
-
-with cairo.SVGSurface("./network_draw/weight.svg", WIDTH, HEIGHT) as surface:
-    ctx = cairo.Context(surface)
-
-    ctx.scale(WIDTH, HEIGHT)  # Normalizing the canvas
-    colour = input_params['BG_COLOUR']
-    main_pat = cairo.SolidPattern(colour[0], colour[1], colour[2], colour[3])
-
-    ctx.rectangle(0, 0, 1, 1)  # Rectangle(x0, y0, x1, y1)
-    ctx.set_source(main_pat)
-    ctx.fill()
-    
-    draw_network(ctx, input_params, meta_params)
-    shade_intersection(ctx, input_params, meta_params)
-    label_intersection(ctx, input_params, meta_params, position = 'in_corner')
-    #3 options 'centre', 'in_corner' and 'out_corner'
-    shade_outer_nodes(ctx, input_params, meta_params)
-    label_outer_nodes(ctx, input_params, meta_params, position = 'in_rim')
-    #3 options 'centre', 'in_rim' and 'out_middle'
-    
-    weights = pd.read_excel("./network_draw/weight.xlsx",sheet_name="Sheet1",index_col=0)
-    w = weights.to_numpy()
-    adj = pd.read_excel("./network_draw/data0508.xlsx",sheet_name="adj",index_col=0).to_numpy()
-    w[adj==0] = np.NaN
-    weights.loc[:] = w
-    # weights = pd.read_excel("./network_draw/data0508.xlsx",sheet_name="exp",index_col=0)
-    draw_edge_label(ctx, weights, input_params, meta_params)
-
-    arteries = [['0_1','1_1','1_2','1_3','1_4','0_4'],
-                ['2_3','2_4','3_4','4_4','4_3','3_3',
-                 '3_2','2_2','2_1','3_1','4_1','4_2','5_2']]
-    # draw_arteries(ctx,arteries, input_params, meta_params)
-        
\ No newline at end of file
+meta_params = meta_parameters(input_params)
+
+#the roads, nodes and labels are drawn once; every weight matrix only adds the overlay
+base = base_layer(WIDTH, HEIGHT, input_params, meta_params, intersection_label = 'in_corner', outer_label = 'in_rim')
+#3 options 'centre', 'in_corner' and 'out_corner' for the intersection labels
+#3 options 'centre', 'in_rim' and 'out_middle' for the outer node labels
+
+weights = pd.read_excel("./network_draw/weight.xlsx",sheet_name="Sheet1",index_col=0)
+adj = pd.read_excel("./network_draw/data0508.xlsx",sheet_name="adj",index_col=0).to_numpy()
+edges = edge_list(weights, adj)
+# edges = edge_list(pd.read_excel("./network_draw/data0508.xlsx",sheet_name="exp",index_col=0))
+#large grids: an edge table (from, to, weight) keeps the memory proportional to the edges
+# edges = read_edge_list("./network_draw/weights.csv")
+
+arteries = [['0_1','1_1','1_2','1_3','1_4','0_4'],
+            ['2_3','2_4','3_4','4_4','4_3','3_3',
+             '3_2','2_2','2_1','3_1','4_1','4_2','5_2']]
+render_weights("./network_draw/weight.svg", base, edges, input_params, meta_params)
+# render_weights("./network_draw/weight.svg", base, edges, input_params, meta_params, arts = arteries)
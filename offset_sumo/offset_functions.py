@@ -0,0 +1,133 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+
+def ordinal(k: int) -> str:
+    #1 -> '1st', 2 -> '2nd', 11 -> '11th', 23 -> '23rd'
+    if k % 100 in (11, 12, 13):
+        return '{}th'.format(k)
+    return '{}{}'.format(k, {1: 'st', 2: 'nd', 3: 'rd'}.get(k % 10, 'th'))
+
+def green_intervals(record, coor_index: tuple) -> pd.DataFrame:
+    '''
+    Returns the coordinated green intervals of one TLSRecord (record_functions) as a DataFrame (start, end).
+    coor_index = (start stage index, end stage index): the n-th start is the n-th onset of the first
+    phase and the n-th end the n-th onset of the second one (NaN where one of them has fewer onsets).
+    '''
+    intervals = pd.DataFrame()
+    intervals['start'] = pd.Series(np.asarray(record.time)[np.asarray(record.phase) == coor_index[0]])
+    intervals['end'] = pd.Series(np.asarray(record.time)[np.asarray(record.phase) == coor_index[1]])
+    return intervals
+
+def offset_table(reference_int: pd.DataFrame,
+                 offset_int: pd.DataFrame,
+                 orders: int,
+                 cyclic_offset: float) -> pd.DataFrame:
+    '''
+    For every green interval of the reference signal, computes against the green intervals of the offset signal
+        concur         - the reference green starts during an offset green (start <= s < end)
+        concur_usable  - usable time of the concurrent green onset (0 when not concurrent)
+        <k>_offset     - time from the reference green start to the k-th later offset green start (k = 1..orders)
+        <k>_usable     - green time of that k-th offset green usable by a platoon arriving 'cyclic_offset'
+                         seconds (the travel time at progressive speed) after the reference green start
+    <k> is the ordinal '1st', '2nd', '3rd', ...; the k-th columns are NaN when there are fewer than k later greens.
+    Both interval tables must be in time order. Every row and order is answered at once with searchsorted
+    on the sorted offset green starts and ends.
+    '''
+    result = reference_int.copy()
+    s = result['start'].to_numpy(dtype=np.float64)
+    allStarts = offset_int['start'].to_numpy(dtype=np.float64)
+    allEnds = offset_int['end'].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(allStarts)
+    starts, ends = allStarts[valid], allEnds[valid]
+    assert (np.diff(starts) >= 0).all(), 'the offset green intervals must be in time order'
+
+    #concurrent green-onset: some offset green with start <= s < end, i.e. the latest end among the starts <= s is > s
+    numBefore = np.searchsorted(starts, s, side='right')
+    latestEnd = np.maximum.accumulate(np.where(np.isnan(ends), -np.inf, ends))
+    concur = numBefore > 0
+    concur[concur] = latestEnd[numBefore[concur]-1] > s[concur]
+    result['concur'] = concur
+    #usable time of concurrent green-onset, measured from the first offset green end after s
+    #(the first row with end > s is where the running maximum of the ends first exceeds s)
+    firstEnd = np.searchsorted(np.maximum.accumulate(np.where(np.isnan(allEnds), -np.inf, allEnds)), s, side='right')
+    usable_concur = np.full(s.shape, np.nan)
+    usable_concur[concur] = s[concur] - allEnds[firstEnd[concur]] - cyclic_offset
+    result['concur_usable'] = np.where(usable_concur > 0, usable_concur, 0)
+
+    #k-th later offset green: the (numBefore + k - 1)-th start, for all k at once (past the last one -> NaN)
+    kth = np.minimum(numBefore[:, None] + np.arange(orders)[None, :], len(starts))
+    kthStart = np.append(starts, np.nan)[kth]
+    kthEnd = np.append(ends, np.nan)[kth]
+    with np.errstate(invalid='ignore'):
+        usable_checkend = kthEnd - s[:, None] - cyclic_offset
+        usable_checkstart = kthStart - s[:, None] - cyclic_offset
+        usable = np.where((usable_checkend > 0) & (usable_checkstart < 0), usable_checkend,
+                          np.where((usable_checkend > 0) & (usable_checkstart > 0), kthEnd - kthStart, 0))
+    usable[kth == len(starts)] = np.nan
+    for k in range(orders):
+        result[ordinal(k+1)+'_offset'] = kthStart[:, k] - s
+        result[ordinal(k+1)+'_usable'] = usable[:, k]
+    return result
+
+
+_poolGreens = None
+
+def _init_worker(greens):
+    #the green intervals are sent once per worker instead of once per task
+    global _poolGreens
+    _poolGreens = greens
+
+def _reference_offsets(task):
+    reference, targets, orders = task
+    return [((reference, target), offset_table(_poolGreens[reference], _poolGreens[target], orders, travel_time))
+            for target, travel_time in targets]
+
+def network_offsets(records: dict,
+                    links,
+                    coor_index,
+                    orders: int = 1,
+                    processes: int = None,
+                    node_labels: dict = None):
+    '''
+    Offsets and usable progression times of every directional signal pair of a network.
+        records     - {tlsID: TLSRecord}, e.g. record_functions.read_tlsrecord on a network-wide tlsrecord
+        links       - (from tlsID, to tlsID, travel time) of every directional pair, as triples or a DataFrame
+                      with these three columns; the 'from' signal is the reference of the pair
+        coor_index  - (start, end) phase indices of the coordinated green of all signals, or {tlsID: (start, end)}
+        node_labels - optional {tlsID: node label} for the matrices (e.g. '1_2' for network_draw); default the tlsID
+    The pairs are computed in a process pool (all cores by default; processes = 1 runs in this process),
+    one task per reference signal.
+    Returns (tables, matrices)
+        tables   - {(from, to): offset_table of the pair}
+        matrices - {column: from x to DataFrame} with the mean over the reference greens of every column
+                   of offset_table ('concur' becomes the fraction of concurrent onsets), NaN where there is
+                   no link. This is the index/column layout read by network_functions.draw_edge_label.
+    '''
+    if isinstance(links, pd.DataFrame):
+        links = links.itertuples(index=False, name=None)
+    targets = {}
+    for reference, target, travel_time in links:
+        targets.setdefault(reference, []).append((target, travel_time))
+    used = set(targets) | {target for pairs in targets.values() for target, _ in pairs}
+    greens = {tlsID: green_intervals(records[tlsID], coor_index[tlsID] if isinstance(coor_index, dict) else coor_index)
+              for tlsID in used}
+    tasks = [(reference, pairs, orders) for reference, pairs in targets.items()]
+
+    if processes == 1:
+        _init_worker(greens)
+        results = [_reference_offsets(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers = processes, initializer = _init_worker, initargs = (greens,)) as pool:
+            results = list(pool.map(_reference_offsets, tasks))
+    tables = dict(pair for result in results for pair in result)
+
+    label = (lambda tlsID: node_labels.get(tlsID, tlsID)) if node_labels else (lambda tlsID: tlsID)
+    nodes = sorted({label(tlsID) for tlsID in used}, key=str)
+    columns = [column for column in next(iter(tables.values())).columns if column not in ('start', 'end')] if tables else []
+    matrices = {column: pd.DataFrame(np.nan, index=nodes, columns=nodes) for column in columns}
+    for (reference, target), table in tables.items():
+        for column in columns:
+            matrices[column].loc[label(reference), label(target)] = table[column].astype(np.float64).mean()
+    return tables, matrices
@@ -24,109 +24,157 @@ SOFTWARE.
 This software is intended to be freely shared among Oguchi Lab members for research purposes
 '''
 
-import statistics
 import pandas as pd
 import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
+from matplotlib.backend_bases import TimerBase
+from matplotlib.collections import PolyCollection
 from matplotlib.widgets import RangeSlider, Button, RadioButtons
-plt.rcParams.update({'font.sans-serif':'Arial'})
+from record_functions import TLSRecordTail
+#the compute core, re-exported here for the existing imports
+from core_functions import _asRecord, tlsStages, tlsNumpy
+from cycle_functions import cycleGreenBars
+from query_functions import TLSRangeIndex
+from lod_functions import PlanLOD, planLOD, _barVerts
+import profile_functions
+from profile_functions import phase
+#initial (t0, t1) of the time slider
+SLIDER_INIT = (0, 180)
 
 
-def tlsStages(tlsdf: pd.DataFrame,
-                stageIndices: list,
-                stageNames: list,
-                definition: str = 'mode') -> pd.DataFrame:
+def _setFonts():
+    #the font of the plots, set when a figure is laid out rather than when this module is imported
+    plt.rcParams.update({'font.sans-serif':'Arial'})
+
+
+def _update_dist(t0, t1, index, axDist):
+    heights = index.histogram(t0, t1, dist_bins, density)
+    for stageHeights, barContainer in zip(heights, axDist.containers):
+        for i, rectangle in enumerate(barContainer.patches):
+            rectangle.set_height(stageHeights[i])
+
+def _update_split(t0, t1, index, axSplit):
+    all_signal = index.sums(t0, t1)[:onlyGreen]
+    all_signal_cumsum = np.append(0,np.cumsum(all_signal))
+    with np.errstate(invalid='ignore'):
+        green_percent = all_signal/all_signal.sum()
+    for i, barContainer in enumerate(axSplit.containers[:onlyGreen]):
+        barContainer.patches[0].set_x(all_signal_cumsum[i])
+        barContainer.patches[0].set_width(all_signal[i])
+        texts[i].set_text('{:.2f}'.format(green_percent[i]))
+        texts[i].set_x(all_signal_cumsum[i] + 0.45*all_signal[i])
+    axSplit.set_xticks(all_signal_cumsum)
+    if all_signal_cumsum[-1] > 0: # not for a range without any event
+        axSplit.set_xlim(0, all_signal_cumsum[-1])
+        axSplit.set_aspect((all_signal_cumsum[-1])/60*2, adjustable='box')
+
+def update_panels(t0, t1, index, axSplit, axDist, axCyclic, axPlan):
     '''
-    There are two ways for definition of subStage definition
-    1) definition from the statistical mode of movement indicators
-        say we have stageIndices = [0,0,0,1,1,1,0,1]
-        and the state of a subStage i is 'y g g r r r g r' 
-        then the states at subStage i are stage0:g (3g over 1y), stage1:r (4r)
-        
-    2) definition from the first movement indicator
-        say we have sigGruppenIndex = [>0<,0,0,>1<,1,1,0,1]
-        and the state of subStage i is '>y< g g >r< r r g r' 
-        then the states at subStage i is stage0:y , stage1:r
+    Sets the four panels of the cluster plot to the time range (t0, t1), as the time slider does.
+    'index' is the query_functions.TLSRangeIndex of the plotted tlsnp.
     '''
-    stages = pd.DataFrame(columns = stageNames,
-                              index = pd.Index(pd.unique(tlsdf.iloc[:,3]),name = 'subStageID'))
-    for i in stages.index:
-        assert len(pd.unique(tlsdf.loc[tlsdf['subStageID'] == i,'state'])) == 1, 'movement definition conflict'
-        indicators = pd.unique(tlsdf.loc[tlsdf['subStageID'] == i,'state'])[0]
-        for movement in range(len(stageNames)):
-            slicedIndex = [ind for ind, j in enumerate(stageIndices) if j == movement]
-            movementIndicators = [indicators[ind] for ind in slicedIndex]
-            if definition == 'mode':
-                stageDefinition = statistics.mode(movementIndicators)
-            elif definition =='first':
-                stageDefinition = movementIndicators[0]
-            else:
-                raise ValueError('the input value for \'definition\' is invalid')
-            stages.loc[i,stageNames[movement]] = stageDefinition
-    return stages
-
-def tlsNumpy(tlsdf: pd.DataFrame,
-             stages: pd.DataFrame):
-    tlsdf_reduced = tlsdf.loc[:,('time','subStageID')]
-    #find which subStageIDs correspond to the green subStages of each stage. 
-    greenSubStages = {}
-    amberRedRows = pd.Series([False for _ in range(tlsdf.shape[0])])
-    for column in  stages:
-        greenSubStages[column] = stages[column].loc[stages[column] == 'g'].index.to_list()
-        greenRows = (tlsdf['subStageID'] == greenSubStages[column][0])
-        greenTimes = pd.concat([pd.Series(tlsdf.loc[tlsdf.index[1:],'time'].to_numpy() - tlsdf.loc[tlsdf.index[:-1],'time'].to_numpy()),
-                               pd.Series([float('nan')],index = [tlsdf.index.max()])])
-        tlsdf_reduced.loc[greenRows, column] = greenTimes.loc[greenRows]
-        amberRedRows = amberRedRows | greenRows
-    #last column for yellow and red time
-    amberRedRows = ~amberRedRows
-    amberRedTimes = pd.concat([pd.Series(tlsdf.loc[tlsdf.index[1:],'time'].to_numpy() - tlsdf.loc[tlsdf.index[:-1],'time'].to_numpy()),
-                        pd.Series([float('nan')],index = [tlsdf.index.max()])])
-    tlsdf_reduced.loc[amberRedRows, 'AmberRed'] = amberRedTimes.loc[amberRedRows]
-    return tlsdf_reduced.to_numpy().copy()
-    
+    axCyclic.set_xlim(t0-3, t1+3)
+    axCyclic.set_aspect((t1-t0)/720, adjustable='box')
+    axPlan.set_xlim(t0, t1)
+    axPlan.set_aspect((t1-t0)/60*1.5, adjustable='box')
+    lod = planLOD(axPlan)
+    if lod is not None:
+        lod.update(t0, t1)
+    _update_dist(t0, t1, index, axDist)
+    _update_split(t0, t1, index, axSplit)
+
+
+class _BlitScheduler:
+    '''
+    Coalesces the RangeSlider events: only the latest value is applied, at most once every 'interval' ms,
+    and only the given axes are redrawn (blitted) over a cached background of the rest of the figure.
+    The background is taken with those axes hidden and retaken after any full redraw (resize, RadioButtons, ...).
+    On canvases without a GUI event loop (e.g. Agg) each event is applied at once, as before.
+    '''
+    def __init__(self, fig, axes, update, interval = 25):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.axes = axes
+        self.update = update
+        self.pending = None
+        self.scheduled = False
+        self.capturing = False
+        self.background = None
+        #(the latency of a slider update, drawing included, is recorded when profile_functions is enabled)
+        self.flush = profile_functions.callback('time_slider', self.flush)
+        self.timer = self.canvas.new_timer(interval = interval)
+        if type(self.timer) is TimerBase:
+            self.timer = None
+        else:
+            self.timer.single_shot = True
+            self.timer.add_callback(self.flush)
+        self.canvas.mpl_connect('draw_event', self.invalidate)
+
+    def __call__(self, val):
+        self.pending = val
+        if self.timer is None:
+            self.flush()
+        elif not self.scheduled:
+            self.scheduled = True
+            self.timer.start()
 
-def universal_widgets(tlsnp, axSplit, axDist, axCyclic, axPlan):
+    def invalidate(self, event):
+        if not self.capturing:
+            self.background = None
+
+    def capture(self):
+        self.capturing = True
+        visible = [ax.get_visible() for ax in self.axes]
+        for ax in self.axes:
+            ax.set_visible(False)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        for ax, axVisible in zip(self.axes, visible):
+            ax.set_visible(axVisible)
+        self.capturing = False
+
+    def flush(self):
+        self.scheduled = False
+        if self.pending is None:
+            return
+        val, self.pending = self.pending, None
+        self.update(val)
+        if self.timer is None or not self.canvas.supports_blit:
+            self.canvas.draw_idle()
+            return
+        if self.background is None:
+            self.capture()
+        self.canvas.restore_region(self.background)
+        for ax in self.axes:
+            self.fig.draw_artist(ax)
+        self.canvas.blit(self.fig.bbox)
+
+
+def universal_widgets(tlsnp, axSplit, axDist, axCyclic, axPlan, index = None):
     #RangeSlider for the time axis
     axtime = plt.axes([0.3, 0, 0.3, 0.09])
     time_slider = RangeSlider(ax = axtime,
                          label = 'Plot range',
                          valmin = 0,
                          valmax = tlsnp[:,0].max(),
-                         valinit = (0,180),
+                         valinit = SLIDER_INIT,
                          valfmt = '%d s')
     
+    # range queries of the Callables below are answered from an index built once
+    # (or from the one given, e.g. extended while a record is followed live)
+    if index is None:
+        index = TLSRangeIndex(tlsnp)
+
     # the Callable for each time there is a change of slider
     def time_update(val):
-        axCyclic.set_xlim(time_slider.val[0]-3, time_slider.val[1]+3)
-        axCyclic.set_aspect((time_slider.val[1]-time_slider.val[0])/720, adjustable='box')
-        axPlan.set_xlim(time_slider.val[0], time_slider.val[1])
-        axPlan.set_aspect((time_slider.val[1]-time_slider.val[0])/60*1.5, adjustable='box')
-        
-        selected_time = (time_slider.val[0] < tlsnp[:,0]) & (tlsnp[:,0]  < time_slider.val[1])
-        for col, barContainer in enumerate(axDist.containers, 2):
-            noNaN = ~np.isnan(tlsnp[selected_time,col])
-            heights = np.histogram(tlsnp[selected_time][noNaN,col], bins = dist_bins, density = density)[0]
-            for i, rectangle in enumerate(barContainer.patches):
-                rectangle.set_height(heights[i])
-                
-        selected_time = (time_slider.val[0] < tlsnp[:,0]) & (tlsnp[:,0]  < time_slider.val[1])
-        all_signal = np.nan_to_num(tlsnp[selected_time,2:onlyGreen]).sum(axis=0)
-        all_signal_cumsum = np.append(0,np.cumsum(all_signal))
-        green_percent = all_signal/all_signal.sum()
-        for i, barContainer in enumerate(axSplit.containers[:onlyGreen]):
-            barContainer.patches[0].set_x(all_signal_cumsum[i])
-            barContainer.patches[0].set_width(all_signal[i])
-            texts[i].set_text('{:.2f}'.format(green_percent[i]))
-            texts[i].set_x(all_signal_cumsum[i] + 0.45*all_signal[i])
-        axSplit.set_xticks(all_signal_cumsum)
-        axSplit.set_xlim(0, all_signal_cumsum[-1])
-        axSplit.set_aspect((all_signal_cumsum[-1])/60*2, adjustable='box')
+        update_panels(time_slider.val[0], time_slider.val[1], index, axSplit, axDist, axCyclic, axPlan)
 
     # register the Callable with each slider
-    time_slider.on_changed(time_update)
+    # (through the scheduler, which redraws the slider itself together with the panels)
+    time_slider.drawon = False
+    time_slider.on_changed(_BlitScheduler(axtime.figure, [axtime, axSplit, axDist, axCyclic, axPlan], time_update))
     
     # RadioButtons for more plot options
     radio1 = RadioButtons(plt.axes([0.8, 0.91, 0.15, 0.06]), ['Frequency','Probability density'])
@@ -140,15 +188,9 @@ def universal_widgets(tlsnp, axSplit, axDist, axCyclic, axPlan):
             axDist.set_ylabel('Probability density')
             density = True
             axDist.set_ylim(0,0.3)
-
-        selected_time = (time_slider.val[0] < tlsnp[:,0]) & (tlsnp[:,0]  < time_slider.val[1])
-        for col, barContainer in enumerate(axDist.containers, 2):
-            noNaN = ~np.isnan(tlsnp[selected_time,col])
-            heights = np.histogram(tlsnp[selected_time][noNaN,col], bins = dist_bins, density = density)[0]
-            for i, rectangle in enumerate(barContainer.patches):
-                rectangle.set_height(heights[i])
+        _update_dist(time_slider.val[0], time_slider.val[1], index, axDist)
     
-    radio1.on_clicked(histfunc)
+    radio1.on_clicked(profile_functions.callback('radio_distribution', histfunc))
     
     radio2 = RadioButtons(plt.axes([0.35, 0.86, 0.15, 0.06]), ['Green + Yellow & red','Green'])
     def splitfunc(label):
@@ -160,20 +202,9 @@ def universal_widgets(tlsnp, axSplit, axDist, axCyclic, axPlan):
             onlyGreen = -1
             texts[-1].set_alpha(0)
             axSplit.containers[-1].patches[0].set_width(0)
-        selected_time = (time_slider.val[0] < tlsnp[:,0]) & (tlsnp[:,0]  < time_slider.val[1])
-        all_signal = np.nan_to_num(tlsnp[selected_time,2:onlyGreen]).sum(axis=0)
-        all_signal_cumsum = np.append(0,np.cumsum(all_signal))
-        green_percent = all_signal/all_signal.sum()
-        for i, barContainer in enumerate(axSplit.containers[:onlyGreen]):
-            barContainer.patches[0].set_x(all_signal_cumsum[i])
-            barContainer.patches[0].set_width(all_signal[i])
-            texts[i].set_text('{:.2f}'.format(green_percent[i]))
-            texts[i].set_x(all_signal_cumsum[i] + 0.45*all_signal[i])
-        axSplit.set_xticks(all_signal_cumsum)
-        axSplit.set_xlim(0, all_signal_cumsum[-1])
-        axSplit.set_aspect((all_signal_cumsum[-1])/60*2, adjustable='box')
+        _update_split(time_slider.val[0], time_slider.val[1], index, axSplit)
         
-    radio2.on_clicked(splitfunc)
+    radio2.on_clicked(profile_functions.callback('radio_split', splitfunc))
            
     # putting up a reset button for the time slider
     resetax = plt.axes([0.7, 0.02, 0.1, 0.06])
@@ -181,10 +212,14 @@ def universal_widgets(tlsnp, axSplit, axDist, axCyclic, axPlan):
     def reset(event):
         time_slider.reset()
         # axPlan.set_ylim(-0.5,len(stageNames)-0.5)
-    button.on_clicked(reset)
+    button.on_clicked(profile_functions.callback('reset_button', reset))
     return time_slider, button, radio1, radio2
 
 
+def _barCollection(x0, x1, y0, y1, facecolors) -> PolyCollection:
+    #one artist for many rectangles
+    return PolyCollection(_barVerts(x0, x1, y0, y1), facecolors = facecolors, linewidths = 0)
+
 def plot_signalPlan(ax: plt.Axes,
                     time_slider: RangeSlider,
                     tlsnp: np.ndarray,
@@ -192,21 +227,16 @@ def plot_signalPlan(ax: plt.Axes,
                     colours: list = ['red', 'yellow', 'green', 'forestgreen']):
     '''
     'colours' list must contain 4 pyplot colours which respectively represent the SUMO signal indicators r y g G.
+    The bars are drawn as one PolyCollection by a lod_functions.PlanLOD: the events of the visible range while
+    they are few, per-bin summaries (green fraction, dominant indicator) when zoomed out, so the number of bars
+    and minor ticks does not grow with the record length. update_panels redraws it for the slider range.
     '''
     stageNames = stages.columns
-    stages_plan= stages.copy()
-    for i, color in enumerate('rygG'):
-        stages_plan[stages==color] = colours[i]
-
-    for i in range(tlsnp.shape[0]-1):
-        ax.barh(stageNames,
-                width = tlsnp[i+1,0] - tlsnp[i,0], 
-                left = tlsnp[i,0],
-                height = 0.5,
-                color = stages_plan.loc[tlsnp[i,1]])
+    PlanLOD(ax, tlsnp, stages, colours).update(time_slider.val[0], time_slider.val[1])
+    ax.set_yticks(np.arange(len(stageNames)))
+    ax.set_yticklabels(stageNames)
     ax.set_xlabel('Simulation time (s)')
-    ax.set_xticks(tlsnp[:,0], minor = True, linewidth = 0.5)
-    ax.xaxis.grid(True, which='minor')
+    ax.xaxis.grid(True, which='minor', linewidth = 0.5)
     
     ax.set_xlim(time_slider.val[0], time_slider.val[1])
     ax.set_ylim(-0.5,len(stageNames)-0.5)
@@ -217,13 +247,15 @@ def plot_greenTimeDistribution(ax: plt.Axes,
                                tlsnp: np.ndarray,
                                stages: pd.DataFrame,
                                num_bins: int,
-                               bar_colours: list):
+                               bar_colours: list,
+                               dist_range: tuple = None):
     '''
     The number of colours provided in 'bar_colours' has to be equal to the number of stages
+    'dist_range' optionally fixes the (lower, upper) green time of the bins (default: the range of tlsnp)
     '''
     global dist_bins, density, dist_ylim
     density = False
-    _, dist_bins,_ = ax.hist(tlsnp[:,2:-1],  bins = num_bins, histtype = 'bar',
+    _, dist_bins,_ = ax.hist(tlsnp[:,2:-1],  bins = num_bins, range = dist_range, histtype = 'bar',
                              density = density, color = bar_colours, label = stages.columns.to_list())
     dist_ylim = ax.get_ylim()
     ax.legend(prop={'size': 10})
@@ -287,31 +319,14 @@ def plot_cyclicity(ax: plt.Axes,
     There are 2 variations of cyclicity plot
     1) A vertical bar is stacked until the same stage is recurred (default).
     2) A vertical bar is stacked until all stages are in the bar.
+    The quasi-cycles are found by cycle_functions.cycleStarts and all bars are drawn as one PolyCollection,
+    which is returned.
     '''
-    bar_loc = 0
-    last_top = 0 
-    storage = []
-    greenSubStages = {}
-    for column in  stages:
-        greenSubStages[column] = stages[column].loc[stages[column] == 'g'].index.to_list()
-    flattenedGreen = [i for j in list(greenSubStages.values()) for i in j]
-    bar_colours = pd.Series(bar_colours, index = flattenedGreen) # watch out, this may not work when a stage is green at more than 1 subStages
-    for i in range(tlsnp.shape[0]-1):
-        storage.append(tlsnp[i,1])
-        cond1 = any([storage.count(subStageID) > 1 for subStageID in stages.index]) and cyclicity == 1 # the condition for first varition of plot
-        cond2 = all([subStageID in storage for subStageID in stages.index]) and cyclicity == 2 # the condition for second varition of plot
-        if cond1 or cond2:
-            storage = [tlsnp[i,1]]
-            bar_loc = tlsnp[i,0]
-            last_top = 0 
-            
-        if tlsnp[i, 1] in flattenedGreen:
-            ax.bar(x = bar_loc,
-                    height = tlsnp[i+1,0] - tlsnp[i,0], 
-                    bottom = last_top,
-                    width = 5,
-                    color = bar_colours[tlsnp[i, 1]])
-            last_top = tlsnp[i+1,0] - tlsnp[i,0] + last_top
+    x, bottom, height, stage = cycleGreenBars(tlsnp, stages, cyclicity)
+    rgba = mpl.colors.to_rgba_array(bar_colours[:len(stages.columns)])
+    bars = ax.add_collection(_barCollection(x-2.5, x+2.5, bottom, bottom+height, rgba[stage]))
+    if height.shape[0] > 0:
+        ax.set_ylim(0, 1.05*(bottom+height).max())
 
     ax.set_xlabel('Simulation time (s)')
     ax.set_ylabel('Quasi-cyclic green time (s)')
@@ -319,33 +334,256 @@ def plot_cyclicity(ax: plt.Axes,
     
     ax.set_xlim(time_slider.val[0]-3, time_slider.val[1]+3)
     ax.set_aspect((time_slider.val[1]-time_slider.val[0])/720, adjustable='box')
-    
+    return bars
+
+
+def cluster_axes(fig) -> tuple:
+    '''
+    Returns the axes (axSplit, axDist, axCyclic, axPlan) of the cluster plot layout on 'fig'
+    '''
+    _setFonts()
+    gs = gridspec.GridSpec(9, 2, figure = fig)
+    axSplit = fig.add_subplot(gs[0:2,0])
+    axDist = fig.add_subplot(gs[0:2,1])
+    axCyclic = fig.add_subplot(gs[3:6,:])
+    axPlan = fig.add_subplot(gs[6:9,:])
+    return axSplit, axDist, axCyclic, axPlan
+
+def plot_panels(axes, time_slider, tlsnp, stages, num_bins, cyclicity_type, bar_colours, dist_range = None):
+    '''
+    Draws the four panels on the axes from cluster_axes.
+    'time_slider' only needs a 'val' attribute (t0, t1), so a fixed range can be used without widgets.
+    Returns the PolyCollection of the cyclicity bars (see plot_cyclicity).
+    '''
+    axSplit, axDist, axCyclic, axPlan = axes
+    axPlan.set_title('Signal Plan', fontweight ="bold")
+    with phase('plot_signalPlan'):
+        plot_signalPlan(axPlan, time_slider, tlsnp, stages)
+
+    axDist.set_title('Green Duration Distribution', fontweight = 'bold')
+    with phase('plot_greenTimeDistribution'):
+        plot_greenTimeDistribution(axDist, time_slider, tlsnp, stages, num_bins, bar_colours, dist_range)
+
+    axCyclic.set_title('Cyclicity plot using the {} definition'.format('first' if cyclicity_type == 1 else 'second'), fontweight ='bold')
+    with phase('plot_cyclicity'):
+        cycleBars = plot_cyclicity(axCyclic, time_slider, tlsnp, stages, cyclicity_type, bar_colours)
+
+    axSplit.set_title('Green Split', fontweight = 'bold')
+    with phase('plot_greenTimeSplit'):
+        plot_greenTimeSplit(axSplit, time_slider, tlsnp, stages, bar_colours)
+    return cycleBars
+
+
+def plot_replicationDistribution(ax: plt.Axes, summary: dict, bins, bar_colours: list):
+    '''
+    The green duration distribution panel for replication_functions.ReplicationStats.summary():
+    the mean counts per replication, with the confidence interval of every bar as an error bar
+    '''
+    mean, halfWidth = summary['distribution']['mean'], summary['distribution']['halfwidth']
+    centres = (bins[:-1] + bins[1:])/2
+    ax.hist([centres]*len(mean.index), bins = bins, weights = list(mean.to_numpy()), histtype = 'bar',
+            color = bar_colours[:len(mean.index)], label = mean.index.to_list())
+    for barContainer, errors in zip(ax.containers, halfWidth.to_numpy()):
+        x = [rectangle.get_x() + rectangle.get_width()/2 for rectangle in barContainer.patches]
+        heights = [rectangle.get_height() for rectangle in barContainer.patches]
+        ax.errorbar(x, heights, yerr = np.nan_to_num(errors), fmt = 'none', ecolor = 'black', elinewidth = 0.8, capsize = 2)
+    ax.legend(prop={'size': 10})
+    ax.set_xlabel('Green time (s)')
+    ax.set_ylabel('Frequency per replication')
+
+def plot_replicationSplit(ax: plt.Axes, summary: dict, bar_colours: list):
+    '''
+    The green split panel for replication_functions.ReplicationStats.summary(): the mean split of the
+    replications as fractions, labelled with the half-width of its confidence interval
+    '''
+    split = summary['split']
+    colours = list(bar_colours[:len(split.index)-1]) + ['grey']
+    cumsum = np.append(0, np.cumsum(split['mean'].to_numpy()))
+    for i, name in enumerate(split.index):
+        ax.barh(['Green Split'], width = split['mean'].iloc[i], left = cumsum[i], height = 3,
+                color = colours[i], label = name)
+        ax.text(cumsum[i] + 0.1*split['mean'].iloc[i], -0.25,
+                '{:.2f}\n\u00b1{:.2f}'.format(split['mean'].iloc[i], (split['high'] - split['mean']).iloc[i]),
+                color = 'white', fontsize = 9)
+    ax.set_xticks(cumsum)
+    ax.set_xticklabels(['{:.2f}'.format(x) for x in cumsum])
+    ax.set_xlim(0, max(cumsum[-1], 1e-9))
+    ax.set_xlabel('Fraction of the run')
+    ax.legend(loc = 'lower left', bbox_to_anchor=(0, 1.04), borderaxespad=0, prop={'size': 10})
+
+def plot_replicationCycles(ax: plt.Axes, summary: dict, bar_colours: list):
+    '''
+    The mean per-cycle length, stage greens and yellow & red of the replications with their confidence intervals
+    '''
+    cycle = summary['cycle']
+    colours = ['lightgrey'] + list(bar_colours[:len(cycle.index)-2]) + ['grey']
+    x = np.arange(len(cycle.index))
+    ax.bar(x, cycle['mean'], color = colours,
+           yerr = np.nan_to_num((cycle['high'] - cycle['mean']).to_numpy()), capsize = 4)
+    ax.set_xticks(x)
+    ax.set_xticklabels(cycle.index)
+    ax.set_ylabel('Mean per cycle (s)')
+    ax.yaxis.grid(True)
+
+def replicationPlot_TLS(stats, **kwargs):
+    '''
+    The split and distribution panels of clusterPlot_TLS, and the per-cycle statistics, for the replications
+    aggregated by replication_functions.aggregate_replications ('stats' is its ReplicationStats).
+    The optional keyword arguments are 'bar_colours' and 'confidence' (of the intervals, default 0.95).
+    Returns the figure.
+    '''
+    bar_colours = kwargs.get('bar_colours', [mini_dict['color'] for mini_dict in mpl.rcParams["axes.prop_cycle"][:len(stats.stageNames)]])
+    confidence = kwargs.get('confidence', 0.95)
+    summary = stats.summary(confidence)
+
+    _setFonts()
+    fig = plt.figure(figsize=(12, 8))
+    axSplit, axDist, axCycle, axPlan = cluster_axes(fig)
+    axPlan.set_visible(False)
+    axSplit.set_title('Green Split', fontweight = 'bold')
+    plot_replicationSplit(axSplit, summary, bar_colours)
+    axDist.set_title('Green Duration Distribution', fontweight = 'bold')
+    plot_replicationDistribution(axDist, summary, stats.bins, bar_colours)
+    axCycle.set_title('Per-cycle statistics using the {} definition ({} replications, {:.0%} intervals)'.format(
+        'first' if stats.cyclicity == 1 else 'second', len(stats.seeds), confidence), fontweight = 'bold')
+    plot_replicationCycles(axCycle, summary, bar_colours)
+    return fig
+
+
+def comparePlot_TLS(records, stageIndices, stageNames, **kwargs):
+    '''
+    Compares two or more records of the same junction (e.g. control programs) in one figure with one time slider:
+        Green Split          - the split of every record, with its change from the first record (the baseline)
+        Green Duration Distribution difference - histogram of every other record minus the baseline, per stage
+        Cycle length         - the length of the quasi-cycles of every record over time
+        Cycle length difference - every other record minus the baseline, at the cycle starts of all records
+    'records' are record_functions.TLSRecord or single-TLS DataFrames, or a compare_functions.ComparisonIndex.
+    The optional keyword arguments are those of compare_functions.compare_records (labels, align, stage_type,
+    cyclicity_type), plus 'bar_colours', 'num_bins' and 'dist_range' (default (0, 120)).
+    Returns (time_slider, index); keep them referenced while the plot is shown.
+    '''
+    from compare_functions import ComparisonIndex, compare_records
+    bar_colours = list(kwargs.get('bar_colours', [mini_dict['color'] for mini_dict in mpl.rcParams["axes.prop_cycle"][:len(stageNames)]]))
+    num_bins = kwargs.get('num_bins', 10)
+    dist_range = kwargs.get('dist_range', (0, 120))
+    index = records if isinstance(records, ComparisonIndex) else compare_records(records, stageIndices, stageNames, **kwargs)
+    bins = np.linspace(dist_range[0], dist_range[1], num_bins + 1)
+    labels = index.labels
+    tmin, tmax = index.timeRange
+    linestyles = ['-', '--', ':', '-.']
+
+    _setFonts()
+    fig = plt.figure(figsize=(12, 8))
+    axSplit, axDist, axCycle, axDelta = cluster_axes(fig)
+    fig.subplots_adjust(bottom = 0.15, hspace = 1.5) # the cycle panels are not shrunk by an aspect ratio
+    axtime = plt.axes([0.3, 0, 0.3, 0.09])
+    time_slider = RangeSlider(ax = axtime, label = 'Plot range', valmin = tmin, valmax = tmax,
+                              valinit = (tmin, tmax), valfmt = '%d s')
+
+    axSplit.set_title('Green Split', fontweight = 'bold')
+    colours = mpl.colors.to_rgba_array(bar_colours[:len(stageNames)] + ['grey'])
+    splitBars = PolyCollection(np.zeros((0, 4, 2)), linewidths = 0, facecolors = np.tile(colours, (len(index), 1)))
+    axSplit.add_collection(splitBars)
+    splitTexts = [axSplit.text(1.01, k, '', va = 'center', fontsize = 8) for k in range(len(index))]
+    axSplit.set_yticks(np.arange(len(index)))
+    axSplit.set_yticklabels(labels)
+    axSplit.set_ylim(len(index) - 0.5, -0.5)
+    axSplit.set_xlim(0, 1)
+    axSplit.set_xlabel('Fraction of the range')
+
+    axDist.set_title('Green Duration Distribution difference', fontweight = 'bold')
+    stairs = [[axDist.stairs(np.zeros(num_bins), bins, color = bar_colours[j], linestyle = linestyles[(k-1) % len(linestyles)],
+                             label = '{}: {} - {}'.format(name, labels[k], labels[0]) if len(index) > 2 else name)
+               for j, name in enumerate(stageNames)] for k in range(1, len(index))]
+    axDist.axhline(0, color = 'black', linewidth = 0.5)
+    axDist.legend(prop={'size': 8})
+    axDist.set_xlabel('Green time (s)')
+    axDist.set_ylabel('Frequency difference')
+
+    axCycle.set_title('Cycle length using the {} definition'.format('first' if index.cyclicity == 1 else 'second'), fontweight = 'bold')
+    for k, starts in enumerate(index._cycleStarts):
+        axCycle.step(starts, np.diff(index._cycleCumsums[k][:,0]), where = 'post', linewidth = 0.8,
+                     linestyle = linestyles[k % len(linestyles)], label = labels[k])
+    axCycle.legend(prop={'size': 8}, loc = 'upper right')
+    axCycle.set_ylabel('Cycle length (s)')
+    axCycle.xaxis.grid(True)
+
+    axDelta.set_title('Cycle length difference to {}'.format(labels[0]), fontweight = 'bold')
+    times, deltas = index.cycle_length_deltas(tmin, tmax)
+    for k, delta in enumerate(deltas, 1):
+        axDelta.step(times, delta, where = 'post', linewidth = 0.8, linestyle = linestyles[(k-1) % len(linestyles)], label = labels[k])
+    axDelta.axhline(0, color = 'black', linewidth = 0.5)
+    deltaLegend = axDelta.legend(prop={'size': 8}, loc = 'upper right')
+    axDelta.set_xlabel('Simulation time (s)')
+    axDelta.set_ylabel('Difference (s)')
+    axDelta.xaxis.grid(True)
+
+    def time_update(val):
+        t0, t1 = time_slider.val
+        splits = np.nan_to_num(index.splits(t0, t1))
+        edges = np.hstack([np.zeros((len(index), 1)), np.cumsum(splits, axis=1)])
+        rows = np.repeat(np.arange(len(index)), splits.shape[1])
+        splitBars.set_verts(_barVerts(edges[:,:-1].ravel(), edges[:,1:].ravel(), rows-0.4, rows+0.4))
+        greens = splits[:,:-1].sum(axis=1)
+        for k, text in enumerate(splitTexts):
+            text.set_text('green {:.2f}'.format(greens[k]) if k == 0 else '{:+.2f}'.format(greens[k] - greens[0]))
+        deltas = index.histogram_deltas(t0, t1, bins)
+        for k, stageStairs in enumerate(stairs):
+            for j, stair in enumerate(stageStairs):
+                stair.set_data(deltas[k, j])
+        axDist.relim()
+        axDist.autoscale_view()
+        axDist.set_ylim(min(deltas.min(), -1)*1.1, max(deltas.max(), 1)*1.1)
+        cycleDeltas = index.cycle_deltas(t0, t1)[:,0]
+        for k, text in enumerate(deltaLegend.get_texts(), 1):
+            text.set_text('{} (mean {:+.1f} s)'.format(labels[k], cycleDeltas[k-1]))
+        for ax in (axCycle, axDelta):
+            ax.set_xlim(t0, t1)
+
+    time_slider.drawon = False
+    time_slider.on_changed(_BlitScheduler(fig, [axtime, axSplit, axDist, axCycle, axDelta], time_update))
+    time_update(time_slider.val)
+    return time_slider, index
 
 
 def clusterPlot_TLS(tlsdf, stageIndices, stageNames, **kwargs):
-    assert len(stageIndices) == len(tlsdf.loc[0,'state']), 'The grouping of movements into stages is not valid'
+    '''
+    'tlsdf' is either the DataFrame of a single-TLS tlsrecord or one TLSRecord from record_functions.read_tlsrecord
+    'stages' and 'tlsnp' can be passed as keyword arguments when they are already known (e.g. from cache_functions.load_tlsnp)
+    'dist_range' optionally fixes the range of the green time distribution bins
+    When 'tlsdf' is a record_functions.TLSRecordTail, the file is followed while it is being written,
+    see live_functions.followPlot_TLS (which also returns the refresh timer).
+    'profile' (e.g. 'summary', 'cprofile' or 'trace:plot.json') records the time of every phase below and the
+    latency of the widget callbacks, see profile_functions (the same as the environment variable TLS_PROFILE).
+    '''
+    if kwargs.get('profile', None):
+        profile_functions.enable(kwargs['profile'])
+    if isinstance(tlsdf, TLSRecordTail):
+        from live_functions import followPlot_TLS
+        return followPlot_TLS(tlsdf, stageIndices, stageNames, **kwargs)
+    #a DataFrame is converted to the compact event store once, everything below reads from it
+    with phase('record'):
+        record = _asRecord(tlsdf)
+    assert len(stageIndices) == record.stateTable.shape[1], 'The grouping of movements into stages is not valid'
     
     #Handling the keyword arugments which are optional arguments
     bar_colours = kwargs.get('bar_colours', [mini_dict['color'] for mini_dict in mpl.rcParams["axes.prop_cycle"][:len(stageNames)]])
     num_bins = kwargs.get('num_bins', 10)
     cyclicity_type = kwargs.get('cyclicity_type', 1)
     stage_type = kwargs.get('stage_type', 'mode')
+    dist_range = kwargs.get('dist_range', None)
+    stages = kwargs.get('stages', None)
+    tlsnp = kwargs.get('tlsnp', None)
     
-    #just to change column name 'phase' to 'subStageID'
-    colnames = tlsdf.columns.to_series()
-    colnames.loc[colnames == 'phase'] = 'subStageID'
-    tlsdf.columns = colnames
-    del colnames
-    #basic meta-data for the following subroutines
-    stages = tlsStages(tlsdf, stageIndices, stageNames, stage_type)
-    tlsnp = tlsNumpy(tlsdf, stages)
+    if stages is None or tlsnp is None:
+        #basic meta-data for the following subroutines
+        #the 'tlsStages' and 'tlsNumpy' phases are recorded by the core functions themselves
+        stages = tlsStages(record, stageIndices, stageNames, stage_type)
+        tlsnp = tlsNumpy(record, stages)
 
-    fig = plt.figure(figsize=(12, 8))
-    gs = gridspec.GridSpec(9, 2)
-    axSplit = fig.add_subplot(gs[0:2,0])
-    axDist = fig.add_subplot(gs[0:2,1])
-    axCyclic = fig.add_subplot(gs[3:6,:])
-    axPlan = fig.add_subplot(gs[6:9,:])
+    with phase('figure'):
+        fig = plt.figure(figsize=(12, 8))
+        axSplit, axDist, axCyclic, axPlan = cluster_axes(fig)
 
     '''
     Notes on the widgets:
@@ -353,18 +591,11 @@ def clusterPlot_TLS(tlsdf, stageIndices, stageNames, **kwargs):
     2. The references to the widget objects have to be kept to prevent the plot from becoming non-responsive
         (keep the return variables from 'universal_widgets' function)
     '''
-    time_slider, button, radio1, radio2 = universal_widgets(tlsnp, axSplit, axDist, axCyclic, axPlan) 
-
-    axPlan.set_title('Signal Plan', fontweight ="bold")
-    plot_signalPlan(axPlan, time_slider, tlsnp, stages)
+    with phase('universal_widgets'):
+        time_slider, button, radio1, radio2 = universal_widgets(tlsnp, axSplit, axDist, axCyclic, axPlan) 
+    #full redraws of the figure (the rendering of all artists) are recorded as a callback
+    fig.canvas.draw = profile_functions.callback('draw', fig.canvas.draw)
 
-    axDist.set_title('Green Duration Distribution', fontweight = 'bold')
-    plot_greenTimeDistribution(axDist, time_slider, tlsnp, stages, num_bins, bar_colours)
-
-    axCyclic.set_title('Cyclicity plot using the {} definition'.format('first' if cyclicity_type == 1 else 'second'), fontweight ='bold')
-    plot_cyclicity(axCyclic, time_slider, tlsnp, stages, cyclicity_type, bar_colours)
-
-    axSplit.set_title('Green Split', fontweight = 'bold')
-    plot_greenTimeSplit(axSplit, time_slider, tlsnp, stages, bar_colours)
+    plot_panels((axSplit, axDist, axCyclic, axPlan), time_slider, tlsnp, stages, num_bins, cyclicity_type, bar_colours, dist_range)
     
-    return time_slider, button, radio1, radio2
\ No newline at end of file
+    return time_slider, button, radio1, radio2
@@ -0,0 +1,193 @@
+'''
+Opt-in instrumentation of the plotting pipeline. It is off unless the environment variable TLS_PROFILE is set
+(or enable() is called, e.g. by clusterPlot_TLS(..., profile = 'summary')) to one of
+    summary[:file.json]  - wall time, call count and peak allocation of every phase, latency histogram of every
+                           widget callback; printed to stderr on exit (and written as JSON to the file)
+    cprofile[:file.prof] - the summary, plus a cProfile of the whole session (default tls_profile.prof)
+    trace[:file.json]    - the summary, plus a Chrome trace-event file of the phases and callbacks
+                           (default tls_trace.json, open it in chrome://tracing or https://ui.perfetto.dev)
+When disabled, phase() returns a shared do-nothing context manager and callback() returns the function itself,
+so the instrumented code runs as it would without it.
+'''
+
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import functools
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+import numpy as np
+
+ENV_VARIABLE = 'TLS_PROFILE'
+_MODES = ('summary', 'cprofile', 'trace')
+_DEFAULT_PATHS = {'summary': None, 'cprofile': 'tls_profile.prof', 'trace': 'tls_trace.json'}
+_LATENCY_BUCKETS_MS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, np.inf]
+_NULL = nullcontext()
+_recorder = None
+
+
+class _Recorder:
+    def __init__(self, mode, path):
+        self.mode = mode
+        self.path = path
+        self.phases = {}    # name -> [calls, seconds, largest peak allocation in bytes]
+        self.latencies = {} # callback name -> [seconds of every call]
+        self.events = []    # (name, category, start, duration, allocation) for the trace
+        self.origin = time.perf_counter()
+        self.profiler = None
+        self.tracing = False
+        if mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif not tracemalloc.is_tracing():
+            #the allocation sizes (not with cProfile, which would time tracemalloc itself)
+            tracemalloc.start()
+            self.tracing = True
+
+    def add_phase(self, name, start, seconds, allocated):
+        calls, total, peak = self.phases.get(name, [0, 0.0, 0])
+        self.phases[name] = [calls + 1, total + seconds, max(peak, allocated)]
+        self.events.append((name, 'phase', start, seconds, allocated))
+
+    def add_latency(self, name, start, seconds):
+        self.latencies.setdefault(name, []).append(seconds)
+        self.events.append((name, 'callback', start, seconds, 0))
+
+    def report(self) -> dict:
+        callbacks = {}
+        for name, latencies in self.latencies.items():
+            ms = 1000*np.asarray(latencies)
+            callbacks[name] = {'calls': len(latencies), 'median_ms': float(np.median(ms)),
+                               'p95_ms': float(np.percentile(ms, 95)), 'max_ms': float(ms.max()),
+                               'histogram_ms': {'edges': [str(edge) for edge in _LATENCY_BUCKETS_MS],
+                                                'counts': np.histogram(ms, _LATENCY_BUCKETS_MS)[0].tolist()}}
+        return {'phases': {name: {'calls': calls, 'seconds': seconds, 'peak_alloc_bytes': peak}
+                           for name, (calls, seconds, peak) in self.phases.items()},
+                'callbacks': callbacks}
+
+
+def _parse(setting: str) -> tuple:
+    mode, _, path = setting.partition(':')
+    mode = mode.strip().lower()
+    if mode in ('1', 'true', 'yes', 'on'):
+        mode = 'summary'
+    if mode not in _MODES:
+        raise ValueError('the value {!r} of {} is invalid (one of {})'.format(setting, ENV_VARIABLE, ', '.join(_MODES)))
+    return mode, path or _DEFAULT_PATHS[mode]
+
+def enabled() -> bool:
+    return _recorder is not None
+
+def enable(setting: str = 'summary'):
+    '''
+    Starts recording ('setting' as in TLS_PROFILE, e.g. 'summary' or 'trace:plot.json'); the results are
+    written on exit. Only the phases run and the widgets created after this call are recorded.
+    '''
+    global _recorder
+    if _recorder is not None:
+        return
+    _recorder = _Recorder(*_parse(setting))
+    atexit.register(dump)
+
+def disable() -> dict:
+    '''
+    Stops recording without writing anything and returns the report (see dump)
+    '''
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is None:
+        return {}
+    if recorder.profiler is not None:
+        recorder.profiler.disable()
+    if recorder.tracing:
+        tracemalloc.stop()
+    return recorder.report()
+
+
+@contextmanager
+def _phase(name):
+    recorder = _recorder
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        allocated = tracemalloc.get_traced_memory()[1] - before if tracing else 0
+        recorder.add_phase(name, start - recorder.origin, seconds, allocated)
+
+def phase(name: str):
+    '''
+    with phase('tlsStages'): ...   records the wall time and the peak allocation of the block
+    (the allocation of nested phases is only exact for the innermost one)
+    '''
+    if _recorder is None:
+        return _NULL
+    return _phase(name)
+
+def callback(name: str, func):
+    '''
+    Returns 'func' recording the latency of every call under 'name' (or 'func' itself when disabled)
+    '''
+    if _recorder is None:
+        return func
+    recorder = _recorder
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            recorder.add_latency(name, start - recorder.origin, time.perf_counter() - start)
+    return timed
+
+
+def _print_summary(report, stream):
+    print('{:<30}{:>7}{:>12}{:>12}{:>17}'.format('phase', 'calls', 'total (s)', 'mean (ms)', 'peak alloc (MB)'), file=stream)
+    for name, measured in report['phases'].items():
+        print('{:<30}{:>7}{:>12.4f}{:>12.2f}{:>17.2f}'.format(name, measured['calls'], measured['seconds'],
+                                                             1000*measured['seconds']/measured['calls'],
+                                                             measured['peak_alloc_bytes']/2**20), file=stream)
+    if report['callbacks']:
+        print('{:<30}{:>7}{:>12}{:>12}{:>12}'.format('callback', 'calls', 'median (ms)', 'p95 (ms)', 'max (ms)'), file=stream)
+    for name, measured in report['callbacks'].items():
+        print('{:<30}{:>7}{:>12.2f}{:>12.2f}{:>12.2f}'.format(name, measured['calls'], measured['median_ms'],
+                                                             measured['p95_ms'], measured['max_ms']), file=stream)
+        edges, counts = measured['histogram_ms']['edges'], measured['histogram_ms']['counts']
+        print('    ' + '  '.join('[{}, {}) ms: {}'.format(edges[i], edges[i+1], count)
+                                 for i, count in enumerate(counts) if count), file=stream)
+
+def dump(stream = sys.stderr) -> dict:
+    '''
+    Stops recording, prints the summary to 'stream' and writes the file of the mode.
+    Called on exit when enabled. Returns the report {'phases': {...}, 'callbacks': {...}}.
+    '''
+    recorder = _recorder
+    if recorder is None:
+        return {}
+    report = disable()
+    _print_summary(report, stream)
+    if recorder.mode == 'summary' and recorder.path:
+        with open(recorder.path, 'w') as f:
+            json.dump(report, f, indent=2)
+    elif recorder.mode == 'cprofile':
+        recorder.profiler.dump_stats(recorder.path)
+    elif recorder.mode == 'trace':
+        events = [{'name': name, 'cat': category, 'ph': 'X', 'ts': 1e6*start, 'dur': 1e6*seconds,
+                   'pid': os.getpid(), 'tid': 0 if category == 'phase' else 1, 'args': {'alloc_bytes': allocated}}
+                  for name, category, start, seconds, allocated in recorder.events]
+        with open(recorder.path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    if recorder.path:
+        print('{} written to {}'.format(recorder.mode, recorder.path), file=stream)
+    return report
+
+
+if os.environ.get(ENV_VARIABLE):
+    enable(os.environ[ENV_VARIABLE])
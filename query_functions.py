@@ -0,0 +1,96 @@
+import numpy as np
+from record_functions import GrowableArray
+
+
+def _binIndex(bins, values) -> np.ndarray:
+    #the bin of every value as in np.histogram (the last bin is closed), -1 outside of the bins
+    numBins = len(bins) - 1
+    binIndex = np.searchsorted(bins, values, side='right') - 1
+    binIndex[values == bins[-1]] = numBins - 1
+    binIndex[(binIndex < 0) | (binIndex >= numBins)] = -1
+    return binIndex
+
+
+class TLSRangeIndex:
+    '''
+    Range queries over the events of tlsnp with t0 < time < t1 (the selection of the time slider).
+    Built once in O(N); afterwards
+        sums(t0, t1)                      - total duration of every column 2: (stages and AmberRed), O(log N)
+        histogram(t0, t1, bins, density)  - green time histogram of every stage column, O(bins x stages x log N)
+    The sums come from cumulative sums per column. For the histograms, the sorted event indices falling into
+    each (stage, bin) are kept, so the count of a bin within the range is a difference of two searchsorted
+    positions (the inverse of a per-bin cumulative count, but with O(N) memory).
+    The last event of tlsnp has no duration yet and is not indexed; extend() indexes the events
+    completed since, e.g. while a record is followed live.
+    '''
+    def __init__(self, tlsnp: np.ndarray):
+        self.time = GrowableArray()
+        self.greens = GrowableArray((tlsnp.shape[1]-3,))
+        self.cumsum = GrowableArray((tlsnp.shape[1]-2,))
+        self.cumsum.extend(np.zeros((1, tlsnp.shape[1]-2)))
+        self._bins = None
+        self._binRows = None
+        self.extend(tlsnp)
+
+    def __len__(self):
+        return len(self.time)
+
+    def extend(self, tlsnp: np.ndarray):
+        '''
+        Indexes the events of tlsnp (the whole, grown array) that are complete and not indexed yet
+        '''
+        new = tlsnp[len(self):tlsnp.shape[0]-1]
+        if new.shape[0] == 0:
+            return
+        last = self.time.data[-1:]
+        assert (np.diff(np.append(last, new[:,0])) >= 0).all(), 'tlsnp must be sorted by time'
+        start = len(self)
+        self.time.extend(new[:,0])
+        self.greens.extend(new[:,2:-1])
+        self.cumsum.extend(self.cumsum.data[-1] + np.cumsum(np.nan_to_num(new[:,2:]), axis=0))
+        if self._bins is not None:
+            self._addBinRows(new[:,2:-1], start)
+
+    def rows(self, t0, t1):
+        '''
+        Returns (lo, hi) such that tlsnp[lo:hi] are the indexed events with t0 < time < t1
+        '''
+        lo = np.searchsorted(self.time.data, t0, side='right')
+        hi = np.searchsorted(self.time.data, t1, side='left')
+        return lo, max(lo, hi)
+
+    def sums(self, t0, t1) -> np.ndarray:
+        lo, hi = self.rows(t0, t1)
+        return self.cumsum.data[hi] - self.cumsum.data[lo]
+
+    def _addBinRows(self, greens, start):
+        numBins = len(self._bins) - 1
+        rows, stage = np.nonzero(~np.isnan(greens))
+        values = greens[rows, stage]
+        binIndex = _binIndex(self._bins, values)
+        inRange = binIndex >= 0
+        keys = stage[inRange]*numBins + binIndex[inRange]
+        rows = rows[inRange] + start
+        order = np.argsort(keys, kind='stable')
+        bounds = np.searchsorted(keys[order], np.arange(len(self._binRows) + 1))
+        for k, binRows in enumerate(self._binRows):
+            binRows.extend(rows[order[bounds[k]:bounds[k+1]]])
+
+    def histogram(self, t0, t1, bins, density: bool = False) -> np.ndarray:
+        '''
+        Returns a (stage x bin) array equal to np.histogram(green times of the stage in the range, bins, density)
+        '''
+        bins = np.asarray(bins, dtype=np.float64)
+        numBins = len(bins) - 1
+        numStages = self.greens.data.shape[1]
+        if self._bins is None or not np.array_equal(self._bins, bins):
+            self._bins = bins
+            self._binRows = [GrowableArray(dtype=np.int64) for _ in range(numStages*numBins)]
+            self._addBinRows(self.greens.data, 0)
+        lo, hi = self.rows(t0, t1)
+        counts = np.array([np.searchsorted(binRows.data, hi) - np.searchsorted(binRows.data, lo)
+                           for binRows in self._binRows]).reshape(numStages, numBins)
+        if not density:
+            return counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return counts / counts.sum(axis=1, keepdims=True) / np.diff(bins)
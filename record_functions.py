@@ -0,0 +1,274 @@
+import gzip
+import xml.etree.ElementTree as ET
+from array import array
+import numpy as np
+import pandas as pd
+from profile_functions import phase
+
+
+class TLSRecord:
+    '''
+    Columnar signal indications of one traffic light (one SUMO 'id') from a tlsrecord file.
+        time       - float64 array of the simulation time of each tlsState
+        phase      - array of the SUMO phase index (the subStageID in plot_functions)
+        program    - array of codes into 'programIDs'
+        stateCode  - array of codes into 'states', i.e. rows of 'stateTable'
+        stateTable - uint8 (state x link) matrix of the indicators of 'states' (see encode_states)
+    The repeated 'state' and 'programID' strings are kept only once in 'states' and 'programIDs', and the
+    phase and code columns use the smallest unsigned integer type that fits (see compact_codes), so an event
+    takes about 11 bytes (8 of them for the time) instead of a row of Python strings.
+    '''
+    __slots__ = ('tlsID', 'time', 'phase', 'program', 'programIDs', 'stateCode', 'states', '_stateTable')
+
+    def __init__(self, tlsID, time, phase, program, programIDs, stateCode, states, stateTable = None):
+        self.tlsID = tlsID
+        self.time = time
+        self.phase = phase
+        self.program = program
+        self.programIDs = programIDs
+        self.stateCode = stateCode
+        self.states = states
+        self._stateTable = stateTable
+
+    @classmethod
+    def from_frame(cls, tlsdf: pd.DataFrame, tlsID = None):
+        '''
+        The compact record of a DataFrame in the layout of pd.read_xml on a single-TLS tlsrecord
+        (time, id, programID, phase, state), where 'phase' may already be renamed 'subStageID'
+        '''
+        if tlsID is None and 'id' in tlsdf and len(tlsdf) > 0:
+            tlsID = tlsdf['id'].iloc[0]
+        stateCode, states = pd.factorize(tlsdf['state'])
+        program, programIDs = pd.factorize(tlsdf['programID'] if 'programID' in tlsdf else pd.Series('', index=tlsdf.index))
+        phase = tlsdf['subStageID' if 'subStageID' in tlsdf else 'phase'].to_numpy()
+        return cls(tlsID,
+                   tlsdf['time'].to_numpy(dtype=np.float64),
+                   compact_codes(phase),
+                   compact_codes(program, len(programIDs)),
+                   list(programIDs),
+                   compact_codes(stateCode, len(states)),
+                   list(states))
+
+    def __len__(self):
+        return self.time.shape[0]
+
+    def __getitem__(self, rows: slice):
+        #the events 'rows' as a TLSRecord (the columns are views, the dictionaries are shared)
+        return TLSRecord(self.tlsID, self.time[rows], self.phase[rows], self.program[rows],
+                         self.programIDs, self.stateCode[rows], self.states, self._stateTable)
+
+    def __repr__(self):
+        return 'TLSRecord(id={!r}, events={}, states={})'.format(self.tlsID, len(self), len(self.states))
+
+    @property
+    def stateTable(self) -> np.ndarray:
+        if self._stateTable is None or self._stateTable.shape[0] != len(self.states):
+            self._stateTable = encode_states(self.states)
+        return self._stateTable
+
+    @property
+    def state(self) -> np.ndarray:
+        return np.asarray(self.states, dtype=object)[self.stateCode]
+
+    @property
+    def programID(self) -> np.ndarray:
+        return np.asarray(self.programIDs, dtype=object)[self.program]
+
+    def nbytes(self) -> int:
+        #memory of the columns and the state table (the dictionaries of strings not included)
+        return sum(column.nbytes for column in (self.time, self.phase, self.program, self.stateCode, self.stateTable))
+
+    def to_frame(self) -> pd.DataFrame:
+        '''
+        The same layout as pd.read_xml on a single-TLS tlsrecord (time, id, programID, phase, state).
+        '''
+        return pd.DataFrame({'time': self.time,
+                             'id': self.tlsID,
+                             'programID': self.programID,
+                             'phase': self.phase,
+                             'state': self.state})
+
+
+def compact_codes(codes, numCodes: int = None) -> np.ndarray:
+    '''
+    Returns the non-negative integer array 'codes' in the smallest unsigned type holding 0 .. numCodes-1
+    (default: its largest value), e.g. uint8 for up to 256 states. Negative codes keep their type.
+    '''
+    codes = np.asarray(codes)
+    if codes.size and codes.min() < 0:
+        return codes
+    largest = (numCodes - 1) if numCodes is not None else (int(codes.max()) if codes.size else 0)
+    return codes.astype(np.min_scalar_type(max(largest, 0)), copy=False)
+
+
+class _RecordBuffer:
+    #growable per-TLS columns while the file is being streamed
+    def __init__(self):
+        self.time = array('d')
+        self.phase = array('i')
+        self.program = array('i')
+        self.stateCode = array('i')
+        self.programIDs = {}
+        self.states = {}
+
+    def append(self, attrib):
+        programID = attrib.get('programID', '')
+        state = attrib['state']
+        self.time.append(float(attrib['time']))
+        self.phase.append(int(attrib['phase']))
+        self.program.append(self.programIDs.setdefault(programID, len(self.programIDs)))
+        self.stateCode.append(self.states.setdefault(state, len(self.states)))
+
+    def freeze(self, tlsID) -> TLSRecord:
+        return TLSRecord(tlsID,
+                         np.frombuffer(self.time, dtype=np.float64),
+                         compact_codes(np.frombuffer(self.phase, dtype=np.int32)),
+                         compact_codes(np.frombuffer(self.program, dtype=np.int32), len(self.programIDs)),
+                         list(self.programIDs),
+                         compact_codes(np.frombuffer(self.stateCode, dtype=np.int32), len(self.states)),
+                         list(self.states))
+
+
+class GrowableArray:
+    '''
+    numpy buffer of rows appended over time. The capacity doubles whenever it is full,
+    so appending is amortized O(1) per row and 'data' is a view of the filled rows without a copy.
+    (A view taken before an 'extend' may point to the old buffer: take 'data' again afterwards.)
+    '''
+    def __init__(self, rowShape: tuple = (), dtype = np.float64, capacity: int = 1024):
+        self._buffer = np.empty((capacity,) + tuple(rowShape), dtype=dtype)
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def data(self) -> np.ndarray:
+        return self._buffer[:self._n]
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=self._buffer.dtype)
+        n = self._n + rows.shape[0]
+        if n > self._buffer.shape[0]:
+            grown = np.empty((max(n, 2*self._buffer.shape[0]),) + self._buffer.shape[1:], dtype=self._buffer.dtype)
+            grown[:self._n] = self._buffer[:self._n]
+            self._buffer = grown
+        self._buffer[self._n:n] = rows
+        self._n = n
+
+    def truncate(self, n: int):
+        #drops the rows from the 'n'-th on
+        self._n = min(max(n, 0), self._n)
+
+    def discard(self, n: int):
+        #drops the first 'n' rows, the others are moved to the front
+        n = min(n, self._n)
+        self._buffer[:self._n - n] = self._buffer[n:self._n]
+        self._n -= n
+
+
+class TLSRecordTail:
+    '''
+    Follows a tlsrecord file of one TLS 'id' while it is still being written (e.g. by a running SUMO).
+    poll() parses only the bytes appended since the previous call (an unfinished element waits for the
+    next call) and returns the number of new tlsState events; 'record' is a TLSRecord of all events so far.
+    'finished' becomes True once the closing tag of the file has been read.
+    The columns are GrowableArrays, so following a long run costs amortized O(1) per event.
+    '''
+    def __init__(self, path, tlsID):
+        self.path = path
+        self.tlsID = tlsID
+        self._offset = 0
+        self._root = None
+        self.finished = False
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self.time = GrowableArray()
+        self.phase = GrowableArray(dtype=np.int32)
+        self.program = GrowableArray(dtype=np.int32)
+        self.stateCode = GrowableArray(dtype=np.int32)
+        self.programIDs = {}
+        self.states = {}
+
+    def __len__(self):
+        return len(self.time)
+
+    def poll(self) -> int:
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        if not chunk:
+            return 0
+        self._offset += len(chunk)
+        self._parser.feed(chunk)
+        new = _RecordBuffer()
+        new.programIDs, new.states = self.programIDs, self.states
+        for event, elem in self._parser.read_events():
+            if self._root is None:
+                self._root = elem
+            if event == 'end' and elem is self._root:
+                self.finished = True
+            if event != 'end' or elem.tag != 'tlsState':
+                continue
+            if elem.get('id') == self.tlsID:
+                new.append(elem.attrib)
+            elem.clear()
+            self._root.clear()
+        self.time.extend(new.time)
+        self.phase.extend(new.phase)
+        self.program.extend(new.program)
+        self.stateCode.extend(new.stateCode)
+        return len(new.time)
+
+    def discard(self, n: int):
+        #forgets the first 'n' events (e.g. the ones already processed), so the memory stays bounded
+        for column in (self.time, self.phase, self.program, self.stateCode):
+            column.discard(n)
+
+    @property
+    def record(self) -> TLSRecord:
+        return TLSRecord(self.tlsID, self.time.data, self.phase.data, self.program.data,
+                         list(self.programIDs), self.stateCode.data, list(self.states))
+
+
+def encode_states(states) -> np.ndarray:
+    '''
+    Encodes equal-length SUMO state strings as a uint8 (state x link) matrix of their ASCII codes,
+    e.g. ['gGr', 'yyr'] -> [[103, 71, 114], [121, 121, 114]]
+    '''
+    states = list(states)
+    numLinks = len(states[0]) if states else 0
+    assert all(len(state) == numLinks for state in states), 'state strings of different lengths'
+    return np.frombuffer(''.join(states).encode('ascii'), dtype=np.uint8).reshape(len(states), numLinks)
+
+
+def _open_record(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def read_tlsrecord(path, tls_ids = None) -> dict:
+    '''
+    Reads a SUMO tlsrecord (tlsStates) file in a single streaming pass and splits it by the TLS 'id'.
+    Returns {id: TLSRecord} in the order the ids first appear in the file.
+    'tls_ids' optionally restricts the output to the given ids; the other tlsState elements are skipped.
+    Each element is discarded as soon as it is read, so the memory use is that of the compact
+    columns only, however large the XML file is (gzipped files are also accepted).
+    '''
+    with phase('parse'):
+        wanted = None if tls_ids is None else set(tls_ids)
+        buffers = {}
+        with _open_record(path) as f:
+            context = ET.iterparse(f, events=('start', 'end'))
+            _, root = next(context)
+            for event, elem in context:
+                if event != 'end' or elem.tag != 'tlsState':
+                    continue
+                tlsID = elem.get('id')
+                if wanted is None or tlsID in wanted:
+                    if tlsID not in buffers:
+                        buffers[tlsID] = _RecordBuffer()
+                    buffers[tlsID].append(elem.attrib)
+                elem.clear()
+                root.clear()
+        return {tlsID: buffer.freeze(tlsID) for tlsID, buffer in buffers.items()}
@@ -0,0 +1,199 @@
+import os
+import re
+import glob
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from cycle_functions import cycleTable
+from cache_functions import CACHE_DIR, load_tlsnp
+from record_functions import _open_record
+
+_SEED = re.compile(rb'<seed\s+value="([^"]*)"')
+
+
+def record_seed(path):
+    '''
+    The random seed of the SUMO configuration embedded in the header comment of a tlsrecord
+    (<seed value="100"/>), or None. Only the header before <tlsStates> is read.
+    '''
+    header = b''
+    with _open_record(path) as f:
+        while b'<tlsStates' not in header:
+            chunk = f.read(1 << 16)
+            if not chunk:
+                break
+            header += chunk
+    match = _SEED.search(header.split(b'<tlsStates')[0])
+    return match.group(1).decode() if match else None
+
+def _tQuantile(p, df):
+    #Student t quantile: the closed forms for df 1 and 2, from the normal one for df >= 3 (Cornish-Fisher expansion,
+    #within 5e-3 of the exact value at df 3 and 1e-3 from df 4 on), NaN below df 1
+    z = NormalDist().inv_cdf(p)
+    df = np.asarray(df, dtype=np.float64)
+    safe = np.maximum(df, 1)
+    expansion = (z + (z**3 + z)/(4*safe) + (5*z**5 + 16*z**3 + 3*z)/(96*safe**2)
+                 + (3*z**7 + 19*z**5 + 17*z**3 - 15*z)/(384*safe**3)
+                 + (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z)/(92160*safe**4))
+    return np.where(df < 1, np.nan, np.where(df == 1, np.tan(np.pi*(p - 0.5)),
+                    np.where(df == 2, (2*p - 1)/np.sqrt(2*p*(1 - p)), expansion)))
+
+
+class Moments:
+    '''
+    Count, mean and sum of squared deviations of arrays of the shape 'shape', element by element (NaN skipped).
+    add() takes a batch of rows and merge() another Moments (Chan et al.), so partial results of any split of
+    the data combine to the same values as one pass over all of it.
+    '''
+    def __init__(self, shape = ()):
+        self.n = np.zeros(shape)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).reshape((-1,) + self.n.shape)
+        other = Moments(self.n.shape)
+        valid = ~np.isnan(values)
+        other.n = valid.sum(axis=0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            other.mean = np.nan_to_num(np.where(valid, values, 0).sum(axis=0) / other.n)
+        other.m2 = np.where(valid, (values - other.mean)**2, 0).sum(axis=0)
+        return self.merge(other)
+
+    def merge(self, other):
+        n = self.n + other.n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = other.mean - self.mean
+            self.mean = np.nan_to_num(self.mean + delta*other.n/n)
+            self.m2 = self.m2 + other.m2 + np.nan_to_num(delta**2*self.n*other.n/n)
+        self.n = n
+        return self
+
+    @property
+    def variance(self) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.n > 1, self.m2 / (self.n - 1), np.nan)
+
+    def interval(self, confidence = 0.95) -> np.ndarray:
+        #half-width of the Student t confidence interval of the mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return _tQuantile(0.5 + confidence/2, self.n - 1) * np.sqrt(self.variance / self.n)
+
+
+class ReplicationStats:
+    '''
+    Mergeable statistics of the replications (seeds) of one scenario and TLS:
+        histogram  - pooled counts of the green times of every stage in 'bins' (stage x bin)
+        seedHist   - Moments of the per-replication counts (the replications vary around their mean)
+        split      - Moments of the per-replication green split (stages + yellow & red, fractions of the run)
+        cycles     - Moments of the per-cycle statistics pooled over all quasi-cycles (see cycleStats)
+        seedCycles - Moments of the per-replication means of the per-cycle statistics
+    add() takes the tlsnp of one replication and merge() the statistics of other replications, so the events of
+    the replications are never held together. The confidence intervals are those of the mean over the replications.
+    '''
+    def __init__(self, stageNames: list, bins, cyclicity: int = 1):
+        self.stageNames = list(stageNames)
+        self.bins = np.asarray(bins, dtype=np.float64)
+        self.cyclicity = cyclicity
+        numStages, numBins = len(self.stageNames), len(self.bins) - 1
+        self.cycleColumns = ['length'] + ['{} green'.format(name) for name in self.stageNames] + ['yellow & red']
+        self.seeds = []
+        self.histogram = np.zeros((numStages, numBins))
+        self.seedHist = Moments((numStages, numBins))
+        self.split = Moments((numStages + 1,))
+        self.cycles = Moments((len(self.cycleColumns),))
+        self.seedCycles = Moments((len(self.cycleColumns),))
+
+    def add(self, tlsnp: np.ndarray, stages: pd.DataFrame, seed = None):
+        assert list(stages.columns) == self.stageNames, 'the stages of the replication differ'
+        greens = tlsnp[:-1, 2:2+len(self.stageNames)]
+        counts = np.array([np.histogram(greens[~np.isnan(greens[:,j]), j], self.bins)[0]
+                           for j in range(greens.shape[1])], dtype=np.float64).reshape(self.histogram.shape)
+        self.histogram += counts
+        self.seedHist.add(counts[None])
+        totals = np.nan_to_num(tlsnp[:-1, 2:]).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.split.add((totals / totals.sum())[None])
+        table = cycleTable(tlsnp, stages, self.cyclicity)
+        complete = table.loc[table['complete'], self.cycleColumns].to_numpy(dtype=np.float64)
+        self.cycles.add(complete)
+        if complete.shape[0] > 0:
+            self.seedCycles.add(complete.mean(axis=0)[None])
+        self.seeds.append(seed)
+        return self
+
+    def merge(self, other):
+        assert other.stageNames == self.stageNames and np.array_equal(other.bins, self.bins) \
+            and other.cyclicity == self.cyclicity, 'the statistics are not of the same scenario'
+        self.histogram += other.histogram
+        self.seedHist.merge(other.seedHist)
+        self.split.merge(other.split)
+        self.cycles.merge(other.cycles)
+        self.seedCycles.merge(other.seedCycles)
+        self.seeds += other.seeds
+        return self
+
+    def summary(self, confidence = 0.95) -> dict:
+        '''
+        DataFrames of the mean over the replications and its confidence interval ('low', 'high'):
+            'distribution' - counts per replication of every stage (rows) and bin (columns: bin left edges)
+            'split'        - green split of every stage and yellow & red
+            'cycle'        - mean per-cycle length, stage green and yellow & red (only complete cycles),
+                             with the pooled standard deviation over all cycles ('cycle_std')
+        '''
+        def frame(moments, index):
+            halfWidth = moments.interval(confidence)
+            return pd.DataFrame({'mean': moments.mean, 'low': moments.mean - halfWidth,
+                                 'high': moments.mean + halfWidth, 'replications': moments.n}, index = index)
+        distribution = {key: pd.DataFrame(values, index = self.stageNames, columns = self.bins[:-1])
+                        for key, values in (('mean', self.seedHist.mean),
+                                            ('halfwidth', self.seedHist.interval(confidence)))}
+        cycle = frame(self.seedCycles, self.cycleColumns)
+        cycle['cycle_std'] = np.sqrt(self.cycles.variance)
+        cycle['cycles'] = self.cycles.n
+        return {'distribution': distribution,
+                'split': frame(self.split, self.stageNames + ['Yellow & red']),
+                'cycle': cycle}
+
+
+def _replication_job(job):
+    path, tlsID, stageIndices, stageNames, bins, cyclicity, stage_type, cache_dir = job
+    _, stages, tlsnp = load_tlsnp(path, tlsID, stageIndices, stageNames, stage_type, cache_dir)
+    return ReplicationStats(stageNames, bins, cyclicity).add(tlsnp, stages, record_seed(path) or os.path.basename(path))
+
+def aggregate_replications(source, tlsID, stageIndices: list, stageNames: list, **kwargs) -> ReplicationStats:
+    '''
+    ReplicationStats of the replications of a scenario: 'source' is a directory of tlsrecord files
+    (*.xml, *.xml.gz) or a list of them. Every file is read and reduced to its statistics in a process pool
+    (all cores by default), so only one record per worker is in memory, and the statistics are merged in the order
+    of the files, so the result (the order of 'seeds' and the last bits of the means) does not depend on the pool.
+    The optional keyword arguments are 'num_bins' and 'dist_range' (the bins of the distribution, default 10 in
+    (0, 120) s, fixed so that the replications can be merged), 'cyclicity_type', 'stage_type', 'cache_dir'
+    (see cache_functions.load_tlsnp) and 'processes'.
+    '''
+    num_bins = kwargs.get('num_bins', 10)
+    dist_range = kwargs.get('dist_range', (0, 120))
+    cyclicity_type = kwargs.get('cyclicity_type', 1)
+    stage_type = kwargs.get('stage_type', 'mode')
+    cache_dir = kwargs.get('cache_dir', CACHE_DIR)
+    processes = kwargs.get('processes', None)
+
+    if isinstance(source, str):
+        paths = sorted(glob.glob(os.path.join(source, '*.xml')) + glob.glob(os.path.join(source, '*.xml.gz')))
+    else:
+        paths = list(source)
+    if not paths:
+        raise FileNotFoundError('no tlsrecord files in {}'.format(source))
+    bins = np.linspace(dist_range[0], dist_range[1], num_bins + 1)
+    jobs = [(path, tlsID, stageIndices, stageNames, bins, cyclicity_type, stage_type, cache_dir) for path in paths]
+
+    stats = ReplicationStats(stageNames, bins, cyclicity_type)
+    if processes == 1:
+        for job in jobs:
+            stats.merge(_replication_job(job))
+        return stats
+    with ProcessPoolExecutor(max_workers = processes) as pool:
+        for result in pool.map(_replication_job, jobs):
+            stats.merge(result)
+    return stats
@@ -0,0 +1,68 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from plot_functions import cluster_axes, plot_panels, update_panels
+from query_functions import TLSRangeIndex
+from cache_functions import CACHE_DIR, load_tlsnp
+
+#stands in for the RangeSlider: the plot functions only read its 'val'
+FixedRange = namedtuple('FixedRange', ['val'])
+
+
+def render_report(path, tlsID, stageIndices: list, stageNames: list, windows: list,
+                  out_dir: str = '.', formats = ('png',), **kwargs) -> list:
+    '''
+    Renders the four panels of clusterPlot_TLS (split, distribution, cyclicity, plan) without widgets,
+    once for every time window (t0, t1) in 'windows', and saves them as
+        out_dir/<file name>_<tlsID>_<t0>-<t1>.<format>   for every format in 'formats' (png, svg, pdf, ...)
+    The figure is built once and only re-ranged between the windows. No pyplot state is used,
+    so this runs in worker processes without a display.
+    The optional keyword arguments are those of clusterPlot_TLS (bar_colours, num_bins, cyclicity_type, stage_type),
+    plus 'dpi' and 'cache_dir'.
+    Returns the written file paths.
+    '''
+    stage_type = kwargs.get('stage_type', 'mode')
+    num_bins = kwargs.get('num_bins', 10)
+    cyclicity_type = kwargs.get('cyclicity_type', 1)
+    bar_colours = list(kwargs.get('bar_colours', ['C{}'.format(i) for i in range(len(stageNames))]))
+    dpi = kwargs.get('dpi', 100)
+    cache_dir = kwargs.get('cache_dir', CACHE_DIR)
+
+    _, stages, tlsnp = load_tlsnp(path, tlsID, stageIndices, stageNames, stage_type, cache_dir)
+
+    fig = Figure(figsize=(12, 8))
+    FigureCanvasAgg(fig)
+    axes = cluster_axes(fig)
+    plot_panels(axes, FixedRange(tuple(windows[0])), tlsnp, stages, num_bins, cyclicity_type, bar_colours)
+    index = TLSRangeIndex(tlsnp)
+
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    written = []
+    for t0, t1 in windows:
+        update_panels(t0, t1, index, *axes)
+        for fmt in formats:
+            file = os.path.join(out_dir, '{}_{}_{:g}-{:g}.{}'.format(stem, tlsID, t0, t1, fmt))
+            fig.savefig(file, dpi = dpi)
+            written.append(file)
+    return written
+
+
+def _render_job(job):
+    return render_report(**job)
+
+def render_reports(jobs: list, processes: int = None) -> list:
+    '''
+    Renders many reports in a process pool (all cores by default).
+    Each job is a dict of the arguments of render_report, e.g.
+        {'path': './data/tlsrecord7_dt0.xml', 'tlsID': 'J',
+         'stageIndices': [0,0,0,1,1,1,0,0,0,1,1,1,1,0,1,0], 'stageNames': ['North-South','West-East'],
+         'windows': [(0, 180), (0, 3600)], 'out_dir': './report', 'formats': ('png', 'pdf')}
+    Returns the written file paths of every job, in the order of 'jobs'.
+    '''
+    if processes == 1:
+        return [_render_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers = processes) as pool:
+        return list(pool.map(_render_job, jobs))
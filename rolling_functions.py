@@ -0,0 +1,163 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+from cycle_functions import cycleStarts
+from query_functions import _binIndex
+
+
+class RingBuffer:
+    '''
+    First-in first-out numpy rows in a circular buffer. Appending and dropping the oldest rows do not move
+    the other rows; the capacity only doubles when the buffer is full, so it stays at the size of the
+    largest content (e.g. the largest rolling window) however many rows pass through.
+    '''
+    def __init__(self, rowShape: tuple = (), dtype = np.float64, capacity: int = 1024):
+        self._buffer = np.empty((capacity,) + tuple(rowShape), dtype=dtype)
+        self._head = 0
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def capacity(self) -> int:
+        return self._buffer.shape[0]
+
+    def segments(self) -> tuple:
+        #the content as (older, newer) views, without a copy
+        end = self._head + self._n
+        if end <= self.capacity:
+            return self._buffer[self._head:end], self._buffer[:0]
+        return self._buffer[self._head:], self._buffer[:end - self.capacity]
+
+    def rows(self, start: int = 0) -> np.ndarray:
+        #an ordered copy of the rows from the 'start'-th oldest on
+        older, newer = self.segments()
+        return np.concatenate([older[start:], newer[max(start - older.shape[0], 0):]])
+
+    def append(self, rows):
+        rows = np.asarray(rows, dtype=self._buffer.dtype)
+        if self._n + rows.shape[0] > self.capacity:
+            grown = np.empty((max(self._n + rows.shape[0], 2*self.capacity),) + self._buffer.shape[1:], dtype=self._buffer.dtype)
+            grown[:self._n] = self.rows()
+            self._buffer, self._head = grown, 0
+        positions = (self._head + self._n + np.arange(rows.shape[0])) % self.capacity
+        self._buffer[positions] = rows
+        self._n += rows.shape[0]
+
+    def popleft(self, n: int) -> np.ndarray:
+        #removes and returns the 'n' oldest rows
+        n = min(n, self._n)
+        popped = self._buffer[(self._head + np.arange(n)) % self.capacity]
+        self._head = (self._head + n) % self.capacity
+        self._n -= n
+        return popped
+
+
+class RollingTLS:
+    '''
+    The green time distribution and green split of the last 'window' seconds (unit = 'seconds') or the
+    last 'window' quasi-cycles, the open one included (unit = 'cycles', see cycle_functions.cycleStarts),
+    of a stream of tlsnp rows (see plot_functions.tlsNumpy).
+    push() takes complete rows (with their durations) and drops the rows that left the window, so the
+    memory is bounded by the window however long the simulation runs. The histogram counts of 'bins'
+    and the duration sums are updated with the pushed and dropped rows only.
+    histogram() and sums() answer like query_functions.TLSRangeIndex, so the window can stand in for the
+    index of the time slider (plot_functions.update_panels): a range covering the whole window
+    (t0 < its first event, t1 > its last event) with the given 'bins' is answered in O(bins x stages),
+    any other range from the rows in the window.
+    '''
+    def __init__(self, stages: pd.DataFrame, window: float, unit: str = 'seconds',
+                 bins = np.linspace(0, 120, 11), cyclicity: int = 1):
+        if unit not in ('seconds', 'cycles'):
+            raise ValueError('the input value for \'unit\' is invalid')
+        self.stages = stages
+        self.window = window
+        self.unit = unit
+        self.bins = np.asarray(bins, dtype=np.float64)
+        self.cyclicity = cyclicity
+        numStages = len(stages.columns)
+        self.events = RingBuffer((2 + numStages + 1,))
+        self.counts = np.zeros((numStages, len(self.bins) - 1), dtype=np.int64)
+        self.totals = np.zeros(numStages + 1)
+        self.end = np.nan
+        self._first = 0             # event number of the oldest row in the window
+        self._starts = deque([0])   # event numbers of the quasi-cycle starts in the window
+        self._dropped = 0
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def tlsnp(self) -> np.ndarray:
+        #the window in the layout of tlsNumpy, closed by a row at the end time of the last event
+        closing = np.full((1, self.events._buffer.shape[1]), np.nan)
+        closing[0,0] = self.end
+        return np.concatenate([self.events.rows(), closing])
+
+    def _count(self, rows, sign):
+        greens = rows[:,2:-1]
+        stageRows, stage = np.nonzero(~np.isnan(greens))
+        binIndex = _binIndex(self.bins, greens[stageRows, stage])
+        inRange = binIndex >= 0
+        np.add.at(self.counts, (stage[inRange], binIndex[inRange]), sign)
+        self.totals += sign*np.nansum(rows[:,2:], axis=0)
+
+    def push(self, rows: np.ndarray):
+        if rows.shape[0] == 0:
+            return
+        self.events.append(rows)
+        self._count(rows, 1)
+        self.end = rows[-1,0] + np.nanmax(rows[-1,2:])
+        if self.unit == 'seconds':
+            #the window holds the events starting within the last 'window' seconds
+            older, newer = self.events.segments()
+            cutoff = self.end - self.window
+            self._drop(np.searchsorted(older[:,0], cutoff) + np.searchsorted(newer[:,0], cutoff))
+        else:
+            #the open quasi-cycle is segmented again from its start (tlsnp rows closed by a dummy event)
+            openRows = self.events.rows(self._starts[-1] - self._first)
+            openRows = np.concatenate([openRows, np.full((1, openRows.shape[1]), np.nan)])
+            self._starts.extend(self._starts[-1] + cycleStarts(openRows, self.stages, self.cyclicity)[1:])
+            while len(self._starts) > self.window:
+                self._starts.popleft()
+            self._drop(self._starts[0] - self._first)
+
+    def _drop(self, n):
+        if n <= 0:
+            return
+        self._count(self.events.popleft(n), -1)
+        self._first += n
+        self._dropped += n
+        if self._dropped >= self.events.capacity:
+            #the sums are taken again from the rows now and then, so rounding errors cannot accumulate
+            self.totals = np.nansum(self.events.rows()[:,2:], axis=0)
+            self._dropped = 0
+
+    def _covers(self, t0, t1) -> bool:
+        older, newer = self.events.segments()
+        if len(self) == 0:
+            return True
+        return t0 < older[0,0] and t1 > (newer if newer.shape[0] else older)[-1,0]
+
+    def _selected(self, t0, t1) -> np.ndarray:
+        rows = self.events.rows()
+        return rows[(t0 < rows[:,0]) & (rows[:,0] < t1)]
+
+    def sums(self, t0, t1) -> np.ndarray:
+        if self._covers(t0, t1):
+            return self.totals.copy()
+        return np.nansum(self._selected(t0, t1)[:,2:], axis=0)
+
+    def histogram(self, t0, t1, bins, density: bool = False) -> np.ndarray:
+        bins = np.asarray(bins, dtype=np.float64)
+        if np.array_equal(bins, self.bins) and self._covers(t0, t1):
+            counts = self.counts.copy()
+        else:
+            greens = self._selected(t0, t1)[:,2:-1]
+            counts = np.array([np.histogram(greens[~np.isnan(greens[:,col]), col], bins)[0]
+                               for col in range(greens.shape[1])]).reshape(greens.shape[1], len(bins) - 1)
+        if not density:
+            return counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return counts / counts.sum(axis=1, keepdims=True) / np.diff(bins)
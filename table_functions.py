@@ -0,0 +1,56 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from cycle_functions import cycleTable
+from cache_functions import CACHE_DIR, load_tlsnp
+
+
+def write_table(table: pd.DataFrame, path: str):
+    '''
+    Writes 'table' to 'path' as Parquet (.parquet, needs pyarrow or fastparquet) or CSV (any other extension,
+    gzipped for .csv.gz). The index (e.g. 'cycle') is written as a column.
+    '''
+    if path.endswith('.parquet'):
+        table.to_parquet(path)
+    else:
+        table.to_csv(path)
+    return path
+
+def record_cycle_table(path, tlsID, stageIndices: list, stageNames: list, **kwargs) -> pd.DataFrame:
+    '''
+    cycle_functions.cycleTable of one TLS of a tlsrecord file, with the columns 'record' (file name), 'tls'
+    and 'cyclicity' in front. The optional keyword arguments are 'cyclicity_type' (1 or 2, default 1), 'stage_type' and 'cache_dir'
+    (the parsed record and tlsnp come from cache_functions.load_tlsnp).
+    '''
+    _, stages, tlsnp = load_tlsnp(path, tlsID, stageIndices, stageNames, kwargs.get('stage_type', 'mode'),
+                                  kwargs.get('cache_dir', CACHE_DIR))
+    cyclicity_type = kwargs.get('cyclicity_type', 1)
+    table = cycleTable(tlsnp, stages, cyclicity_type).reset_index()
+    table.insert(0, 'cyclicity', cyclicity_type)
+    table.insert(0, 'tls', tlsID)
+    table.insert(0, 'record', os.path.basename(path))
+    return table
+
+
+def _table_job(job):
+    return record_cycle_table(**job)
+
+def cycle_tables(jobs: list, out_path: str = None, processes: int = None) -> pd.DataFrame:
+    '''
+    The per-cycle tables of many records in a process pool (all cores by default), concatenated in the order
+    of 'jobs' and optionally written to 'out_path' (see write_table). Each job is a dict of the arguments of
+    record_cycle_table, e.g.
+        {'path': './data/tlsrecord7_dt0.xml', 'tlsID': 'J',
+         'stageIndices': [0,0,0,1,1,1,0,0,0,1,1,1,1,0,1,0], 'stageNames': ['North-South','West-East'],
+         'cyclicity_type': 2}
+    The stage names of the jobs may differ; the columns of stages missing from a record are then empty.
+    '''
+    if processes == 1:
+        tables = [_table_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers = processes) as pool:
+            tables = list(pool.map(_table_job, jobs))
+    table = pd.concat(tables, ignore_index = True)
+    if out_path is not None:
+        write_table(table, out_path)
+    return table
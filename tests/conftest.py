@@ -0,0 +1,40 @@
+'''
+Shared fixtures of the regression tests (python -m pytest from the repository root).
+Every rewritten algorithm is compared with a plain reference implementation on the bundled example records
+and on small hand-made records for the edge cases.
+'''
+import os
+import sys
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT) #the modules are flat files at the repository root
+
+from record_functions import TLSRecord, read_tlsrecord
+
+#(file, TLS id, stageIndices); None groups the links of the TLS alternately into two stages
+EXAMPLES = [('data/tlsrecord7_dt0.xml', 'J', [0,0,0,1,1,1,0,0,0,1,1,1,1,0,1,0]),
+            ('offset_sumo/J1tlsrecord.xml', 'J1', None),
+            ('offset_sumo/J3tlsrecord.xml', 'J3', None),
+            ('offset_sumo/TLSrecord.xml', 'J', None),
+            ('offset_sumo/TLSrecord1.xml', '0', None)]
+STAGE_NAMES = ['North-South', 'West-East']
+
+
+def make_record(times, phases, states, tlsID = 'T') -> TLSRecord:
+    #a TLSRecord of hand-made events
+    return TLSRecord.from_frame(pd.DataFrame({'time': [float(t) for t in times], 'id': tlsID, 'programID': '0',
+                                              'phase': phases, 'state': states}))
+
+
+@pytest.fixture(params = EXAMPLES, ids = lambda example: '{}:{}'.format(os.path.basename(example[0]), example[1]))
+def example(request):
+    '''
+    (record, stageIndices, stageNames) of one TLS of a bundled example record
+    '''
+    path, tlsID, stageIndices = request.param
+    record = read_tlsrecord(os.path.join(ROOT, path), [tlsID])[tlsID]
+    if stageIndices is None:
+        stageIndices = [link % 2 for link in range(record.stateTable.shape[1])]
+    return record, stageIndices, STAGE_NAMES
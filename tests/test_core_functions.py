@@ -0,0 +1,105 @@
+import statistics
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import make_record
+from core_functions import tlsStages, tlsNumpy
+
+
+def reference_tlsStages(record, stageIndices, stageNames, definition = 'mode') -> pd.DataFrame:
+    #the per-subStage loop over the state strings (statistics.mode takes the first of tied indicators)
+    stages = {}
+    for phase, code in zip(record.phase, record.stateCode):
+        state = record.states[code]
+        if phase in stages:
+            assert stages[phase][1] == state, 'movement definition conflict'
+            continue
+        row = []
+        for stage in range(len(stageNames)):
+            indicators = [state[link] for link, index in enumerate(stageIndices) if index == stage]
+            row.append(statistics.mode(indicators) if definition == 'mode' else indicators[0])
+        stages[phase] = (row, state)
+    return pd.DataFrame([row for row, _ in stages.values()], columns = stageNames,
+                        index = pd.Index(list(stages), name = 'subStageID'))
+
+def reference_tlsNumpy(record, stages) -> np.ndarray:
+    #event by event: the duration goes to every stage green in its subStage, or to the last column
+    rows = []
+    for i in range(len(record)):
+        duration = record.time[i+1] - record.time[i] if i + 1 < len(record) else np.nan
+        green = [stages.loc[record.phase[i], name] == 'g' for name in stages.columns]
+        rows.append([record.time[i], record.phase[i]] + [duration if g else np.nan for g in green]
+                    + [np.nan if any(green) else duration])
+    return np.array(rows, dtype=np.float64).reshape(len(record), 2 + len(stages.columns) + 1)
+
+def assert_frames_equal(result, expected):
+    assert list(result.columns) == list(expected.columns)
+    assert list(result.index) == list(expected.index)
+    assert result.to_numpy().tolist() == expected.to_numpy().tolist()
+
+
+@pytest.mark.parametrize('definition', ['mode', 'first'])
+def test_tlsStages_examples(example, definition):
+    record, stageIndices, stageNames = example
+    assert_frames_equal(tlsStages(record, stageIndices, stageNames, definition),
+                        reference_tlsStages(record, stageIndices, stageNames, definition))
+
+def test_tlsStages_frame_input(example):
+    record, stageIndices, stageNames = example
+    assert_frames_equal(tlsStages(record.to_frame(), stageIndices, stageNames),
+                        reference_tlsStages(record, stageIndices, stageNames))
+
+@pytest.mark.parametrize('definition', ['mode', 'first'])
+def test_tlsStages_single_event(definition):
+    record = make_record([0], [3], ['GgryrG'])
+    assert_frames_equal(tlsStages(record, [0,0,0,1,1,1], ['A','B'], definition),
+                        reference_tlsStages(record, [0,0,0,1,1,1], ['A','B'], definition))
+
+def test_tlsStages_never_green():
+    record = make_record([0, 10, 13, 40], [0, 1, 2, 0], ['rrrr', 'yyrr', 'rryy', 'rrrr'])
+    stages = tlsStages(record, [0,0,1,1], ['A','B'])
+    assert not (stages == 'g').any().any()
+    assert_frames_equal(stages, reference_tlsStages(record, [0,0,1,1], ['A','B']))
+
+def test_tlsStages_mode_ties():
+    #two links per stage with different indicators: the tie goes to the link that comes first
+    record = make_record([0, 30, 33, 63], [0, 1, 2, 3], ['grrg', 'rgyr', 'yrgr', 'Grrr'])
+    stages = tlsStages(record, [0,1,0,1], ['A','B'])
+    assert stages.to_numpy().tolist() == [['g','r'], ['r','g'], ['y','r'], ['G','r']]
+    assert_frames_equal(stages, reference_tlsStages(record, [0,1,0,1], ['A','B']))
+
+def test_tlsStages_conflict():
+    record = make_record([0, 10], [0, 0], ['gr', 'rg'])
+    with pytest.raises(AssertionError):
+        tlsStages(record, [0,1], ['A','B'])
+
+
+def test_tlsNumpy_examples(example):
+    record, stageIndices, stageNames = example
+    stages = tlsStages(record, stageIndices, stageNames)
+    np.testing.assert_array_equal(tlsNumpy(record, stages), reference_tlsNumpy(record, stages))
+    np.testing.assert_array_equal(tlsNumpy(record.to_frame(), stages), reference_tlsNumpy(record, stages))
+
+def test_tlsNumpy_single_event():
+    record = make_record([5], [0], ['gr'])
+    stages = tlsStages(record, [0,1], ['A','B'])
+    tlsnp = tlsNumpy(record, stages)
+    assert tlsnp.shape == (1, 5) and np.isnan(tlsnp[0,2:]).all()
+    np.testing.assert_array_equal(tlsnp, reference_tlsNumpy(record, stages))
+
+def test_tlsNumpy_never_green():
+    record = make_record([0, 10, 13, 40], [0, 1, 2, 0], ['rrrr', 'yyrr', 'rryy', 'rrrr'])
+    stages = tlsStages(record, [0,0,1,1], ['A','B'])
+    tlsnp = tlsNumpy(record, stages)
+    assert np.isnan(tlsnp[:,2:4]).all()
+    np.testing.assert_array_equal(tlsnp[:-1,4], [10, 3, 27])
+    np.testing.assert_array_equal(tlsnp, reference_tlsNumpy(record, stages))
+
+def test_tlsNumpy_stage_green_at_several_subStages():
+    #every green subStage of a stage counts, and two stages green at once both get the duration
+    record = make_record([0, 20, 23, 40, 43, 60], [0, 1, 2, 3, 4, 0], ['gr', 'yr', 'gr', 'gg', 'rr', 'gr'])
+    stages = tlsStages(record, [0,1], ['A','B'])
+    tlsnp = tlsNumpy(record, stages)
+    np.testing.assert_array_equal(tlsnp[:-1,2], [20, np.nan, 17, 3, np.nan])
+    np.testing.assert_array_equal(tlsnp[:-1,3], [np.nan, np.nan, np.nan, 3, np.nan])
+    np.testing.assert_array_equal(tlsnp, reference_tlsNumpy(record, stages))
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+from conftest import make_record
+from core_functions import tlsStages, tlsNumpy
+from cycle_functions import cycleStarts, cycleGreenBars, cycleTable
+
+
+def reference_cycleStarts(tlsnp, stages, cyclicity) -> list:
+    #the quadratic loop of the cyclicity plot: a list of the subStages seen since the cycle start
+    starts = [0] if tlsnp.shape[0] > 1 else []
+    storage = []
+    for i in range(tlsnp.shape[0] - 1):
+        storage.append(tlsnp[i,1])
+        cond1 = cyclicity == 1 and any(storage.count(id) > 1 for id in stages.index)
+        cond2 = cyclicity == 2 and all(id in storage for id in stages.index)
+        if cond1 or cond2:
+            storage = [tlsnp[i,1]]
+            if i > 0:
+                starts.append(i)
+    return starts
+
+def reference_cycleGreenBars(tlsnp, stages, cyclicity) -> tuple:
+    #event by event, stacking the greens of every quasi-cycle from 0
+    starts = reference_cycleStarts(tlsnp, stages, cyclicity)
+    bars = []
+    for i in range(tlsnp.shape[0] - 1):
+        if i in starts:
+            x, top = tlsnp[i,0], 0
+        for stage in range(len(stages.columns)):
+            duration = tlsnp[i,2+stage]
+            if not np.isnan(duration):
+                bars.append((x, top, duration, stage))
+                top += duration
+    return tuple(np.array(column) for column in zip(*bars)) if bars else tuple(np.zeros(0) for _ in range(4))
+
+def reference_cycleTable(tlsnp, stages, cyclicity) -> list:
+    #(start, end, events, green and yellow & red durations) of every cycle, summed event by event
+    starts = reference_cycleStarts(tlsnp, stages, cyclicity)
+    ends = starts[1:] + [tlsnp.shape[0] - 1]
+    rows = []
+    for s, e in zip(starts, ends):
+        durations = [sum(0 if np.isnan(tlsnp[i,c]) else tlsnp[i,c] for i in range(s, e)) for c in range(2, tlsnp.shape[1])]
+        rows.append([tlsnp[s,0], tlsnp[e,0], e - s] + durations)
+    return rows
+
+def example_tlsnp(record, stageIndices, stageNames):
+    stages = tlsStages(record, stageIndices, stageNames)
+    return tlsNumpy(record, stages), stages
+
+def assert_bars_equal(result, expected):
+    for r, e in zip(result, expected):
+        np.testing.assert_allclose(np.asarray(r, dtype=np.float64), np.asarray(e, dtype=np.float64))
+
+
+@pytest.mark.parametrize('cyclicity', [1, 2])
+def test_cycleStarts_examples(example, cyclicity):
+    tlsnp, stages = example_tlsnp(*example)
+    assert cycleStarts(tlsnp, stages, cyclicity).tolist() == reference_cycleStarts(tlsnp, stages, cyclicity)
+
+@pytest.mark.parametrize('cyclicity', [1, 2])
+def test_cycleGreenBars_examples(example, cyclicity):
+    tlsnp, stages = example_tlsnp(*example)
+    assert_bars_equal(cycleGreenBars(tlsnp, stages, cyclicity), reference_cycleGreenBars(tlsnp, stages, cyclicity))
+
+@pytest.mark.parametrize('cyclicity', [1, 2])
+def test_cycleTable_examples(example, cyclicity):
+    tlsnp, stages = example_tlsnp(*example)
+    table = cycleTable(tlsnp, stages, cyclicity)
+    expected = reference_cycleTable(tlsnp, stages, cyclicity)
+    columns = ['start', 'end', 'events'] + [c for c in table.columns if c.endswith(' green')] + ['yellow & red']
+    np.testing.assert_allclose(table[columns].to_numpy(dtype=np.float64), np.array(expected))
+    assert table['complete'].tolist() == [True] * (len(expected) - 1) + [False]
+
+@pytest.mark.parametrize('cyclicity', [1, 2])
+def test_single_event(cyclicity):
+    record = make_record([0], [0], ['gr'])
+    tlsnp, stages = example_tlsnp(record, [0,1], ['A','B'])
+    assert cycleStarts(tlsnp, stages, cyclicity).tolist() == []
+    assert all(column.shape == (0,) for column in cycleGreenBars(tlsnp, stages, cyclicity))
+    assert cycleTable(tlsnp, stages, cyclicity).empty
+
+@pytest.mark.parametrize('cyclicity, starts', [(1, [0, 3]), (2, [0, 2, 4])])
+def test_never_green(cyclicity, starts):
+    #with cyclicity 2 the event completing all subStages starts the next cycle
+    record = make_record([0, 10, 13, 40, 50, 53, 80], [0, 1, 2, 0, 1, 2, 0],
+                         ['rrrr', 'yyrr', 'rryy', 'rrrr', 'yyrr', 'rryy', 'rrrr'])
+    tlsnp, stages = example_tlsnp(record, [0,0,1,1], ['A','B'])
+    assert cycleStarts(tlsnp, stages, cyclicity).tolist() == reference_cycleStarts(tlsnp, stages, cyclicity) == starts
+    assert all(column.shape == (0,) for column in cycleGreenBars(tlsnp, stages, cyclicity))
+    table = cycleTable(tlsnp, stages, cyclicity)
+    assert table['yellow & red'].tolist() == table['length'].tolist()
+    assert table['length'].sum() == 80
+
+@pytest.mark.parametrize('cyclicity', [1, 2])
+def test_single_subStage(cyclicity):
+    #every event repeats the only subStage: each one is a cycle of its own
+    record = make_record([0, 30, 60, 90], [0, 0, 0, 0], ['gr', 'gr', 'gr', 'gr'])
+    tlsnp, stages = example_tlsnp(record, [0,1], ['A','B'])
+    assert cycleStarts(tlsnp, stages, cyclicity).tolist() == reference_cycleStarts(tlsnp, stages, cyclicity) == [0, 1, 2]
+    assert_bars_equal(cycleGreenBars(tlsnp, stages, cyclicity), ([0, 30, 60], [0, 0, 0], [30, 30, 30], [0, 0, 0]))
+
+def test_invalid_cyclicity():
+    record = make_record([0, 30], [0, 1], ['gr', 'rg'])
+    tlsnp, stages = example_tlsnp(record, [0,1], ['A','B'])
+    with pytest.raises(ValueError):
+        cycleStarts(tlsnp, stages, 3)
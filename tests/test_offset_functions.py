@@ -0,0 +1,94 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import ROOT
+from record_functions import read_tlsrecord
+from offset_sumo.offset_functions import ordinal, green_intervals, offset_table
+
+CYCLIC_OFFSET = 30
+COOR_INDEX = (2, 3)
+
+
+def reference_offset_table(reference_int, offset_int, orders, cyclic_offset) -> pd.DataFrame:
+    #the row-by-row pandas loop of offset_cal
+    reference_int = reference_int.copy()
+    for i, row in reference_int.iterrows():
+        reference_int.loc[i,'concur'] = any((row['start'] >= offset_int['start']) & (row['start'] < offset_int['end']))
+        if reference_int.loc[i,'concur']:
+            usable_concur = row['start'] - offset_int.loc[row['start'] < offset_int['end'],'end'].iloc[0] - cyclic_offset
+            reference_int.loc[i,'concur_usable'] = usable_concur if usable_concur > 0 else 0
+        else:
+            reference_int.loc[i,'concur_usable'] = 0
+        later = offset_int.loc[row['start'] < offset_int['start']]
+        for order in range(1, orders+1):
+            if len(later) >= order:
+                start, end = later['start'].iloc[order-1], later['end'].iloc[order-1]
+                reference_int.loc[i,ordinal(order)+'_offset'] = start - row['start']
+                usable_checkend = end - row['start'] - cyclic_offset
+                usable_checkstart = start - row['start'] - cyclic_offset
+                if usable_checkend > 0 and usable_checkstart < 0:
+                    reference_int.loc[i,ordinal(order)+'_usable'] = usable_checkend
+                elif usable_checkend > 0 and usable_checkstart > 0:
+                    reference_int.loc[i,ordinal(order)+'_usable'] = end - start
+                else:
+                    reference_int.loc[i,ordinal(order)+'_usable'] = 0
+    for order in range(1, orders+1): #columns no row reached stay NaN
+        for column in (ordinal(order)+'_offset', ordinal(order)+'_usable'):
+            if column not in reference_int:
+                reference_int[column] = np.nan
+    return reference_int
+
+def assert_tables_equal(result, expected):
+    assert set(result.columns) == set(expected.columns)
+    for column in expected.columns:
+        np.testing.assert_allclose(result[column].astype(np.float64), expected[column].astype(np.float64),
+                                   err_msg=column)
+
+def intervals(starts, ends) -> pd.DataFrame:
+    return pd.DataFrame({'start': pd.Series(starts, dtype=np.float64), 'end': pd.Series(ends, dtype=np.float64)})
+
+@pytest.fixture(scope='module')
+def greens():
+    records = {}
+    for name in ('J1', 'J3'):
+        records.update(read_tlsrecord(os.path.join(ROOT, 'offset_sumo', name + 'tlsrecord.xml')))
+    return {tlsID: green_intervals(record, COOR_INDEX) for tlsID, record in records.items()}
+
+
+@pytest.mark.parametrize('orders', [1, 2, 3])
+@pytest.mark.parametrize('pair', [('J1', 'J3'), ('J3', 'J1')])
+def test_offset_table_examples(greens, pair, orders):
+    reference, target = pair
+    assert_tables_equal(offset_table(greens[reference], greens[target], orders, CYCLIC_OFFSET),
+                        reference_offset_table(greens[reference], greens[target], orders, CYCLIC_OFFSET))
+
+def test_offset_table_fewer_later_greens():
+    #the last reference greens have fewer than 3 later offset greens: their k-th columns are NaN
+    reference_int = intervals([0, 90, 180, 270], [40, 130, 220, 310])
+    offset_int = intervals([20, 110, 200], [60, 150, 240])
+    result = offset_table(reference_int, offset_int, 3, CYCLIC_OFFSET)
+    assert_tables_equal(result, reference_offset_table(reference_int, offset_int, 3, CYCLIC_OFFSET))
+    assert result['3rd_offset'].isna().tolist() == [False, True, True, True]
+    assert result['1st_offset'].isna().tolist() == [False, False, False, True]
+
+def test_offset_table_single_interval():
+    reference_int = intervals([100], [140])
+    offset_int = intervals([110], [150])
+    result = offset_table(reference_int, offset_int, 2, CYCLIC_OFFSET)
+    assert_tables_equal(result, reference_offset_table(reference_int, offset_int, 2, CYCLIC_OFFSET))
+    assert result['1st_offset'].tolist() == [10] and result['1st_usable'].tolist() == [20]
+    assert np.isnan(result['2nd_offset'][0])
+
+def test_offset_table_concurrent_and_unmatched_ends():
+    #onsets inside an offset green, a start exactly at the travel time (usable 0) and an offset start without end
+    reference_int = intervals([10, 95, 200, 230], [50, 135, 240, 270])
+    offset_int = intervals([0, 40, 125, 180, 260], [30, 100, 160, 220])
+    for orders in (1, 3):
+        assert_tables_equal(offset_table(reference_int, offset_int, orders, CYCLIC_OFFSET),
+                            reference_offset_table(reference_int, offset_int, orders, CYCLIC_OFFSET))
+
+@pytest.mark.parametrize('k, expected', [(1, '1st'), (2, '2nd'), (3, '3rd'), (4, '4th'), (11, '11th'),
+                                         (12, '12th'), (13, '13th'), (21, '21st'), (22, '22nd'), (103, '103rd')])
+def test_ordinal(k, expected):
+    assert ordinal(k) == expected
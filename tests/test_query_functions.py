@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from conftest import make_record
+from core_functions import tlsStages, tlsNumpy
+from query_functions import TLSRangeIndex
+
+
+def reference_selection(tlsnp, t0, t1) -> np.ndarray:
+    #the boolean mask of the slider callback: complete events with t0 < time < t1
+    complete = tlsnp[:-1]
+    return complete[(complete[:,0] > t0) & (complete[:,0] < t1)]
+
+def reference_sums(tlsnp, t0, t1) -> np.ndarray:
+    return np.nansum(reference_selection(tlsnp, t0, t1)[:,2:], axis=0)
+
+def reference_histogram(tlsnp, t0, t1, bins, density) -> np.ndarray:
+    selection = reference_selection(tlsnp, t0, t1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.array([np.histogram(column[~np.isnan(column)], bins, density=density)[0]
+                         for column in selection[:,2:-1].T])
+
+def random_windows(tlsnp, count = 30, seed = 0) -> list:
+    #random windows, the whole record, an empty one and windows bounded by event times exactly
+    rng = np.random.default_rng(seed)
+    first, last = tlsnp[0,0], tlsnp[-1,0]
+    windows = [tuple(sorted(rng.uniform(first - 10, last + 10, 2))) for _ in range(count)]
+    times = tlsnp[:,0]
+    windows += [(first - 1, last + 1), (last + 1, last + 2), (times[0], times[-1]), (times[len(times)//2], times[-1])]
+    return windows
+
+def example_tlsnp(record, stageIndices, stageNames):
+    return tlsNumpy(record, tlsStages(record, stageIndices, stageNames))
+
+
+def test_sums_examples(example):
+    tlsnp = example_tlsnp(*example)
+    index = TLSRangeIndex(tlsnp)
+    for t0, t1 in random_windows(tlsnp):
+        np.testing.assert_allclose(index.sums(t0, t1), reference_sums(tlsnp, t0, t1), atol=1e-9)
+
+@pytest.mark.parametrize('density', [False, True])
+def test_histogram_examples(example, density):
+    tlsnp = example_tlsnp(*example)
+    index = TLSRangeIndex(tlsnp)
+    longest = np.diff(tlsnp[:,0]).max() #some example TLSs have no green under the alternate link grouping
+    for bins in (np.linspace(0, longest, 11), np.linspace(5, longest / 2, 4)):
+        for t0, t1 in random_windows(tlsnp):
+            np.testing.assert_allclose(index.histogram(t0, t1, bins, density),
+                                       reference_histogram(tlsnp, t0, t1, bins, density))
+
+def test_extend_equals_full_build(example):
+    #indexing the events in chunks, with the histogram bins set in between, as while following a record live
+    tlsnp = example_tlsnp(*example)
+    bins = np.linspace(0, np.diff(tlsnp[:,0]).max(), 6)
+    full = TLSRangeIndex(tlsnp)
+    incremental = TLSRangeIndex(tlsnp[:2])
+    incremental.histogram(0, 1, bins)
+    for stop in range(3, tlsnp.shape[0] + 1, 7):
+        incremental.extend(tlsnp[:stop])
+    incremental.extend(tlsnp)
+    assert len(incremental) == len(full) == tlsnp.shape[0] - 1
+    for t0, t1 in random_windows(tlsnp, 10):
+        np.testing.assert_allclose(incremental.sums(t0, t1), full.sums(t0, t1))
+        np.testing.assert_array_equal(incremental.histogram(t0, t1, bins), full.histogram(t0, t1, bins))
+
+def test_single_event():
+    #the only event has no duration yet: nothing is indexed
+    tlsnp = example_tlsnp(make_record([5], [0], ['gr']), [0,1], ['A','B'])
+    index = TLSRangeIndex(tlsnp)
+    assert len(index) == 0 and index.rows(0, 10) == (0, 0)
+    np.testing.assert_array_equal(index.sums(0, 10), [0, 0, 0])
+    np.testing.assert_array_equal(index.histogram(0, 10, [0, 5, 10]), [[0, 0], [0, 0]])
+
+def test_never_green():
+    record = make_record([0, 10, 13, 40, 50], [0, 1, 2, 0, 1], ['rrrr', 'yyrr', 'rryy', 'rrrr', 'yyrr'])
+    tlsnp = example_tlsnp(record, [0,0,1,1], ['A','B'])
+    index = TLSRangeIndex(tlsnp)
+    np.testing.assert_array_equal(index.sums(-1, 100), [0, 0, 50])
+    np.testing.assert_array_equal(index.histogram(-1, 100, [0, 20, 40]), [[0, 0], [0, 0]])
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from conftest import make_record
+from core_functions import tlsStages, tlsNumpy
+from replication_functions import Moments, ReplicationStats, _tQuantile
+
+#Student t quantiles of the printed tables: {p: {df: t}}
+T_TABLE = {0.975: {1: 12.706, 2: 4.303, 3: 3.182, 5: 2.571, 10: 2.228, 30: 2.042},
+           0.95: {1: 6.314, 2: 2.920, 3: 2.353, 5: 2.015, 10: 1.812, 30: 1.697}}
+
+
+def random_values(seed, rows = 40, shape = (3,)) -> np.ndarray:
+    #values with NaN scattered in, a column with a single value and a column without any
+    rng = np.random.default_rng(seed)
+    values = rng.normal(50, 20, (rows,) + shape)
+    values[rng.random(values.shape) < 0.2] = np.nan
+    values[1:, 0] = np.nan
+    values[:, 1] = np.nan
+    return values
+
+def assert_moments(moments, values):
+    #numpy's NaN-skipping mean and variance (ddof 1), where there are enough values for them
+    n = (~np.isnan(values)).sum(axis=0)
+    np.testing.assert_array_equal(moments.n, n)
+    mean = np.zeros(n.shape)
+    mean[n > 0] = np.nanmean(values[:, n > 0], axis=0)
+    variance = np.full(n.shape, np.nan)
+    variance[n > 1] = np.nanvar(values[:, n > 1], axis=0, ddof=1)
+    np.testing.assert_allclose(moments.mean, mean)
+    np.testing.assert_allclose(moments.variance, variance)
+
+def replication_tlsnp(seed):
+    #a random two-stage signal plan: green, yellow, all-red of both stages with random greens
+    rng = np.random.default_rng(seed)
+    times, phases, states = [], [], []
+    t = 0.0
+    for _ in range(30):
+        for phase, state, duration in ((0, 'gr', rng.uniform(10, 60)), (1, 'yr', 3), (2, 'rr', 2),
+                                       (3, 'rg', rng.uniform(10, 60)), (4, 'ry', 3), (5, 'rr', 2)):
+            times.append(t)
+            phases.append(phase)
+            states.append(state)
+            t += duration
+    record = make_record(times + [t], phases + [0], states + ['gr'])
+    stages = tlsStages(record, [0,1], ['A','B'])
+    return tlsNumpy(record, stages), stages
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_moments_add_in_one_pass(seed):
+    values = random_values(seed)
+    assert_moments(Moments((3,)).add(values), values)
+
+@pytest.mark.parametrize('seed', range(3))
+def test_moments_merge_of_chunks(seed):
+    #chunks of any size, empty ones included, added separately and merged in any order
+    values = random_values(seed)
+    bounds = [0, 0, 1, 7, 7, 20, 33, 40]
+    chunks = [Moments((3,)).add(values[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]
+    merged = Moments((3,))
+    for chunk in chunks[::-1]:
+        merged.merge(chunk)
+    assert_moments(merged, values)
+    incremental = Moments((3,))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        incremental.add(values[lo:hi])
+    assert_moments(incremental, values)
+
+def test_moments_interval():
+    values = np.array([[10.0], [12.0], [11.0], [15.0], [9.0], [13.0]])
+    moments = Moments((1,)).add(values)
+    expected = T_TABLE[0.975][5] * np.std(values, ddof=1) / np.sqrt(len(values))
+    np.testing.assert_allclose(moments.interval(0.95), [expected], rtol=2e-3)
+    assert np.isnan(Moments((1,)).add([[10.0]]).interval(0.95)).all()
+
+@pytest.mark.parametrize('p', sorted(T_TABLE))
+def test_tQuantile_table(p):
+    for df, t in T_TABLE[p].items():
+        #the closed forms are exact, the expansion is within 5e-3 of the table at df 3 and 1e-3 from df 5 on
+        tolerance = 1e-3 if df != 3 else 5e-3
+        assert abs(float(_tQuantile(p, df)) - t) < tolerance, (p, df)
+
+def test_tQuantile_array_and_small_df():
+    dfs = np.array([0, 0.5, 1, 2, 3, 10])
+    quantiles = _tQuantile(0.975, dfs)
+    assert np.isnan(quantiles[:2]).all()
+    np.testing.assert_allclose(quantiles[2:], [T_TABLE[0.975][df] for df in (1, 2, 3, 10)], atol=5e-3)
+    assert np.isnan(_tQuantile(0.975, 0))
+
+def test_replicationstats_merge_equals_add():
+    #statistics of the replications merged from separate workers equal those of one pass in order
+    replications = [replication_tlsnp(seed) for seed in range(5)]
+    bins = np.linspace(0, 60, 7)
+    sequential = ReplicationStats(['A','B'], bins)
+    for seed, (tlsnp, stages) in enumerate(replications):
+        sequential.add(tlsnp, stages, seed)
+    merged = ReplicationStats(['A','B'], bins)
+    for seed, (tlsnp, stages) in enumerate(replications):
+        merged.merge(ReplicationStats(['A','B'], bins).add(tlsnp, stages, seed))
+    assert merged.seeds == sequential.seeds == list(range(5))
+    np.testing.assert_array_equal(merged.histogram, sequential.histogram)
+    for name in ('seedHist', 'split', 'cycles', 'seedCycles'):
+        for attribute in ('n', 'mean', 'm2'):
+            np.testing.assert_allclose(getattr(getattr(merged, name), attribute),
+                                       getattr(getattr(sequential, name), attribute), err_msg=name)
+    #the pooled histogram is the sum of the per-replication np.histogram counts
+    pooled = sum(np.array([np.histogram(tlsnp[:-1, 2+j][~np.isnan(tlsnp[:-1, 2+j])], bins)[0] for j in range(2)])
+                 for tlsnp, _ in replications)
+    np.testing.assert_array_equal(merged.histogram, pooled)
+    np.testing.assert_allclose(merged.seedHist.mean, pooled / 5)
+
+def test_replicationstats_other_scenario():
+    stats = ReplicationStats(['A','B'], np.linspace(0, 60, 7))
+    with pytest.raises(AssertionError):
+        stats.merge(ReplicationStats(['A','B'], np.linspace(0, 120, 7)))
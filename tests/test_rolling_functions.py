@@ -0,0 +1,117 @@
+from collections import deque
+import numpy as np
+import pytest
+from conftest import make_record
+from core_functions import tlsStages, tlsNumpy
+from cycle_functions import cycleStarts
+from rolling_functions import RingBuffer, RollingTLS
+
+BINS = np.linspace(0, 60, 7)
+
+
+def reference_window(pushed, stages, window, unit, cyclicity) -> np.ndarray:
+    #the rows of the window taken again from all pushed rows
+    if unit == 'seconds':
+        end = pushed[-1,0] + np.nanmax(pushed[-1,2:])
+        return pushed[pushed[:,0] >= end - window]
+    starts = cycleStarts(np.concatenate([pushed, np.full((1, pushed.shape[1]), np.nan)]), stages, cyclicity)
+    return pushed[starts[max(len(starts) - window, 0)]:]
+
+def reference_histogram(rows, t0, t1, bins) -> np.ndarray:
+    selection = rows[(t0 < rows[:,0]) & (rows[:,0] < t1)]
+    return np.array([np.histogram(column[~np.isnan(column)], bins)[0] for column in selection[:,2:-1].T])
+
+def reference_sums(rows, t0, t1) -> np.ndarray:
+    return np.nansum(rows[(t0 < rows[:,0]) & (rows[:,0] < t1)][:,2:], axis=0)
+
+def push_in_chunks(rolling, rows, seed):
+    #pushes the rows in random chunks and yields the rows pushed so far after every push
+    rng = np.random.default_rng(seed)
+    stop = 0
+    while stop < rows.shape[0]:
+        size = rng.integers(1, 8)
+        rolling.push(rows[stop:stop+size])
+        stop += size
+        yield rows[:stop]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_ringbuffer_model(seed):
+    #random appends and poplefts against a deque, through growth and wraparound
+    rng = np.random.default_rng(seed)
+    buffer = RingBuffer((2,), capacity=4)
+    model = deque()
+    counter = 0
+    for _ in range(300):
+        if rng.random() < 0.55:
+            rows = np.arange(counter, counter + 2*rng.integers(0, 6), dtype=np.float64).reshape(-1, 2)
+            counter += rows.size
+            buffer.append(rows)
+            model.extend(map(tuple, rows))
+        else:
+            n = int(rng.integers(0, 6))
+            popped = buffer.popleft(n)
+            expected = [model.popleft() for _ in range(min(n, len(model)))]
+            assert list(map(tuple, popped)) == expected
+        assert len(buffer) == len(model) <= buffer.capacity
+        assert list(map(tuple, buffer.rows())) == list(model)
+        start = int(rng.integers(0, len(model) + 1))
+        assert list(map(tuple, buffer.rows(start))) == list(model)[start:]
+        older, newer = buffer.segments()
+        assert older.shape[0] + newer.shape[0] == len(model)
+
+def test_ringbuffer_keeps_capacity_when_rolling():
+    #a bounded content never grows the buffer, however many rows pass through
+    buffer = RingBuffer(capacity=8)
+    for start in range(0, 1000, 5):
+        buffer.append(np.arange(start, start + 5)) #at most 12 rows
+        buffer.popleft(max(len(buffer) - 7, 0))
+    assert buffer.capacity == 16
+    assert buffer.rows().tolist() == list(range(993, 1000))
+
+@pytest.mark.parametrize('unit, window', [('seconds', 90), ('seconds', 600), ('cycles', 1), ('cycles', 3)])
+@pytest.mark.parametrize('cyclicity', [1, 2])
+def test_rollingtls_examples(example, unit, window, cyclicity):
+    record, stageIndices, stageNames = example
+    stages = tlsStages(record, stageIndices, stageNames)
+    rows = tlsNumpy(record, stages)[:-1]
+    rolling = RollingTLS(stages, window, unit, BINS, cyclicity)
+    for pushed in push_in_chunks(rolling, rows, seed=len(rows)):
+        expected = reference_window(pushed, stages, window, unit, cyclicity)
+        np.testing.assert_array_equal(rolling.tlsnp[:-1], expected)
+        assert rolling.tlsnp[-1,0] == rolling.end == pushed[-1,0] + np.nanmax(pushed[-1,2:])
+        np.testing.assert_allclose(rolling.sums(-np.inf, np.inf), np.nansum(expected[:,2:], axis=0), atol=1e-6)
+        np.testing.assert_array_equal(rolling.histogram(-np.inf, np.inf, BINS),
+                                      reference_histogram(expected, -np.inf, np.inf, BINS))
+    #a range bounded by the window's own event times excludes them, as in query_functions.TLSRangeIndex
+    t0, t1 = expected[0,0], expected[-1,0]
+    np.testing.assert_allclose(rolling.sums(t0, t1), reference_sums(expected, t0, t1), atol=1e-6)
+    np.testing.assert_array_equal(rolling.histogram(t0, t1, BINS), reference_histogram(expected, t0, t1, BINS))
+    np.testing.assert_array_equal(rolling.histogram(t0, t1, BINS[::2]), reference_histogram(expected, t0, t1, BINS[::2]))
+
+def test_rollingtls_single_event():
+    record = make_record([0, 40], [0, 1], ['gr', 'rg'])
+    stages = tlsStages(record, [0,1], ['A','B'])
+    rolling = RollingTLS(stages, 60, 'seconds', BINS)
+    rolling.push(tlsNumpy(record, stages)[:1])
+    assert len(rolling) == 1 and rolling.end == 40
+    np.testing.assert_array_equal(rolling.sums(-np.inf, np.inf), [40, 0, 0])
+    #a window shorter than the event drops it: the window holds the events starting in its last seconds
+    shorter = RollingTLS(stages, 30, 'seconds', BINS)
+    shorter.push(tlsNumpy(record, stages)[:1])
+    assert len(shorter) == 0 and shorter.end == 40
+
+@pytest.mark.parametrize('unit', ['seconds', 'cycles'])
+def test_rollingtls_never_green(unit):
+    record = make_record([0, 10, 13, 40, 50, 53, 80, 90], [0, 1, 2, 0, 1, 2, 0, 1],
+                         ['rrrr', 'yyrr', 'rryy', 'rrrr', 'yyrr', 'rryy', 'rrrr', 'yyrr'])
+    stages = tlsStages(record, [0,0,1,1], ['A','B'])
+    rolling = RollingTLS(stages, 2 if unit == 'cycles' else 50, unit, BINS)
+    rolling.push(tlsNumpy(record, stages)[:-1])
+    assert rolling.counts.sum() == 0
+    np.testing.assert_array_equal(rolling.sums(-np.inf, np.inf), [0, 0, 50])
+
+def test_rollingtls_invalid_unit():
+    stages = tlsStages(make_record([0], [0], ['gr']), [0,1], ['A','B'])
+    with pytest.raises(ValueError):
+        RollingTLS(stages, 10, 'minutes')